@@ -0,0 +1,66 @@
+import argparse
+import time
+from pathlib import Path
+
+from src.ontology import TOPIC_IDS, Topic, TopicOntology
+from src.predictor_interface import SimpleFrequencyPredictor
+from src.prepare_data import _iter_csv_from_zip, iter_harrison_entries
+
+
+HARRISON_CSV = "yenepoya_predictor_artifacts/harrison_index_ontology.csv"
+MASTER_CSV = "yenepoya_predictor_artifacts/yenepoya_master_questions_2006_2025.csv"
+
+
+def harrison_topics(zip_path: Path):
+    """Index terms under their domain, and domains under one root: three levels."""
+    return [Topic(**entry) for entry in iter_harrison_entries(_iter_csv_from_zip(zip_path, HARRISON_CSV))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artifacts-zip", default="yenepoya_predictor_artifacts.zip")
+    parser.add_argument("--configs", type=int, default=20)
+    args = parser.parse_args()
+
+    zip_path = Path(args.artifacts_zip)
+    topics = harrison_topics(zip_path)
+    ontology = TopicOntology(topics)
+    start = time.perf_counter()
+    ontology._build_hierarchy()
+    closure = time.perf_counter() - start
+    pairs = sum(len(ontology.ancestors(topic.topic_id)) for topic in topics)
+    print(f"hierarchy: {len(topics)} topics, {len(ontology.domains)} domains, {pairs} ancestor pairs, closure {closure:.3f}s")
+
+    prepared = []
+    for row in _iter_csv_from_zip(zip_path, MASTER_CSV):
+        tags = (row.get("harrison_tag_ids") or "").split(";")
+        topic_ids = TOPIC_IDS.intern_all(topic_id for topic_id in tags if topic_id)
+        if topic_ids:
+            prepared.append((topic_ids, None))
+    configs = [{"graph_weight": 0.05 + 0.01 * idx, "graph_decay": 0.5} for idx in range(args.configs)]
+    print(f"questions: {len(prepared)}, configs: {len(configs)}")
+
+    for depth in (1, 2):
+        predictor = SimpleFrequencyPredictor(graph_depth=depth)
+        start = time.perf_counter()
+        looped = [predictor.predict_prepared(prepared, ontology, config) for config in configs]
+        loop_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        compiled = predictor.compile(prepared, ontology)
+        compile_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = predictor.predict_batch(compiled, configs)
+        batch_seconds = time.perf_counter() - start
+        mismatches = sum(1 for a, b in zip(looped, batched) if a != b)
+        print(
+            f"depth {depth}: per-question loop {loop_seconds / len(configs) * 1000:.2f} ms/config, "
+            f"compiled {batch_seconds / len(configs) * 1000:.2f} ms/config "
+            f"(+{compile_seconds * 1000:.1f} ms once), {len(compiled.columns)} distinct columns, "
+            f"mismatches {mismatches}"
+        )
+        if mismatches:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
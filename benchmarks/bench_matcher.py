@@ -0,0 +1,46 @@
+import argparse
+import time
+from pathlib import Path
+
+from src.ontology import TopicOntology
+from src.prepare_data import _read_csv_from_zip
+
+
+MASTER_CSV = "yenepoya_predictor_artifacts/yenepoya_master_questions_2006_2025.csv"
+
+
+def time_matcher(ontology: TopicOntology, texts, max_topics: int):
+    start = time.perf_counter()
+    results = [ontology.match_topics(text, max_topics=max_topics) for text in texts]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artifacts-zip", default="yenepoya_predictor_artifacts.zip")
+    parser.add_argument("--seed", default="data/topic_ontology_seed.json")
+    parser.add_argument("--max-topics", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = _read_csv_from_zip(Path(args.artifacts_zip), MASTER_CSV)
+    texts = [row["question_text"] for row in rows]
+
+    timings = {}
+    outputs = {}
+    for name in ("regex", "trie"):
+        start = time.perf_counter()
+        ontology = TopicOntology.from_seed(Path(args.seed), matcher=name)
+        build = time.perf_counter() - start
+        elapsed, outputs[name] = time_matcher(ontology, texts, args.max_topics)
+        timings[name] = elapsed
+        print(f"{name:>6}: build {build:.3f}s, match {elapsed:.3f}s ({len(texts) / elapsed:,.0f} questions/s)")
+
+    mismatches = sum(1 for a, b in zip(outputs["regex"], outputs["trie"]) if a != b)
+    print(f"questions: {len(texts)}, mismatches: {mismatches}")
+    print(f"speedup: {timings['regex'] / timings['trie']:.1f}x")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+from pathlib import Path
+from unittest import mock
+
+from src.autotune import AutoTuner
+from src.ontology import TopicOntology
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--max-evals", type=float, default=20)
+    parser.add_argument("--seeds", type=int, default=5)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    years = [2022, 2023, 2024, 2025]
+
+    # Tuning writes configs/best_config.yaml; benchmarks must not.
+    with mock.patch("src.autotune.dump_yaml"):
+        grid = AutoTuner(data_dir, ontology).tune(years, args.k, 0.0, 10**9)
+        target = grid["best"].metrics.recall_at_k
+        print(
+            f"{'grid':>10}: recall {target:.4f} after {grid['search']['evaluations']:.0f} evals "
+            f"(best at {grid['search']['evaluations_to_best']:.1f})"
+        )
+        for strategy in ("random", "halving", "surrogate"):
+            reached = 0
+            to_best = []
+            recalls = []
+            for seed in range(args.seeds):
+                tuner = AutoTuner(data_dir, ontology, seed=seed)
+                result = tuner.tune(years, args.k, 0.0, 10**9, strategy=strategy, max_evals=args.max_evals)
+                recalls.append(result["best"].metrics.recall_at_k)
+                to_best.append(result["search"]["evaluations_to_best"])
+                reached += recalls[-1] >= target
+            print(
+                f"{strategy:>10}: mean recall {sum(recalls) / len(recalls):.4f}, "
+                f"reached grid optimum {reached}/{args.seeds}, "
+                f"mean evals to best {sum(to_best) / len(to_best):.1f} (budget {args.max_evals:g})"
+            )
+
+
+if __name__ == "__main__":
+    main()
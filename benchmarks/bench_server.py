@@ -0,0 +1,82 @@
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from pathlib import Path
+
+from src.ontology import TopicOntology
+from src.pipeline import load_config
+from src.server import PredictionService, make_server
+
+
+def build_requests(n: int):
+    """Deterministic mix of ranking, what-if and match requests."""
+    requests = []
+    for idx in range(n):
+        kind = idx % 10
+        if kind < 6:
+            requests.append(("GET", f"/rank?paper_id={idx % 4 + 1}&top=30", None))
+        elif kind < 9:
+            body = {"paper_id": idx % 4 + 1, "years": [2022, 2023], "config": {"graph_weight": (idx % 5) / 10}}
+            requests.append(("POST", "/rank", body))
+        else:
+            requests.append(("POST", "/match", {"text": "Discuss the management of diabetic ketoacidosis"}))
+    return requests
+
+
+def run_client(port: int, requests):
+    connection = HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for method, path, body in requests:
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        start = time.perf_counter()
+        connection.request(method, path, body=payload, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path} -> {response.status}")
+    connection.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    config = load_config(Path("configs/best_config.yaml"))
+    service = PredictionService(data_dir, ontology, [2022, 2023, 2024, 2025], config, args.cache_size)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    requests = build_requests(args.requests)
+    shards = [requests[idx :: args.clients] for idx in range(args.clients)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = executor.map(lambda shard: run_client(server.server_port, shard), shards)
+        latencies = [latency for shard in results for latency in shard]
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"requests: {len(latencies)} over {args.clients} clients in {elapsed:.2f}s")
+    print(f"throughput: {len(latencies) / elapsed:,.0f} req/s")
+    print(f"latency p50: {statistics.median(latencies) * 1000:.2f} ms, p99: {p99 * 1000:.2f} ms")
+    print(f"ranking cache: {service.rankings.stats()}")
+
+
+if __name__ == "__main__":
+    main()
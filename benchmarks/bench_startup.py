@@ -0,0 +1,37 @@
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from src.ontology import TopicOntology
+
+
+def time_load(seed: Path, matcher: str, cache_dir: Path = None) -> float:
+    start = time.perf_counter()
+    TopicOntology.from_seed(seed, matcher=matcher, cache_dir=cache_dir)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", default="data/topic_ontology_seed.json")
+    parser.add_argument("--matcher", default="trie")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    seed = Path(args.seed)
+    uncached = [time_load(seed, args.matcher) for _ in range(args.repeat)]
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp)
+        cold = time_load(seed, args.matcher, cache_dir)
+        warm = [time_load(seed, args.matcher, cache_dir) for _ in range(args.repeat)]
+
+    print(f"no cache:   {statistics.median(uncached) * 1000:.1f} ms (median of {args.repeat})")
+    print(f"cold cache: {cold * 1000:.1f} ms (parse, compile and write)")
+    print(f"warm cache: {statistics.median(warm) * 1000:.1f} ms (median of {args.repeat})")
+    print(f"speedup:    {statistics.median(uncached) / statistics.median(warm):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
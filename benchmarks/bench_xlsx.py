@@ -0,0 +1,77 @@
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+from src.prepare_data import ARCHIVE_PREFIX, WORKBOOK_NAME
+from src.xlsx_reader import MAIN_NS, _cell_value, _column_index, _sheet_paths, _shared_strings, iter_sheet_rows
+
+
+def load_sheet_whole(workbook_path: Path, sheet_name: str):
+    """The full-load approach: parse the whole sheet into a tree, then build every row."""
+    with zipfile.ZipFile(workbook_path) as workbook:
+        shared = _shared_strings(workbook)
+        root = ElementTree.fromstring(workbook.read(_sheet_paths(workbook)[sheet_name]))
+    rows = []
+    for row in root.iter(f"{MAIN_NS}row"):
+        rows.append({_column_index(cell.get("r")): _cell_value(cell, shared) for cell in row.iter(f"{MAIN_NS}c")})
+    header = [rows[0].get(idx, "") for idx in range(max(rows[0]) + 1)]
+    return [
+        {name: values.get(idx, "") for idx, name in enumerate(header)} for values in rows[1:] if any(values.values())
+    ]
+
+
+def stream_sheet(workbook_path: Path, sheet_name: str):
+    count = 0
+    for _ in iter_sheet_rows(workbook_path, sheet_name):
+        count += 1
+    return count
+
+
+def measure(fn, *args):
+    """Result, wall time and peak traced memory; timed separately, as tracing slows allocation."""
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--artifacts-zip", default="yenepoya_predictor_artifacts.zip")
+    parser.add_argument(
+        "--sheets",
+        nargs="*",
+        default=["master_questions_2006_2025", "topic_table_exam_matched", "harrison_index_ontology"],
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook_path = Path(tmp) / WORKBOOK_NAME
+        with zipfile.ZipFile(args.artifacts_zip) as zf, zf.open(ARCHIVE_PREFIX + WORKBOOK_NAME) as handle:
+            with workbook_path.open("wb") as out:
+                shutil.copyfileobj(handle, out)
+        for sheet in args.sheets:
+            # Compared on what ingestion needs: each row seen once, in order.
+            rows, whole_time, whole_peak = measure(load_sheet_whole, workbook_path, sheet)
+            count, stream_time, stream_peak = measure(stream_sheet, workbook_path, sheet)
+            mismatches = sum(1 for a, b in zip(rows, iter_sheet_rows(workbook_path, sheet)) if a != b)
+            mismatches += abs(len(rows) - count)
+            print(
+                f"{sheet}: {count} rows | full load {whole_time:.2f}s, peak {whole_peak / 1e6:.1f} MB"
+                f" | streaming {stream_time:.2f}s, peak {stream_peak / 1e6:.2f} MB | mismatches {mismatches}"
+            )
+            if mismatches:
+                raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
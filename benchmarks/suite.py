@@ -0,0 +1,239 @@
+import argparse
+import json
+import math
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from unittest import mock
+
+from benchmarks.synthetic import generate_dataset
+from src import pipeline
+from src.autotune import AutoTuner
+from src.bootstrap import bootstrap_means
+from src.dedup import cluster_near_duplicates
+from src.evaluate import load_year_data
+from src.labeling import auto_label_questions
+from src.ontology import TopicOntology
+from src.predictor_interface import SimpleFrequencyPredictor
+
+
+def _bench_ontology_build(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    seed = data_dir / "topic_ontology_seed.json"
+    ontology = TopicOntology.from_seed(seed)
+    return lambda: TopicOntology.from_seed(seed), len(ontology.topics)
+
+
+def _bench_load_year_data(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    def run():
+        return sum(len(list(load_year_data(data_dir, year))) for year in years)
+
+    return run, run()
+
+
+def _questions(data_dir: Path, years: List[int]) -> List[dict]:
+    return [question for year in years for question in load_year_data(data_dir, year)]
+
+
+def _bench_match_topics(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    texts = [question["raw_text"] for question in _questions(data_dir, years)]
+    return lambda: [ontology.match_topics(text, 3) for text in texts], len(texts)
+
+
+def _bench_match_topics_tfidf(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json", matcher="tfidf")
+    texts = [question["raw_text"] for question in _questions(data_dir, years)]
+    return lambda: ontology.match_topics_batch(texts, 3), len(texts)
+
+
+def _bench_dedup(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    texts = [question["raw_text"] for question in _questions(data_dir, years)]
+    return lambda: cluster_near_duplicates(texts), len(texts)
+
+
+def _bench_auto_label(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    questions = _questions(data_dir, years)
+    return lambda: auto_label_questions(questions, ontology), len(questions)
+
+
+def _bench_predict(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    questions = _questions(data_dir, years)
+    predictor = SimpleFrequencyPredictor()
+    return lambda: predictor.predict(questions, ontology, {}), len(questions)
+
+
+def _bench_tune(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+
+    def run():
+        # A fresh tuner per run, so the split preparation is included.
+        with mock.patch("src.autotune.dump_yaml"):
+            return AutoTuner(data_dir, ontology).tune(years, 40, 0.001, 12)
+
+    return run, len(AutoTuner(data_dir, ontology)._candidate_configs())
+
+
+def _bench_bootstrap(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
+    tuner = AutoTuner(data_dir, ontology)
+    session = tuner.session(years)
+    per_config = [session.question_metrics(config, 40) for config in tuner._candidate_configs()]
+    # Every grid candidate's four metrics per question, as the tuning report resamples them.
+    strata = [
+        [sum((run[split_idx][question_idx] for run in per_config), ()) for question_idx in range(len(split.gold))]
+        for split_idx, split in enumerate(session.splits)
+    ]
+    return lambda: bootstrap_means(strata, 10000), len(per_config)
+
+
+def _bench_pipeline(data_dir: Path, years: List[int]) -> Tuple[Callable[[], object], int]:
+    def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            argv = [
+                "pipeline",
+                "--data-dir", str(data_dir),
+                "--reports-dir", f"{tmp}/reports",
+                "--predictions-dir", f"{tmp}/predictions",
+                "--cache-dir", f"{tmp}/cache",
+                "--years", *map(str, years),
+            ]
+            with mock.patch.object(sys, "argv", argv), mock.patch("src.autotune.dump_yaml"):
+                pipeline.main()
+
+    return run, len(years)
+
+
+BENCHMARKS: Dict[str, Callable[[Path, List[int]], Tuple[Callable[[], object], int]]] = {
+    "ontology_build": _bench_ontology_build,
+    "load_year_data": _bench_load_year_data,
+    "match_topics": _bench_match_topics,
+    "match_topics_tfidf": _bench_match_topics_tfidf,
+    "cluster_near_duplicates": _bench_dedup,
+    "auto_label_questions": _bench_auto_label,
+    "predict": _bench_predict,
+    "tune": _bench_tune,
+    "bootstrap_10k": _bench_bootstrap,
+    "pipeline_main": _bench_pipeline,
+}
+
+
+def _time_per_call(run: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        run()
+    return (time.perf_counter() - start) / number
+
+
+def run_suite(
+    data_dir: Path, years: List[int], names: List[str], repeats: int, min_repeat_seconds: float = 0.05
+) -> Dict[str, dict]:
+    """Per-call min and median over ``repeats``; fast benchmarks loop until a repeat is long enough."""
+    results = {}
+    for name in names:
+        run, items = BENCHMARKS[name](data_dir, years)
+        first = _time_per_call(run, 1)
+        number = max(1, math.ceil(min_repeat_seconds / max(first, 1e-9)))
+        timings = [_time_per_call(run, number) for _ in range(repeats)]
+        results[name] = {
+            "min_seconds": min(timings),
+            "median_seconds": statistics.median(timings),
+            "repeats": repeats,
+            "number": number,
+            "items": items,
+        }
+        print(
+            f"{name:>22}: min {min(timings) * 1000:9.2f} ms, "
+            f"median {statistics.median(timings) * 1000:9.2f} ms ({items} items)"
+        )
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> List[str]:
+    """Print min-time ratios and return the benchmarks slower than ``1 + threshold``."""
+    if baseline.get("dataset") != current.get("dataset"):
+        print(f"warning: datasets differ: {baseline.get('dataset')} vs {current.get('dataset')}")
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            print(f"{name:>22}: new")
+            continue
+        ratio = result["min_seconds"] / reference["min_seconds"]
+        flag = ratio > 1 + threshold
+        if flag:
+            regressions.append(name)
+        print(f"{name:>22}: {ratio:6.2f}x {'SLOWER' if flag else 'ok'}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic scale-up benchmarks with JSON baselines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run")
+    run_parser.add_argument("--scale", type=float, default=1.0)
+    run_parser.add_argument("--topics", type=int, default=3000)
+    run_parser.add_argument("--years", type=int, nargs="+", default=[2022, 2023, 2024, 2025])
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--harrison-zip", default=None)
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=list(BENCHMARKS))
+    run_parser.add_argument("--output", default=None, help="results JSON (e.g. benchmarks/baselines/scale1.json)")
+    run_parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    run_parser.add_argument("--threshold", type=float, default=0.25)
+
+    compare_parser = commands.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = json.loads(Path(args.current).read_text())
+        if compare(baseline, current, args.threshold):
+            raise SystemExit(1)
+        return
+
+    dataset = {
+        "scale": args.scale,
+        "topics": args.topics,
+        "years": sorted(args.years),
+        "seed": args.seed,
+        "harrison": bool(args.harrison_zip),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = Path(tmp) / "data"
+        summary = generate_dataset(
+            data_dir,
+            args.scale,
+            args.topics,
+            args.years,
+            args.seed,
+            Path(args.harrison_zip) if args.harrison_zip else None,
+        )
+        print(f"dataset: {summary['questions']} questions, {summary['topics']} topics, years {summary['years']}")
+        results = run_suite(data_dir, summary["years"], args.only, args.repeats)
+
+    payload = {
+        "dataset": dataset,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(payload, indent=2) + "\n")
+    if args.compare:
+        if compare(json.loads(Path(args.compare).read_text()), payload, args.threshold):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
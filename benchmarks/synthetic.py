@@ -0,0 +1,158 @@
+import argparse
+import random
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+from benchmarks.bench_hierarchy import HARRISON_CSV
+from src.prepare_data import (
+    _iter_csv_from_zip,
+    build_papers_json,
+    build_question_store,
+    build_topic_seed,
+    build_year_bundle,
+    harrison_domain_id,
+)
+
+
+DOMAINS = [
+    "General / Misc",
+    "Cardiology",
+    "Respiratory",
+    "Nephrology",
+    "Neurology",
+    "Endocrinology",
+    "Rheumatology",
+    "Infectious Diseases",
+    "Gastroenterology",
+    "Hematology",
+]
+SYLLABLES = [
+    "car", "dio", "neph", "ro", "pul", "mo", "hep", "ato", "my", "el",
+    "itis", "oma", "osis", "gen", "tro", "lyt", "ic", "pha", "scler", "derm",
+]
+TEMPLATES = [
+    "Discuss the etiology and management of {topic}.",
+    "Describe the clinical features of {topic}.",
+    "Approach to a patient with {topic}.",
+    "Write short notes on {topic} and {other}.",
+    "Outline the investigations in {topic}.",
+]
+SECTIONS = ["Long essay 15 marks", "Short essay 10 marks", "Short answer 5 marks", ""]
+PAPERS = ["I", "II", "III", "IV"]
+
+
+def topic_rows(n_topics: int, rng: random.Random, harrison_zip: Optional[Path] = None) -> List[dict]:
+    """Topic table rows in the ``topic_table_from_exam_matches.csv`` layout.
+
+    Names come from the real Harrison index when ``harrison_zip`` is given,
+    otherwise from random syllable words.
+    """
+    rows = []
+    names = set()
+    source = _iter_csv_from_zip(harrison_zip, HARRISON_CSV) if harrison_zip else None
+    while len(rows) < n_topics:
+        if source is not None:
+            entry = next(source, None)
+            if entry is None:
+                break
+            # Index terms repeat across pages; their ids are still distinct.
+            name, domain = entry["canonical_term"], entry.get("domain") or DOMAINS[0]
+        else:
+            words = [
+                "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 3))
+            ]
+            name, domain = " ".join(words), DOMAINS[min(int(rng.expovariate(0.6)), len(DOMAINS) - 1)]
+            if name in names:
+                continue
+            names.add(name)
+        rows.append(
+            {
+                "topic_id": f"TERM{len(rows) + 1:05d}",
+                "canonical_topic_name": name,
+                "synonyms": "",
+                "parent_id": harrison_domain_id(domain),
+                "parent_name": domain,
+                "domain": domain,
+                "term_norm": name.lower(),
+            }
+        )
+    if source is not None:
+        source.close()
+    return rows
+
+
+def question_rows(
+    topics: Sequence[dict], years: Sequence[int], per_paper: int, rng: random.Random, tagged: float = 0.6
+) -> Iterator[dict]:
+    """Question rows in the master CSV layout, ordered by paper then year like the archive.
+
+    Topic popularity is skewed (a few topics recur often), and ``tagged`` of
+    the questions carry Harrison tag ids; the rest are left to text matching.
+    """
+    for paper in PAPERS:
+        for year in years:
+            for idx in range(per_paper):
+                picked = [topics[int(len(topics) * rng.random() ** 3)] for _ in range(2)]
+                template = rng.choice(TEMPLATES)
+                text = template.format(topic=picked[0]["canonical_topic_name"], other=picked[1]["canonical_topic_name"])
+                used = picked if "{other}" in template else picked[:1]
+                is_tagged = rng.random() < tagged
+                yield {
+                    "year": str(year),
+                    "paper_id": paper,
+                    "section": rng.choice(SECTIONS),
+                    "question_id": f"SYN{year}_{paper}_{idx:05d}",
+                    "question_text": text,
+                    "tags_raw": "",
+                    "templates_str": "",
+                    "harrison_tag_ids": ";".join(row["topic_id"] for row in used) if is_tagged else "",
+                    "harrison_tag_terms": ";".join(row["canonical_topic_name"] for row in used) if is_tagged else "",
+                }
+
+
+def generate_dataset(
+    output_dir: Path,
+    scale: float = 1.0,
+    n_topics: int = 3000,
+    years: Sequence[int] = (2022, 2023, 2024, 2025),
+    seed: int = 0,
+    harrison_zip: Optional[Path] = None,
+) -> dict:
+    """Write a deterministic synthetic data dir in the layout ``prepare_data`` produces.
+
+    Scale 1 is about 40 questions per year, close to the real archive.
+    """
+    rng = random.Random(seed)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    topics = topic_rows(n_topics, rng, harrison_zip)
+    per_paper = max(1, round(10 * scale))
+    written_years = build_papers_json(question_rows(topics, sorted(years), per_paper, rng), output_dir)
+    build_year_bundle(output_dir, written_years)
+    build_question_store(output_dir, written_years)
+    build_topic_seed(topics, output_dir)
+    return {"topics": len(topics), "questions": per_paper * len(PAPERS) * len(written_years), "years": written_years}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--topics", type=int, default=3000)
+    parser.add_argument("--years", type=int, nargs="+", default=[2022, 2023, 2024, 2025])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--harrison-zip", default=None, help="take topic names from the real Harrison index")
+    args = parser.parse_args()
+
+    summary = generate_dataset(
+        Path(args.output_dir),
+        args.scale,
+        args.topics,
+        args.years,
+        args.seed,
+        Path(args.harrison_zip) if args.harrison_zip else None,
+    )
+    print(f"wrote {summary['questions']} questions over {len(summary['years'])} years, {summary['topics']} topics")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 import itertools
 import json
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from src.evaluate import Metrics, compute_metrics, load_year_data, macro_average, rolling_splits
-from src.labeling import auto_label_questions, load_gold_labels
-from src.ontology import TopicOntology
+from src.evaluate import (
+    Metrics,
+    load_year_data,
+    macro_average,
+    macro_metrics_at_ks,
+    question_metrics,
+    rolling_splits,
+)
+from src.incremental import TopicScoreState
+from src.labeling import LabelCache, auto_label_questions, load_gold_labels
+from src.ontology import TOPIC_IDS, TopicOntology
 from src.predictor_interface import SimpleFrequencyPredictor
+from src.search import STRATEGIES, Budget, GridSearch
 from src.utils import dump_yaml
 
 
@@ -17,18 +30,182 @@ class TuneResult:
     metrics: Metrics
 
 
+@dataclass
+class SplitArtifacts:
+    train_years: List[int]
+    test_year: int
+    # Interned topic ids, like the rankings they are compared with.
+    gold: List[List[int]]
+
+
+class TuningSession:
+    """Config-independent inputs of every rolling split, prepared once.
+
+    Gold labels, year data, auto-labels of the test years and the per-year
+    topic incidence of the questions do not depend on the config, so
+    evaluating a config only re-runs the weighted scoring. Train sets are
+    growing prefixes of the years, so one pass of running sums over the
+    years (``PrefixScores``) yields the train ranking of every split. With a
+    synced ``score_state`` the per-year incidence comes from its stored
+    contributions instead of re-matching the questions.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        ontology: TopicOntology,
+        years: List[int],
+        predictor: SimpleFrequencyPredictor,
+        label_cache: Optional[LabelCache] = None,
+        score_state: Optional[TopicScoreState] = None,
+    ):
+        self.ontology = ontology
+        self.predictor = predictor
+        years = sorted(years)
+        gold_labels = load_gold_labels(data_dir / "gold_labels.csv")
+        questions = {year: load_year_data(data_dir, year) for year in years}
+        if score_state is None:
+            prepared = [predictor.prepare(questions[year], ontology) for year in years]
+            self.train_scores = predictor.prefix_scores(prepared, ontology, years)
+        else:
+            self.train_scores = score_state.prefix_scores(years)
+        self.splits: List[SplitArtifacts] = []
+        for train_years, test_year in rolling_splits(years):
+            test_questions = questions[test_year]
+            auto_labels = auto_label_questions(test_questions, ontology, cache=label_cache)
+            gold_for_test = {
+                q["q_id"]: TOPIC_IDS.intern_all(gold_labels.get(q["q_id"], auto_labels.get(q["q_id"], [])))
+                for q in test_questions
+            }
+            self.splits.append(
+                SplitArtifacts(train_years=train_years, test_year=test_year, gold=list(gold_for_test.values()))
+            )
+
+    def evaluate(self, config: dict, k: int, n_splits: Optional[int] = None) -> Metrics:
+        return self.evaluate_batch([config], k, n_splits)[0]
+
+    def evaluate_batch(self, configs: List[dict], k: int, n_splits: Optional[int] = None) -> List[Metrics]:
+        """Macro-average over the most recent ``n_splits`` splits (all by default)."""
+        splits = self.splits if n_splits is None else self.splits[len(self.splits) - n_splits :]
+        lengths = [len(split.train_years) for split in splits]
+        results = []
+        for config in configs:
+            rankings = self.train_scores.ranked_topic_ids(config, lengths)
+            metrics = []
+            for split, predicted_topics in zip(splits, rankings):
+                metrics.append(macro_metrics_at_ks(predicted_topics, split.gold, [k])[0])
+            results.append(macro_average(metrics))
+        return results
+
+    def question_metrics(self, config: dict, k: int) -> List[List[Tuple[float, float, float, float]]]:
+        """Per-question metrics of ``config`` on each split, for bootstrapping."""
+        rankings = self.train_scores.ranked_topic_ids(config, [len(split.train_years) for split in self.splits])
+        return [question_metrics(predicted, split.gold, k) for split, predicted in zip(self.splits, rankings)]
+
+
+_WORKER_SESSION: Optional[TuningSession] = None
+
+
+def _init_worker(session: TuningSession) -> None:
+    global _WORKER_SESSION
+    _WORKER_SESSION = session
+
+
+def _evaluate_in_worker(config: dict, k: int, n_splits: int) -> Metrics:
+    return _WORKER_SESSION.evaluate(config, k, n_splits)
+
+
+def _pool_context():
+    # Forked workers inherit the prepared session copy-on-write; elsewhere it
+    # is pickled once per worker through the pool initializer. Forking copies
+    # no other threads, so callers must not fork while another thread may
+    # hold a lock (the pipeline runs stages serially when --workers > 1).
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+class ConfigEvaluator:
+    """Evaluates configs against a session, serially or over a process pool.
+
+    ``map`` yields metrics in the order the configs were given, so the
+    stopping rule in ``AutoTuner.tune`` sees the same sequence as a serial
+    run. ``fidelity`` is the fraction of the most recent rolling splits to
+    evaluate on, and ``evaluations`` counts consumed results in
+    full-evaluation equivalents.
+    """
+
+    def __init__(self, session: TuningSession, k: int, workers: int = 1):
+        self.session = session
+        self.k = k
+        self.n_splits = len(session.splits)
+        self.batch_size = max(1, workers)
+        self.evaluations = 0.0
+        self._executor = None
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=_pool_context(),
+                initializer=_init_worker,
+                initargs=(session,),
+            )
+
+    def map(self, configs: List[dict], fidelity: float = 1.0) -> Iterator[Metrics]:
+        n_splits = min(self.n_splits, max(1, round(fidelity * self.n_splits)))
+        if self._executor is None:
+            results = (self.session.evaluate(config, self.k, n_splits) for config in configs)
+        else:
+            chunksize = max(1, len(configs) // (self.batch_size * 4))
+            results = self._executor.map(
+                _evaluate_in_worker,
+                configs,
+                itertools.repeat(self.k, len(configs)),
+                itertools.repeat(n_splits, len(configs)),
+                chunksize=chunksize,
+            )
+        for metrics in results:
+            self.evaluations += n_splits / max(1, self.n_splits)
+            yield metrics
+
+    def close(self) -> None:
+        # Candidates still pending when the search stops are cancelled.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+
 class AutoTuner:
-    def __init__(self, data_dir: Path, ontology: TopicOntology, seed: int = 42):
+    def __init__(
+        self,
+        data_dir: Path,
+        ontology: TopicOntology,
+        seed: int = 42,
+        label_cache: Optional[LabelCache] = None,
+        score_state: Optional[TopicScoreState] = None,
+        predictor: Optional[SimpleFrequencyPredictor] = None,
+    ):
         self.data_dir = data_dir
         self.ontology = ontology
         self.seed = seed
-        self.predictor = SimpleFrequencyPredictor()
+        self.label_cache = label_cache
+        self.score_state = score_state
+        self.predictor = predictor or SimpleFrequencyPredictor()
+        self._sessions: Dict[Tuple[int, ...], TuningSession] = {}
+
+    def session(self, years: List[int]) -> TuningSession:
+        key = tuple(sorted(years))
+        if key not in self._sessions:
+            self._sessions[key] = TuningSession(
+                self.data_dir, self.ontology, list(key), self.predictor, self.label_cache, self.score_state
+            )
+        return self._sessions[key]
 
     def _candidate_configs(self) -> List[dict]:
         weights = [0.8, 1.0, 1.2]
+        # No decay first: the grid stops early, and ties keep the earliest candidate.
+        recency_weights = [1.0, 0.8, 1.2]
         graph = [0.05, 0.1, 0.2]
         configs = []
-        for recency, marks, frequency, graph_weight in itertools.product(weights, weights, weights, graph):
+        for recency, marks, frequency, graph_weight in itertools.product(recency_weights, weights, weights, graph):
             configs.append(
                 {
                     "recency_weight": recency,
@@ -40,47 +217,65 @@ class AutoTuner:
         return configs
 
     def evaluate_config(self, config: dict, years: List[int], k: int) -> Metrics:
-        metrics = []
-        gold_labels = load_gold_labels(self.data_dir / "gold_labels.csv")
-        for train_years, test_year in rolling_splits(years):
-            train_questions = []
-            for year in train_years:
-                train_questions.extend(load_year_data(self.data_dir, year))
-            test_questions = load_year_data(self.data_dir, test_year)
-            auto_labels = auto_label_questions(test_questions, self.ontology)
-            gold_for_test = {
-                q["q_id"]: gold_labels.get(q["q_id"], auto_labels.get(q["q_id"], []))
-                for q in test_questions
-            }
-            predictions = self.predictor.predict(train_questions, self.ontology, config)
-            predicted_topics = [pred.topic_id for pred in predictions]
-            per_question_metrics = [
-                compute_metrics(predicted_topics, gold, k) for gold in gold_for_test.values()
-            ]
-            metrics.append(macro_average(per_question_metrics))
-        return macro_average(metrics)
-
-    def tune(self, years: List[int], k: int, epsilon: float, max_rounds: int) -> Dict[str, TuneResult]:
-        best: TuneResult = None
+        return self.session(years).evaluate(config, k)
+
+    def _strategy(self, name: str):
+        if name == GridSearch.name:
+            return GridSearch(self._candidate_configs())
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown search strategy: {name}")
+        return STRATEGIES[name]()
+
+    def tune(
+        self,
+        years: List[int],
+        k: int,
+        epsilon: float,
+        max_rounds: int,
+        workers: int = 1,
+        strategy: str = "grid",
+        max_evals: Optional[float] = None,
+        max_seconds: Optional[float] = None,
+    ) -> dict:
+        """Search configs; returns ``{"best": TuneResult or None, "history": {run_id: TuneResult}, "search": {...}}``.
+
+        ``search`` summarizes the run: strategy, evaluations spent, evaluations
+        until the best config was found, and wall-clock seconds.
+        """
+        best: Optional[TuneResult] = None
         history: Dict[str, TuneResult] = {}
-        configs = self._candidate_configs()
         rounds_without_improvement = 0
-        for idx, config in enumerate(configs, start=1):
-            result = self.evaluate_config(config, years, k)
-            key = f"candidate_{idx}"
-            history[key] = TuneResult(config=config, metrics=result)
-            if best is None or result.recall_at_k > best.metrics.recall_at_k:
-                best = TuneResult(config=config, metrics=result)
-                rounds_without_improvement = 0
-            else:
-                rounds_without_improvement += 1
-            if rounds_without_improvement >= max_rounds:
-                break
-            if best and abs(result.recall_at_k - best.metrics.recall_at_k) < epsilon:
-                continue
+        evaluations_to_best = None
+        search = self._strategy(strategy)
+        started = time.perf_counter()
+        evaluator = ConfigEvaluator(self.session(years), k, workers)
+        results = search.search(evaluator, Budget(max_evals, max_seconds), random.Random(self.seed))
+        try:
+            for idx, (config, result) in enumerate(results, start=1):
+                key = f"candidate_{idx}"
+                history[key] = TuneResult(config=config, metrics=result)
+                if best is None or result.recall_at_k > best.metrics.recall_at_k:
+                    best = TuneResult(config=config, metrics=result)
+                    evaluations_to_best = evaluator.evaluations
+                    rounds_without_improvement = 0
+                else:
+                    rounds_without_improvement += 1
+                if rounds_without_improvement >= max_rounds:
+                    break
+                if best and abs(result.recall_at_k - best.metrics.recall_at_k) < epsilon:
+                    continue
+        finally:
+            results.close()
+            evaluator.close()
         if best:
             dump_yaml(best.config, Path("configs/best_config.yaml"))
         return {
             "best": best,
             "history": history,
+            "search": {
+                "strategy": search.name,
+                "evaluations": evaluator.evaluations,
+                "evaluations_to_best": evaluations_to_best,
+                "seconds": time.perf_counter() - started,
+            },
         }
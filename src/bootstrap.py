@@ -0,0 +1,93 @@
+import operator
+import random
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.profiling import profiled
+
+
+METRIC_NAMES = ("recall_at_k", "precision_at_k", "map_at_k", "ndcg_at_k")
+# Values are summed as fixed-point integers: SCALE_BITS fractional bits in a
+# 32-bit field ("I" arrays), which leaves 2**4 of headroom for sums of values <= 1.
+SCALE_BITS = 28
+FIELD_CODE = "I"
+
+
+@profiled()
+def bootstrap_means(
+    strata: Sequence[Sequence[Sequence[Optional[float]]]], resamples: int = 10000, seed: int = 0
+) -> List[array]:
+    """Bootstrap distributions of many macro-averaged statistics at once.
+
+    ``strata[s][q][f]`` is statistic ``f`` of question ``q`` in stratum
+    ``s`` (a rolling split), or None in every row of a stratum the statistic
+    does not cover. A statistic's value is the mean, over the strata it
+    covers, of its mean over the stratum's questions, which is how the
+    reports average per-question metrics. Each resample redraws every
+    stratum's questions with replacement, and all statistics see the same
+    draw, so differences between two distributions are paired.
+
+    The draws are shared, so the statistics are packed side by side into
+    one integer per question, each in a fixed-point field of
+    32 bits, and a resample is a single ``sum`` over the drawn questions'
+    integers: the per-statistic additions run inside the integer
+    arithmetic rather than in a Python loop. Values must lie in [0, 1];
+    fixed-point rounding adds at most 2**-29 per question.
+
+    Returns one array of ``resamples`` values per statistic, in resample
+    order.
+    """
+    strata = [stratum for stratum in strata if stratum]
+    if not strata:
+        return []
+    n_fields = len(strata[0][0])
+    coverage = [sum(1 for stratum in strata if stratum[0][field] is not None) for field in range(n_fields)]
+    packed: List[int] = []
+    populations: List[range] = []
+    for stratum in strata:
+        scale = [
+            (1 << SCALE_BITS) / (len(stratum) * coverage[field]) if coverage[field] else 0.0
+            for field in range(n_fields)
+        ]
+        start = len(packed)
+        for row in stratum:
+            fields = array(FIELD_CODE)
+            for value, weight in zip(row, scale):
+                if value is not None and not 0.0 <= value <= 1.0:
+                    raise ValueError(f"Bootstrapped values must lie in [0, 1], got {value}")
+                fields.append(round(value * weight) if value is not None else 0)
+            packed.append(int.from_bytes(fields.tobytes(), sys.byteorder))
+        populations.append(range(start, len(packed)))
+
+    rng = random.Random(seed)
+    n_bytes = n_fields * array(FIELD_CODE).itemsize
+    sums = array(FIELD_CODE)
+    for _ in range(resamples):
+        indices: List[int] = []
+        for population in populations:
+            indices += rng.choices(population, k=len(population))
+        total = sum(map(packed.__getitem__, indices))
+        sums.frombytes(total.to_bytes(n_bytes, sys.byteorder))
+    unit = 1.0 / (1 << SCALE_BITS)
+    return [array("d", [value * unit for value in sums[field::n_fields]]) for field in range(n_fields)]
+
+
+def percentile_interval(values: Sequence[float], confidence: float = 0.95) -> Tuple[float, float]:
+    """The central ``confidence`` percentile interval of a bootstrap distribution."""
+    ordered = sorted(values)
+    tail = (1.0 - confidence) / 2
+    last = len(ordered) - 1
+    return ordered[round(tail * last)], ordered[round((1.0 - tail) * last)]
+
+
+def paired_differences(values: Sequence[float], baseline: Sequence[float]) -> array:
+    """Resample-by-resample differences of two distributions drawn together."""
+    return array("d", map(operator.sub, values, baseline))
+
+
+def metric_intervals(
+    distributions: Sequence[Sequence[float]], confidence: float = 0.95
+) -> Dict[str, Tuple[float, float]]:
+    """Intervals of the four metrics, given their distributions in ``METRIC_NAMES`` order."""
+    return {name: percentile_interval(values, confidence) for name, values in zip(METRIC_NAMES, distributions)}
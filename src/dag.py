@@ -0,0 +1,197 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from src.profiling import stage as profile_stage
+
+
+DAG_CACHE_VERSION = 1
+
+
+@dataclass
+class Stage:
+    """One pipeline step.
+
+    ``run`` is called with the values of ``deps`` in order. ``inputs`` are
+    the files it reads, ``outputs`` the files it writes, ``params`` the
+    settings that change its result and ``code`` the functions or modules
+    whose source it depends on. Stages with ``cache=False`` return live
+    objects that are not stored; they run whenever a dependent stage does.
+    """
+
+    name: str
+    run: Callable[..., object]
+    deps: Tuple[str, ...] = ()
+    inputs: Tuple[Path, ...] = ()
+    outputs: Tuple[Path, ...] = ()
+    params: dict = field(default_factory=dict)
+    code: Tuple[object, ...] = ()
+    cache: bool = True
+
+
+def file_digest(path: Path) -> Optional[str]:
+    if not path.is_file():
+        return None
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StageGraph:
+    """Runs stages in dependency order, skipping those whose key is cached.
+
+    A stage's key hashes its name, params, code, input file contents and
+    the keys of its dependencies, so a change anywhere upstream changes the
+    keys downstream. Results and output files are stored by content hash
+    under ``cache_dir/objects``; a manifest per (stage, key) records them.
+    On a hit the stage is skipped and missing or edited outputs are
+    restored from the store. Stages whose dependencies are resolved run
+    concurrently on up to ``jobs`` threads.
+    """
+
+    def __init__(self, stages: Sequence[Stage], cache_dir: Path, jobs: int = 1, force: bool = False):
+        self.stages: Dict[str, Stage] = {}
+        for item in stages:
+            unknown = [dep for dep in item.deps if dep not in self.stages]
+            if unknown:
+                raise ValueError(f"Stage {item.name} depends on unknown or later stages: {unknown}")
+            self.stages[item.name] = item
+        self.cache_dir = Path(cache_dir)
+        self.jobs = max(1, jobs)
+        self.force = force
+        self.executed: List[str] = []
+        self.skipped: List[str] = []
+
+    def keys(self) -> Dict[str, str]:
+        keys: Dict[str, str] = {}
+        for name, item in self.stages.items():
+            payload = {
+                "version": DAG_CACHE_VERSION,
+                "name": name,
+                "params": item.params,
+                "code": [inspect.getsource(obj) for obj in item.code],
+                "inputs": {str(path): file_digest(Path(path)) for path in item.inputs},
+                "outputs": [str(path) for path in item.outputs],
+                "deps": [keys[dep] for dep in item.deps],
+            }
+            encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+            keys[name] = hashlib.sha256(encoded).hexdigest()
+        return keys
+
+    def _manifest_path(self, name: str, key: str) -> Path:
+        return self.cache_dir / "stages" / f"{name}-{key[:16]}.json"
+
+    def _object_path(self, digest: str) -> Path:
+        return self.cache_dir / "objects" / digest[:2] / digest
+
+    def _store_bytes(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{digest}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        return digest
+
+    def _restore(self, name: str, key: str) -> Optional[dict]:
+        """The manifest of a cached run, with its outputs put back in place, or None."""
+        path = self._manifest_path(name, key)
+        try:
+            manifest = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        if manifest.get("key") != key:
+            return None
+        blobs = [manifest["value"], *manifest["outputs"].values()]
+        if not all(self._object_path(digest).exists() for digest in blobs):
+            return None
+        for output, digest in manifest["outputs"].items():
+            output = Path(output)
+            if file_digest(output) != digest:
+                output.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(self._object_path(digest), output)
+        return manifest
+
+    def _save(self, name: str, key: str, value: object) -> None:
+        item = self.stages[name]
+        manifest = {
+            "key": key,
+            "value": self._store_bytes(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)),
+            "outputs": {
+                str(path): self._store_bytes(Path(path).read_bytes())
+                for path in item.outputs
+                if Path(path).is_file()
+            },
+        }
+        path = self._manifest_path(name, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp_path, path)
+
+    def _load_value(self, manifest: dict) -> object:
+        with self._object_path(manifest["value"]).open("rb") as handle:
+            return pickle.load(handle)
+
+    def _execute(self, name: str, dep_values: List[object]) -> object:
+        with profile_stage(name):
+            return self.stages[name].run(*dep_values)
+
+    def run(self) -> Dict[str, object]:
+        """Bring every stage up to date; returns the values that were computed or loaded."""
+        keys = self.keys()
+        self.executed, self.skipped = [], []
+        manifests: Dict[str, dict] = {}
+        to_run: Set[str] = set()
+        for name in reversed(list(self.stages)):
+            # Dependents come later, so they have already been decided.
+            item = self.stages[name]
+            needed_by_run = any(name in self.stages[other].deps for other in to_run)
+            if item.cache and not self.force:
+                manifest = self._restore(name, keys[name])
+                if manifest is not None:
+                    manifests[name] = manifest
+                    continue
+            if item.cache or needed_by_run:
+                to_run.add(name)
+        self.skipped = [name for name in self.stages if name in manifests]
+
+        values: Dict[str, object] = {}
+        for name in self.stages:
+            if name in manifests and any(name in self.stages[other].deps for other in to_run):
+                values[name] = self._load_value(manifests[name])
+
+        pending = [name for name in self.stages if name in to_run]
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            while pending or running:
+                for name in list(pending):
+                    if all(dep in values for dep in self.stages[name].deps):
+                        pending.remove(name)
+                        dep_values = [values[dep] for dep in self.stages[name].deps]
+                        running[pool.submit(self._execute, name, dep_values)] = name
+                if not running:
+                    raise RuntimeError(f"Stages cannot be scheduled: {pending}")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        values[name] = future.result()
+                    except BaseException:
+                        for other in running:
+                            other.cancel()
+                        raise
+                    if self.stages[name].cache:
+                        self._save(name, keys[name], values[name])
+                    self.executed.append(name)
+        return values
@@ -0,0 +1,128 @@
+import hashlib
+from array import array
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Set, Tuple
+
+from src.tokens import normalize_text, tokenize
+
+
+SHINGLE_SIZE = 5
+MIN_COMMON_COUNT = 10
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character ``size``-grams of the normalized text (the whole text if shorter)."""
+    normalized = normalize_text(text)
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[idx : idx + size] for idx in range(len(normalized) - size + 1)}
+
+
+def minhash_signature(shingle_set: Iterable[str], num_perm: int = 64, seed: int = 1) -> Tuple[int, ...]:
+    """MinHash signature with ``num_perm`` independent 32-bit hashes per shingle.
+
+    Each shingle's hashes are read off one seeded SHAKE-128 digest, and the
+    signature is their element-wise minimum. Python's ``hash`` is salted per
+    process, so it cannot be used for reproducible signatures.
+    """
+    prefix = seed.to_bytes(4, "little")
+    columns = [
+        array("I", hashlib.shake_128(prefix + shingle.encode("utf-8")).digest(4 * num_perm))
+        for shingle in shingle_set
+    ]
+    return tuple(map(min, zip(*columns)))
+
+
+def _find(parent: List[int], idx: int) -> int:
+    while parent[idx] != idx:
+        parent[idx] = parent[parent[idx]]
+        idx = parent[idx]
+    return idx
+
+
+def cluster_near_duplicates(
+    texts: Sequence[str],
+    threshold: float = 0.8,
+    num_perm: int = 64,
+    bands: int = 16,
+    max_df: float = 0.01,
+    seed: int = 1,
+) -> List[int]:
+    """Group texts whose shingle Jaccard similarity is at least ``threshold``.
+
+    Shingles found in more than ``max_df`` of the distinct texts (and in at
+    least ``MIN_COMMON_COUNT`` of them) are question boilerplate such as
+    "write short notes on" and are left out of the comparison: they would
+    merge "management of X" with "management of Y" and put most texts in
+    the same LSH buckets. Texts made only of common shingles keep them all.
+
+    Signatures are split into ``bands`` bands; texts sharing any band bucket
+    become candidates, and candidates are confirmed on their exact shingle
+    sets, so LSH only decides which pairs are compared. With 16 bands of 4
+    rows a pair at Jaccard 0.8 is a candidate with probability > 0.999.
+    Clusters are the connected components of confirmed pairs (single
+    linkage). Returns, for each text, the index of the first text of its
+    cluster.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rows = num_perm // bands
+    # Texts with identical shingle sets are merged up front; only the
+    # distinct sets go through LSH.
+    first_of: Dict[FrozenSet[str], int] = {}
+    parent = []
+    for idx, text in enumerate(texts):
+        first = first_of.setdefault(frozenset(shingles(text)), idx)
+        parent.append(first)
+    document_frequency = Counter(shingle for shingle_set in first_of for shingle in shingle_set)
+    cutoff = max(max_df * len(first_of), MIN_COMMON_COUNT)
+    common = {shingle for shingle, count in document_frequency.items() if count > cutoff}
+    shingle_sets = {idx: shingle_set - common or shingle_set for shingle_set, idx in first_of.items()}
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for idx in sorted(shingle_sets):
+        shingle_set = shingle_sets[idx]
+        signature = minhash_signature(shingle_set, num_perm, seed)
+        for band in range(bands):
+            members = buckets.setdefault((band, signature[band * rows : (band + 1) * rows]), [])
+            for other in members:
+                root, other_root = _find(parent, idx), _find(parent, other)
+                if root == other_root:
+                    continue
+                other_set = shingle_sets[other]
+                overlap = len(shingle_set & other_set)
+                if overlap >= threshold * (len(shingle_set) + len(other_set) - overlap):
+                    # The earlier text stays the root, so roots are cluster representatives.
+                    parent[max(root, other_root)] = min(root, other_root)
+            members.append(idx)
+    return [_find(parent, idx) for idx in range(len(texts))]
+
+
+def assign_clusters(questions: Iterable[dict], threshold: float = 0.8) -> Dict[str, Tuple[str, int, str]]:
+    """Map each question id to (cluster id, cluster size, representative text).
+
+    Questions are taken in (year, input) order and a cluster is named after
+    its earliest question, whose text represents the cluster, so ids stay
+    stable as new years are appended. Only (year, id, text) of each row is
+    kept, so the rows themselves can be streamed.
+    """
+    ordered = sorted(
+        ((int(question["year"]), question["question_id"], question["question_text"]) for question in questions),
+        key=lambda row: row[0],
+    )
+    roots = cluster_near_duplicates([text for _, _, text in ordered], threshold)
+    sizes = Counter(roots)
+    return {
+        q_id: (ordered[root][1], sizes[root], ordered[root][2]) for (_, q_id, _), root in zip(ordered, roots)
+    }
+
+
+def match_text(question: dict) -> str:
+    """The text topic matching runs on: the cluster representative's, if clustered."""
+    return question.get("cluster_text") or question["raw_text"]
+
+
+def match_tokens(question: dict) -> Sequence[int]:
+    """``match_text`` as vocabulary ids: stored with the question, else tokenized (the regex work is cached)."""
+    tokens = question.get("match_tokens")
+    return tokens if tokens is not None else tokenize(match_text(question))
@@ -1,7 +1,10 @@
 import json
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from src.profiling import profiled
+from src.question_store import open_question_store
 
 
 @dataclass
@@ -54,6 +57,7 @@ def ndcg_at_k(predicted: List[str], gold: List[str], k: int) -> float:
     return dcg(predicted) / ideal
 
 
+@profiled()
 def compute_metrics(predicted: List[str], gold: List[str], k: int) -> Metrics:
     return Metrics(
         recall_at_k=recall_at_k(predicted, gold, k),
@@ -63,8 +67,107 @@ def compute_metrics(predicted: List[str], gold: List[str], k: int) -> Metrics:
     )
 
 
-def load_year_data(data_dir: Path, year: int) -> List[dict]:
+def rank_positions(predicted: List[str]) -> Dict[str, List[int]]:
+    """1-based positions of every topic in a ranked list."""
+    positions: Dict[str, List[int]] = {}
+    for idx, topic in enumerate(predicted, start=1):
+        positions.setdefault(topic, []).append(idx)
+    return positions
+
+
+def metrics_at_ks(
+    positions: Dict[str, List[int]], n_predicted: int, gold: List[str], ks: Sequence[int]
+) -> Tuple[List[float], List[float], List[float], List[float]]:
+    """All four metrics of one gold list for every K, in one sweep.
+
+    ``ks`` must be ascending. Hits are read from the rank-position map, and
+    running sums accumulate in rank order, so each value equals what
+    ``compute_metrics`` returns for that K.
+    """
+    recall, precision, ap, ndcg = [], [], [], []
+    gold_set = set(gold)
+    first_hits = sorted(positions[topic][0] for topic in gold_set if topic in positions)
+    all_hits = sorted(idx for topic in gold_set if topic in positions for idx in positions[topic])
+    distinct = 0
+    hits = 0
+    ap_sum = 0.0
+    dcg = 0.0
+    ideal = 0.0
+    ideal_len = 0
+    for k in ks:
+        while distinct < len(first_hits) and first_hits[distinct] <= k:
+            distinct += 1
+        while hits < len(all_hits) and all_hits[hits] <= k:
+            idx = all_hits[hits]
+            hits += 1
+            ap_sum += hits / idx
+            dcg += 1.0 / idx
+        while ideal_len < min(len(gold), k):
+            ideal_len += 1
+            ideal += 1.0 / ideal_len
+        if not gold:
+            recall.append(0.0)
+            ap.append(0.0)
+        else:
+            recall.append(distinct / len(gold_set))
+            ap.append(ap_sum / min(len(gold), k) if k else 0.0)
+        shown = min(k, n_predicted)
+        precision.append(distinct / shown if k and shown else 0.0)
+        ndcg.append(dcg / ideal if ideal else 0.0)
+    return recall, precision, ap, ndcg
+
+
+@profiled()
+def macro_metrics_at_ks(predicted: List[str], golds: Sequence[List[str]], ks: Sequence[int]) -> List[Metrics]:
+    """Macro-averaged metrics of one ranking against many gold lists, per K.
+
+    Equivalent to ``macro_average([compute_metrics(predicted, gold, k) ...])``
+    for each K in ``ks``, but the ranking is indexed once and every gold list
+    is swept once for all Ks.
+    """
+    order = sorted(range(len(ks)), key=ks.__getitem__)
+    sorted_ks = [ks[i] for i in order]
+    positions = rank_positions(predicted)
+    columns: List[List[List[float]]] = [[[] for _ in ks] for _ in range(4)]
+    for gold in golds:
+        for column, values in zip(columns, metrics_at_ks(positions, len(predicted), gold, sorted_ks)):
+            for slot, value in zip(order, values):
+                column[slot].append(value)
+    if not golds:
+        return [Metrics(0.0, 0.0, 0.0, 0.0) for _ in ks]
+    return [
+        Metrics(*(sum(column[slot]) / len(golds) for column in columns)) for slot in range(len(ks))
+    ]
+
+
+def question_metrics(
+    predicted: List[str], golds: Sequence[List[str]], k: int
+) -> List[Tuple[float, float, float, float]]:
+    """(recall, precision, MAP, NDCG)@k of one ranking against each gold list.
+
+    Their mean is what ``macro_metrics_at_ks`` reports; bootstrapping
+    resamples these per-question values.
+    """
+    positions = rank_positions(predicted)
+    return [
+        tuple(values[0] for values in metrics_at_ks(positions, len(predicted), gold, [k])) for gold in golds
+    ]
+
+
+@profiled()
+def load_year_data(data_dir: Path, year: int) -> Sequence[dict]:
+    """Questions of one year, from the columnar store when it is up to date.
+
+    The store is memory-mapped once per process and each call returns a
+    zero-copy view; ``papers_YYYY.json`` is parsed only when there is no
+    store, it lacks the year, or the JSON file is newer than the store.
+    """
     path = data_dir / f"papers_{year}.json"
+    store = open_question_store(data_dir)
+    if store is not None and (not path.exists() or path.stat().st_mtime_ns <= store.path.stat().st_mtime_ns):
+        view = store.view(year)
+        if len(view):
+            return view
     payload = json.loads(path.read_text())
     return payload["questions"]
 
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.evaluate import load_year_data
+from src.ontology import TOPIC_IDS, TopicOntology
+from src.predictor_interface import (
+    CompiledQuestions,
+    PredictionResult,
+    PrefixScores,
+    SimpleFrequencyPredictor,
+    add_question_entries,
+)
+
+
+SCORE_STATE_VERSION = 3
+
+BucketKey = Tuple[int, Optional[int]]
+
+
+def _bucket_order(key: BucketKey) -> Tuple[int, bool, int]:
+    year, paper_id = key
+    return year, paper_id is None, paper_id or 0
+
+
+def _tag_list(question: dict) -> List[str]:
+    """The Harrison tags ``topic_candidates`` reads, whichever field holds them."""
+    if question.get("tag_ids") is not None:
+        return TOPIC_IDS.strings(question["tag_ids"])
+    if question.get("harrison_tags") is not None:
+        return list(question["harrison_tags"])
+    return [tag for tag in (question.get("harrison_tag_ids") or "").split(";") if tag]
+
+
+def year_digest(questions: Iterable[dict]) -> str:
+    """Hash of the fields the predictor reads, used to detect edited years.
+
+    Tags are hashed as strings, so store-backed and JSON-backed rows of the
+    same year digest alike.
+    """
+    digest = hashlib.sha256()
+    for question in questions:
+        fields = [
+            question["q_id"],
+            question["raw_text"],
+            question.get("cluster_text") or "",
+            question.get("paper_id"),
+            _tag_list(question),
+            question.get("marks"),
+        ]
+        digest.update(json.dumps(fields).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TopicScoreState:
+    """Config-independent per-topic score contributions by (year, paper).
+
+    Each bucket maps a topic to its (kind, marks / 15) contributions in
+    question order, i.e. the per-year slice of a ``CompiledQuestions``
+    column. Adding a year costs O(its questions); scoring any config over
+    any set of years and papers concatenates the stored buckets and never
+    re-matches question text. Buckets are combined in (year, paper) order,
+    which is the order ``predict`` sees questions in, so scores and tie
+    order are identical to it. Contributions depend on how many ancestor
+    hops are propagated, so the state is tied to one ``graph_depth`` and to
+    the ontology's ``scoring_fingerprint`` (terms and parent links).
+    Topics are interned ids in memory and strings when pickled.
+    """
+
+    def __init__(self, ontology_fingerprint: str, graph_depth: int = 1):
+        self.ontology_fingerprint = ontology_fingerprint
+        self.graph_depth = graph_depth
+        self.buckets: Dict[BucketKey, Dict[int, List[Tuple[int, float]]]] = {}
+        self.year_digests: Dict[int, str] = {}
+
+    def years(self) -> List[int]:
+        return sorted(self.year_digests)
+
+    def add_year(
+        self,
+        year: int,
+        questions: Sequence[dict],
+        ontology: TopicOntology,
+        predictor: Optional[SimpleFrequencyPredictor] = None,
+    ) -> None:
+        """Add (or replace) one year's contributions."""
+        if ontology.scoring_fingerprint != self.ontology_fingerprint:
+            raise ValueError("Score state was built for a different ontology")
+        predictor = predictor or SimpleFrequencyPredictor(self.graph_depth)
+        if predictor.graph_depth != self.graph_depth:
+            raise ValueError(f"Score state was built for graph_depth={self.graph_depth}")
+        self.remove_year(year)
+        matches: Dict[str, List[int]] = {}
+        for question in questions:
+            topic_candidates = predictor.topic_candidates(question, ontology, matches)
+            if topic_candidates:
+                bucket = self.buckets.setdefault((year, question.get("paper_id")), {})
+                add_question_entries(bucket, topic_candidates, question.get("marks"), ontology, self.graph_depth)
+        self.year_digests[year] = year_digest(questions)
+
+    def remove_year(self, year: int) -> None:
+        for key in [key for key in self.buckets if key[0] == year]:
+            del self.buckets[key]
+        self.year_digests.pop(year, None)
+
+    def sync(
+        self,
+        data_dir: Path,
+        years: Iterable[int],
+        ontology: TopicOntology,
+        predictor: Optional[SimpleFrequencyPredictor] = None,
+    ) -> List[int]:
+        """Bring the state up to date with ``years`` on disk.
+
+        Only years that are new or whose questions changed are re-added.
+        Returns the years that were (re)built.
+        """
+        rebuilt = []
+        for year in sorted(years):
+            questions = load_year_data(data_dir, year)
+            if self.year_digests.get(year) != year_digest(questions):
+                self.add_year(year, questions, ontology, predictor)
+                rebuilt.append(year)
+        return rebuilt
+
+    def _entries(self, years: Iterable[int], paper_id: Optional[int] = None) -> Dict[int, List[Tuple[int, float]]]:
+        selected = set(years)
+        missing = selected - set(self.year_digests)
+        if missing:
+            raise ValueError(f"Years not in score state: {sorted(missing)}")
+        entries: Dict[int, List[Tuple[int, float]]] = {}
+        for key in sorted(self.buckets, key=_bucket_order):
+            year, bucket_paper = key
+            if year not in selected or (paper_id is not None and bucket_paper != paper_id):
+                continue
+            for topic_id, contributions in self.buckets[key].items():
+                entries.setdefault(topic_id, []).extend(contributions)
+        return entries
+
+    def compile(self, years: Optional[Iterable[int]] = None, paper_id: Optional[int] = None) -> CompiledQuestions:
+        return CompiledQuestions.from_entries(self._entries(self.year_digests if years is None else years, paper_id))
+
+    def prefix_scores(self, years: Iterable[int], paper_id: Optional[int] = None) -> PrefixScores:
+        """One block per year, in year order, for scoring rolling train prefixes or recency decay."""
+        years = sorted(years)
+        return PrefixScores([self._entries([year], paper_id) for year in years], years)
+
+    def rank(
+        self, config: dict, years: Optional[Iterable[int]] = None, paper_id: Optional[int] = None
+    ) -> List[PredictionResult]:
+        years = self.year_digests if years is None else years
+        if config.get("recency_weight", 1.0) == 1.0:
+            return self.compile(years, paper_id).rank(config)
+        return self.prefix_scores(years, paper_id).rank(config)
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["buckets"] = {
+            key: dict(zip(TOPIC_IDS.strings(bucket), bucket.values())) for key, bucket in self.buckets.items()
+        }
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.buckets = {
+            key: dict(zip(TOPIC_IDS.intern_all(bucket), bucket.values())) for key, bucket in self.buckets.items()
+        }
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": SCORE_STATE_VERSION, "state": self}
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as handle:
+            pickle.dump(payload, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path, ontology: TopicOntology, graph_depth: int = 1) -> "TopicScoreState":
+        """Load the saved state, or start empty if it is missing or stale."""
+        if path.exists():
+            try:
+                with path.open("rb") as handle:
+                    payload = pickle.load(handle)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                payload = {}
+            state = payload.get("state")
+            if (
+                payload.get("version") == SCORE_STATE_VERSION
+                and isinstance(state, cls)
+                and state.ontology_fingerprint == ontology.scoring_fingerprint
+                and state.graph_depth == graph_depth
+            ):
+                return state
+        return cls(ontology.scoring_fingerprint, graph_depth)
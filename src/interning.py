@@ -0,0 +1,43 @@
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class Interner:
+    """Maps strings to dense ints, and back.
+
+    Hot paths work on the ints; strings come back only at boundaries.
+    Numbers are assigned in first-seen order and differ between processes,
+    so anything persisted (pickles, caches, the question store) stores the
+    strings and interns them again on load.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def intern(self, value: str) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            with self._lock:
+                idx = self._ids.setdefault(value, len(self._strings))
+                if idx == len(self._strings):
+                    self._strings.append(value)
+        return idx
+
+    def get(self, value: str, default: Optional[int] = None) -> Optional[int]:
+        """The id of an already interned string, without interning it."""
+        return self._ids.get(value, default)
+
+    def intern_all(self, values: Iterable[str]) -> List[int]:
+        return [self.intern(value) for value in values]
+
+    def string(self, idx: int) -> str:
+        return self._strings[idx]
+
+    def strings(self, ids: Iterable[int]) -> List[str]:
+        strings = self._strings
+        return [strings[idx] for idx in ids]
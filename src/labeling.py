@@ -1,8 +1,18 @@
 import csv
+import hashlib
+import json
+import os
+import threading
 from pathlib import Path
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
+from src.dedup import match_tokens
 from src.ontology import TopicOntology
+from src.tokens import detokenize
+from src.profiling import profiled
+
+
+LABEL_CACHE_VERSION = 1
 
 
 def load_gold_labels(path: Path) -> Dict[str, List[str]]:
@@ -16,14 +26,98 @@ def load_gold_labels(path: Path) -> Dict[str, List[str]]:
     return labels
 
 
+class LabelCache:
+    """Persistent auto-label suggestions keyed by (q_id, text hash, ontology).
+
+    An entry is reused only while the normalized text the question is
+    matched on (``match_text``), the ontology fingerprint and ``max_topics``
+    are unchanged, so new or edited questions are the only ones that get
+    re-matched. Entries written under
+    another ontology are dropped on load.
+    """
+
+    def __init__(self, path: Optional[Path], ontology: TopicOntology):
+        self.path = path
+        self.ontology_hash = ontology.fingerprint
+        self.entries: Dict[str, Tuple[str, int, List[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path is not None and path.exists():
+            try:
+                payload = json.loads(path.read_text())
+            except (OSError, ValueError):
+                payload = {}
+            if payload.get("version") == LABEL_CACHE_VERSION and payload.get("ontology") == self.ontology_hash:
+                self.entries = {q_id: tuple(entry) for q_id, entry in payload.get("labels", {}).items()}
+
+    @staticmethod
+    def text_hash(normalized: str) -> str:
+        return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+    def label(
+        self, questions: Iterable[dict], ontology: TopicOntology, max_topics: int = 3
+    ) -> Dict[str, List[str]]:
+        if ontology.fingerprint != self.ontology_hash:
+            raise ValueError("Label cache was opened for a different ontology")
+        suggestions: Dict[str, List[str]] = {}
+        pending: Dict[Tuple[int, ...], List[Tuple[str, str]]] = {}
+        with self._lock:
+            for question in questions:
+                tokens = tuple(match_tokens(question))
+                digest = self.text_hash(detokenize(tokens))
+                entry = self.entries.get(question["q_id"])
+                if entry is not None and entry[0] == digest and entry[1] == max_topics:
+                    suggestions[question["q_id"]] = list(entry[2])
+                    self.hits += 1
+                else:
+                    suggestions[question["q_id"]] = []
+                    pending.setdefault(tokens, []).append((question["q_id"], digest))
+        # Identical texts (repeats and near-duplicates, which share their
+        # cluster's text) are matched once per batch. Matching runs unlocked,
+        # so pipeline stages on other threads can label concurrently.
+        matches = ontology.match_tokens_batch(list(pending), max_topics=max_topics)
+        with self._lock:
+            for targets, matched in zip(pending.values(), matches):
+                topic_ids = [topic_id for topic_id, _ in matched]
+                for q_id, digest in targets:
+                    suggestions[q_id] = list(topic_ids)
+                    self.entries[q_id] = (digest, max_topics, topic_ids)
+                    self.misses += 1
+                    self._dirty = True
+        return suggestions
+
+    def save(self) -> None:
+        with self._lock:
+            if self.path is None or not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            payload = {
+                "version": LABEL_CACHE_VERSION,
+                "ontology": self.ontology_hash,
+                "labels": {q_id: list(entry) for q_id, entry in self.entries.items()},
+            }
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(payload))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+
+@profiled()
 def auto_label_questions(
-    questions: Iterable[dict], ontology: TopicOntology, max_topics: int = 3
+    questions: Iterable[dict],
+    ontology: TopicOntology,
+    max_topics: int = 3,
+    cache: Optional[LabelCache] = None,
 ) -> Dict[str, List[str]]:
-    suggestions = {}
-    for question in questions:
-        matches = ontology.match_topics(question["raw_text"], max_topics=max_topics)
-        suggestions[question["q_id"]] = [topic_id for topic_id, _ in matches]
-    return suggestions
+    if cache is not None:
+        return cache.label(questions, ontology, max_topics=max_topics)
+    questions = list(questions)
+    matches = ontology.match_tokens_batch([match_tokens(question) for question in questions], max_topics=max_topics)
+    return {
+        question["q_id"]: [topic_id for topic_id, _ in matched] for question, matched in zip(questions, matches)
+    }
 
 
 def export_suggestions(path: Path, suggestions: Dict[str, List[str]]):
@@ -0,0 +1,194 @@
+import math
+import re
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from src.tokens import VOCAB, detokenize, split_parts
+
+
+def term_score(term: str) -> float:
+    return min(1.0, 0.2 + len(term.split()) * 0.2)
+
+
+def _map_trie(node: dict, convert: Callable[[Hashable], Hashable]) -> dict:
+    """Copy of a trie with every edge key converted; the ``None`` hit lists are kept."""
+    return {
+        key if key is None else convert(key): child if key is None else _map_trie(child, convert)
+        for key, child in node.items()
+    }
+
+
+class RegexMatcher:
+    """One compiled regex per term, searched in topic order.
+
+    The reference for the exact matchers: it searches the normalized text
+    (passed along for ad-hoc text, else detokenized), where the trie never
+    leaves the token arrays.
+    """
+
+    exact = True
+
+    def __init__(self, topic_terms: Dict[str, List[str]]):
+        self._patterns: Dict[str, List[Tuple[str, re.Pattern]]] = {}
+        for topic_id, terms in topic_terms.items():
+            # Terms and texts are both lowercased by normalization.
+            self._patterns[topic_id] = [(term, re.compile(rf"\b{re.escape(term)}\b")) for term in terms]
+
+    def scores(self, tokens: Sequence[int], normalized: Optional[str] = None) -> List[Tuple[str, float]]:
+        if normalized is None:
+            normalized = detokenize(tokens)
+        scores: List[Tuple[str, float]] = []
+        for topic_id, patterns in self._patterns.items():
+            score = 0.0
+            for term, pattern in patterns:
+                if pattern.search(normalized):
+                    score = max(score, term_score(term))
+            if score > 0:
+                scores.append((topic_id, score))
+        return scores
+
+    def scores_batch(self, token_arrays: Sequence[Sequence[int]]) -> List[List[Tuple[str, float]]]:
+        return [self.scores(tokens) for tokens in token_arrays]
+
+
+class TokenTrieMatcher:
+    """Single trie over the word runs and separators of every term.
+
+    Edges are vocabulary ids, so a question's token array is walked as is
+    (``UNKNOWN`` parts of ad-hoc text simply match nothing),
+    once from every word-run start; the cost depends on the text length
+    and the number of hits rather than on the number of terms in the
+    ontology. Ids are per process, so pickles key the trie by the parts.
+    """
+
+    exact = True
+
+    def __init__(self, topic_terms: Dict[str, List[str]]):
+        self._order: Dict[str, int] = {}
+        self._root: dict = {}
+        for topic_id, terms in topic_terms.items():
+            self._order[topic_id] = len(self._order)
+            for term in terms:
+                self._insert(term, topic_id)
+
+    def _insert(self, term: str, topic_id: str) -> None:
+        node = self._root
+        for token in VOCAB.intern_all(split_parts(term)):
+            node = node.setdefault(token, {})
+        hits = node.setdefault(None, {})
+        hits[topic_id] = max(hits.get(topic_id, 0.0), term_score(term))
+
+    def _walk(self, tokens: Sequence[int]) -> Iterable[Tuple[str, float]]:
+        for start in range(0, len(tokens), 2):
+            node = self._root
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                hits = node.get(None)
+                if hits:
+                    yield from hits.items()
+
+    def scores(self, tokens: Sequence[int], normalized: Optional[str] = None) -> List[Tuple[str, float]]:
+        best: Dict[str, float] = {}
+        for topic_id, score in self._walk(tokens):
+            if score > best.get(topic_id, 0.0):
+                best[topic_id] = score
+        return sorted(best.items(), key=lambda pair: self._order[pair[0]])
+
+    def scores_batch(self, token_arrays: Sequence[Sequence[int]]) -> List[List[Tuple[str, float]]]:
+        return [self.scores(tokens) for tokens in token_arrays]
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["_root"] = _map_trie(self._root, VOCAB.string)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._root = _map_trie(self._root, VOCAB.intern)
+
+
+class TfidfMatcher:
+    """Approximate matching over an idf-weighted inverted index.
+
+    Every term is a set of features: character n-grams of the space-padded
+    term and its whole words. A term's match strength against a text is
+    the idf-weighted share of its features that occur in the text (1.0
+    when the term occurs verbatim), and a topic scores ``term_score`` times
+    its best strength at or above ``threshold``. Verbatim matches therefore
+    score exactly as with the exact matchers, and misspellings, inflections
+    and reordered words still score.
+
+    Only each term's rarest features are indexed: enough of them that a
+    term missing all of them cannot reach ``threshold`` (prefix
+    filtering). Rare features have short postings, so a lookup touches a
+    few candidates regardless of the ontology size. The indexed weights
+    found plus the weight left unindexed bound a candidate's strength, and
+    only candidates whose bound reaches ``threshold`` are verified against
+    the full feature set.
+    """
+
+    exact = False
+
+    def __init__(self, topic_terms: Dict[str, List[str]], ngram: int = 3, threshold: float = 0.75):
+        self.ngram = ngram
+        self.threshold = threshold
+        self._topics: List[str] = []
+        self._terms: List[Tuple[int, float, Dict[str, float]]] = []
+        features = []
+        for topic_id, terms in topic_terms.items():
+            for term in terms:
+                features.append(self._features(term))
+                self._terms.append((len(self._topics), term_score(term), {}))
+            self._topics.append(topic_id)
+        df = Counter(feature for term_features in features for feature in term_features)
+        idf = {feature: math.log((1 + len(features)) / (1 + count)) + 1.0 for feature, count in df.items()}
+        self._index: Dict[str, List[Tuple[int, float]]] = {}
+        self._unindexed: List[float] = []
+        for term_id, term_features in enumerate(features):
+            weights = self._terms[term_id][2]
+            ranked = sorted(term_features, key=lambda feature: (-idf[feature], feature))
+            norm = sum(idf[feature] ** 2 for feature in ranked)
+            covered = 0.0
+            for feature in ranked:
+                weights[feature] = idf[feature] ** 2 / norm
+                if covered <= 1.0 - threshold:
+                    self._index.setdefault(feature, []).append((term_id, weights[feature]))
+                    covered += weights[feature]
+            self._unindexed.append(1.0 - covered)
+
+    def _features(self, text: str) -> set:
+        padded = f" {text} "
+        features = {padded[idx : idx + self.ngram] for idx in range(len(padded) - self.ngram + 1)}
+        features.update(f"w:{word}" for word in text.split())
+        return features
+
+    def scores(self, tokens: Sequence[int], normalized: Optional[str] = None) -> List[Tuple[str, float]]:
+        present = self._features(detokenize(tokens) if normalized is None else normalized)
+        found: Dict[int, float] = {}
+        for feature in present:
+            for term_id, weight in self._index.get(feature, ()):
+                found[term_id] = found.get(term_id, 0.0) + weight
+        best: Dict[int, float] = {}
+        for term_id, indexed in found.items():
+            # Upper bound: every unindexed feature present as well.
+            if indexed + self._unindexed[term_id] < self.threshold - 1e-9:
+                continue
+            topic, scale, weights = self._terms[term_id]
+            strength = sum(map(weights.__getitem__, weights.keys() & present))
+            if strength >= 1.0 - 1e-9:
+                strength = 1.0
+            if strength >= self.threshold:
+                best[topic] = max(best.get(topic, 0.0), scale * strength)
+        return [(self._topics[topic], score) for topic, score in sorted(best.items())]
+
+    def scores_batch(self, token_arrays: Sequence[Sequence[int]]) -> List[List[Tuple[str, float]]]:
+        return [self.scores(tokens) for tokens in token_arrays]
+
+
+MATCHERS = {
+    "regex": RegexMatcher,
+    "trie": TokenTrieMatcher,
+    "tfidf": TfidfMatcher,
+}
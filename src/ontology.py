@@ -1,18 +1,28 @@
+import hashlib
 import json
-import re
+import os
+import pickle
+from array import array
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from src.interning import Interner
+from src.matchers import MATCHERS
+from src.profiling import profiled
+from src.tokens import lookup_tokens, normalize_text, normalized_parts
 
-WORD_RE = re.compile(r"\b[\w-]+\b")
 
+ONTOLOGY_CACHE_VERSION = 6
+# Written by prepare_data from the Harrison index; read by the pipeline.
+HARRISON_SEED_NAME = "harrison_ontology_seed.json"
+# Topic ids: scoring and metrics work on the ints; strings come back only at
+# the report and prediction boundaries.
+TOPIC_IDS = Interner()
 
-def normalize_text(text: str) -> str:
-    return " ".join(WORD_RE.findall(text.lower()))
 
-
-@dataclass
+@dataclass(slots=True)
 class Topic:
     topic_id: str
     name: str
@@ -23,17 +33,158 @@ class Topic:
     term_norm: Optional[str] = None
 
 
+NO_PARENT = -1
+
+
+class TopicTable(Mapping):
+    """Topics stored column-wise, as a read-only ``topic_id -> Topic`` mapping.
+
+    The full Harrison index has ~45k topics; one object (and dict entry)
+    per topic costs more than the columns themselves. Ids are kept as
+    ``TOPIC_IDS`` ints in arrays, repeated strings (domains, parent names)
+    share one copy, and ``Topic`` records are built on access.
+    """
+
+    def __init__(self, topics: Iterable[Topic] = ()):
+        self.ids = array("i")
+        self.names: List[str] = []
+        self.synonyms: List[Tuple[str, ...]] = []
+        self.parent_ids = array("i")
+        self.parent_names: List[Optional[str]] = []
+        self.domains: List[Optional[str]] = []
+        self.term_norms: List[Optional[str]] = []
+        self._rows = array("i")  # TOPIC_IDS int -> row, -1 when absent
+        self._shared: Dict[str, str] = {}
+        for topic in topics:
+            self.add(topic)
+
+    def _share(self, value: Optional[str]) -> Optional[str]:
+        return value if value is None else self._shared.setdefault(value, value)
+
+    def add(self, topic: Topic) -> None:
+        """Append ``topic``; a repeated id replaces the earlier row, as a dict would."""
+        idx = TOPIC_IDS.intern(topic.topic_id)
+        parent = TOPIC_IDS.intern(topic.parent_id) if topic.parent_id else NO_PARENT
+        columns = (
+            topic.name,
+            tuple(topic.synonyms),
+            self._share(topic.parent_name),
+            self._share(topic.domain),
+            topic.term_norm,
+        )
+        lists = (self.names, self.synonyms, self.parent_names, self.domains, self.term_norms)
+        row = self.row(idx)
+        if row < 0:
+            if idx >= len(self._rows):
+                self._rows.extend([-1] * (idx + 1 - len(self._rows)))
+            self._rows[idx] = len(self.ids)
+            self.ids.append(idx)
+            self.parent_ids.append(parent)
+            for column, value in zip(lists, columns):
+                column.append(value)
+        else:
+            self.parent_ids[row] = parent
+            for column, value in zip(lists, columns):
+                column[row] = value
+
+    def row(self, idx: int) -> int:
+        """The row of interned topic ``idx``, or -1."""
+        return self._rows[idx] if 0 <= idx < len(self._rows) else -1
+
+    def _row_of(self, topic_id: str) -> int:
+        idx = TOPIC_IDS.get(topic_id)
+        return -1 if idx is None else self.row(idx)
+
+    def topic(self, row: int) -> Topic:
+        parent = self.parent_ids[row]
+        return Topic(
+            topic_id=TOPIC_IDS.string(self.ids[row]),
+            name=self.names[row],
+            synonyms=list(self.synonyms[row]),
+            parent_id=None if parent == NO_PARENT else TOPIC_IDS.string(parent),
+            parent_name=self.parent_names[row],
+            domain=self.domains[row],
+            term_norm=self.term_norms[row],
+        )
+
+    def __getitem__(self, topic_id: str) -> Topic:
+        row = self._row_of(topic_id)
+        if row < 0:
+            raise KeyError(topic_id)
+        return self.topic(row)
+
+    def __contains__(self, topic_id: object) -> bool:
+        return isinstance(topic_id, str) and self._row_of(topic_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(TOPIC_IDS.strings(self.ids))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getstate__(self) -> dict:
+        # Interned ids are process-specific: persist the strings.
+        return {
+            "topics": [self.topic(row) for row in range(len(self))],
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["topics"])
+
+
 class TopicOntology:
-    def __init__(self, topics: Iterable[Topic]):
-        self.topics: Dict[str, Topic] = {topic.topic_id: topic for topic in topics}
-        self._patterns: Dict[str, List[Tuple[str, re.Pattern]]] = {}
+    def __init__(self, topics: Iterable[Topic], matcher: str = "trie"):
+        self.topics = TopicTable(topics)
+        self.matcher_name = matcher
         self._build_patterns()
+        self._build_hierarchy()
 
     @classmethod
-    def from_seed(cls, path: Path) -> "TopicOntology":
+    def from_seed(
+        cls, path: Path, matcher: str = "trie", cache_dir: Optional[Path] = None
+    ) -> "TopicOntology":
         if not path.exists():
-            return cls([])
-        entries = json.loads(path.read_text())
+            return cls([], matcher=matcher)
+        if cache_dir is None:
+            return cls._parse_seed(path.read_bytes(), matcher)
+
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        cache_path = Path(cache_dir) / f"ontology_v{ONTOLOGY_CACHE_VERSION}_{matcher}_{digest[:16]}.pkl"
+        ontology = cls._load_cache(cache_path, digest)
+        if ontology is None:
+            ontology = cls._parse_seed(raw, matcher)
+            ontology._write_cache(cache_path, digest)
+        return ontology
+
+    @classmethod
+    def _load_cache(cls, cache_path: Path, digest: str) -> Optional["TopicOntology"]:
+        if not cache_path.exists():
+            return None
+        try:
+            with cache_path.open("rb") as handle:
+                payload = pickle.load(handle)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return None
+        if payload.get("version") != ONTOLOGY_CACHE_VERSION or payload.get("digest") != digest:
+            return None
+        ontology = payload["ontology"]
+        return ontology if isinstance(ontology, cls) else None
+
+    def _write_cache(self, cache_path: Path, digest: str) -> None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": ONTOLOGY_CACHE_VERSION, "digest": digest, "ontology": self}
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as handle:
+            pickle.dump(payload, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+
+    @classmethod
+    def _parse_seed(cls, raw: bytes, matcher: str) -> "TopicOntology":
+        entries = json.loads(raw)
+        if isinstance(entries, dict):
+            # Streamed seeds (the Harrison index) wrap the list with a header.
+            entries = entries["topics"]
         topics = []
         for entry in entries:
             synonyms = entry.get("synonyms", [])
@@ -50,34 +201,121 @@ class TopicOntology:
                     term_norm=entry.get("term_norm"),
                 )
             )
-        return cls(topics)
+        return cls(topics, matcher=matcher)
 
     def _build_patterns(self) -> None:
-        for topic in self.topics.values():
-            patterns = []
-            candidates = [topic.name, *topic.synonyms]
-            for term in {normalize_text(c) for c in candidates if c}:
-                if not term:
-                    continue
-                pattern = re.compile(rf"\b{re.escape(term)}\b", re.IGNORECASE)
-                patterns.append((term, pattern))
-            self._patterns[topic.topic_id] = patterns
+        table = self.topics
+        # Terms only feed the matcher and the fingerprint; not kept.
+        terms: Dict[str, List[str]] = {}
+        for topic_id, name, synonyms in zip(table, table.names, table.synonyms):
+            candidates = [name, *synonyms]
+            terms[topic_id] = sorted(
+                term for term in {normalize_text(c) for c in candidates if c} if term
+            )
+        if self.matcher_name not in MATCHERS:
+            raise ValueError(f"Unknown matcher: {self.matcher_name}")
+        self._matcher = MATCHERS[self.matcher_name](terms)
+        # Identifies what match_topics can return: topic order and terms, plus
+        # the matcher when it is approximate (exact matchers agree).
+        payload = list(terms.items())
+        if not self._matcher.exact:
+            payload.append(self.matcher_name)
+        self.fingerprint = hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
 
-    def match_topics(self, text: str, max_topics: int = 3) -> List[Tuple[str, float]]:
-        normalized = normalize_text(text)
-        scores: List[Tuple[str, float]] = []
-        for topic_id, patterns in self._patterns.items():
-            score = 0.0
-            for term, pattern in patterns:
-                if pattern.search(normalized):
-                    score = max(score, min(1.0, 0.2 + len(term.split()) * 0.2))
-            if score > 0:
-                scores.append((topic_id, score))
+    def _build_hierarchy(self) -> None:
+        """Precompute ancestor/descendant closures and domain groupings.
+
+        ``_ancestors[t]`` lists ``(ancestor, depth)`` up the parent chain
+        (depth 1 is the parent), stopping at a missing parent or a cycle.
+        Parents need not be topics themselves (e.g. ``DOMAIN:*`` ids). Equal
+        chains (siblings) share one tuple. The closures are keyed by
+        interned ids, so they are rebuilt rather than pickled.
+        """
+        table = self.topics
+        self._ancestors: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        chains: Dict[Tuple[Tuple[int, int], ...], Tuple[Tuple[int, int], ...]] = {}
+        descendants: Dict[int, List[int]] = {}
+        self.domains: Dict[str, List[str]] = {}
+        for topic_idx, topic_id, parent, domain in zip(table.ids, table, table.parent_ids, table.domains):
+            chain = []
+            seen = {topic_idx}
+            while parent != NO_PARENT and parent not in seen:
+                chain.append((parent, len(chain) + 1))
+                seen.add(parent)
+                row = table.row(parent)
+                parent = table.parent_ids[row] if row >= 0 else NO_PARENT
+            key = tuple(chain)
+            self._ancestors[topic_idx] = chains.setdefault(key, key)
+            for ancestor, _ in chain:
+                descendants.setdefault(ancestor, []).append(topic_idx)
+            if domain:
+                self.domains.setdefault(domain, []).append(topic_id)
+        self._descendants: Dict[int, Tuple[int, ...]] = {
+            ancestor: tuple(members) for ancestor, members in descendants.items()
+        }
+        # ``fingerprint`` plus the parent links, which precomputed scores
+        # (ancestor contributions) also depend on.
+        parents = [None if parent == NO_PARENT else TOPIC_IDS.string(parent) for parent in table.parent_ids]
+        payload = [self.fingerprint, list(zip(table, parents))]
+        self.scoring_fingerprint = hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        for name in ("_ancestors", "_descendants", "domains", "scoring_fingerprint"):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._build_hierarchy()
+
+    @staticmethod
+    def _top(scores: List[Tuple[str, float]], max_topics: int) -> List[Tuple[str, float]]:
         scores.sort(key=lambda pair: pair[1], reverse=True)
         return scores[:max_topics]
 
+    @profiled()
+    def match_topics(self, text: str, max_topics: int = 3) -> List[Tuple[str, float]]:
+        """Top topics for ad-hoc ``text``, which is looked up in the vocabulary rather than added to it."""
+        return self._top(self._matcher.scores(lookup_tokens(text), normalized_parts(text)[0]), max_topics)
+
+    @profiled()
+    def match_tokens(self, tokens: Sequence[int], max_topics: int = 3) -> List[Tuple[str, float]]:
+        """``match_topics`` on a token array, such as the ones stored with each question."""
+        return self._top(self._matcher.scores(tokens), max_topics)
+
+    @profiled()
+    def match_tokens_batch(
+        self, token_arrays: Iterable[Sequence[int]], max_topics: int = 3
+    ) -> List[List[Tuple[str, float]]]:
+        """``match_tokens`` for many arrays; repeated arrays are matched once."""
+        keys = [tuple(tokens) for tokens in token_arrays]
+        unique = list(dict.fromkeys(keys))
+        matches = {
+            tokens: self._top(scores, max_topics) for tokens, scores in zip(unique, self._matcher.scores_batch(unique))
+        }
+        return [list(matches[tokens]) for tokens in keys]
+
+    def match_topics_batch(self, texts: Iterable[str], max_topics: int = 3) -> List[List[Tuple[str, float]]]:
+        """``match_topics`` for many texts; repeated texts are matched once."""
+        texts = list(texts)
+        matches = {text: self.match_topics(text, max_topics) for text in dict.fromkeys(texts)}
+        return [list(matches[text]) for text in texts]
+
     def related_topics(self, topic_id: str) -> List[str]:
-        topic = self.topics.get(topic_id)
-        if topic and topic.parent_id:
-            return [topic.parent_id]
-        return []
+        return [ancestor_id for ancestor_id, _ in self.ancestors(topic_id, max_depth=1)]
+
+    def ancestors(self, topic_id: str, max_depth: Optional[int] = None) -> Tuple[Tuple[str, int], ...]:
+        """``(ancestor_id, depth)`` pairs from the parent upwards."""
+        chain = self._ancestors.get(TOPIC_IDS.get(topic_id), ())
+        if max_depth is not None:
+            chain = chain[:max_depth]
+        return tuple((TOPIC_IDS.string(ancestor), depth) for ancestor, depth in chain)
+
+    def ancestor_ids(self, topic: int, max_depth: Optional[int] = None) -> Tuple[Tuple[int, int], ...]:
+        """``ancestors`` on interned ids, for the scoring hot paths."""
+        chain = self._ancestors.get(topic, ())
+        return chain if max_depth is None else chain[:max_depth]
+
+    def descendants(self, topic_id: str) -> Tuple[str, ...]:
+        return tuple(TOPIC_IDS.strings(self._descendants.get(TOPIC_IDS.get(topic_id), ())))
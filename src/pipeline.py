@@ -1,15 +1,42 @@
 import argparse
+import csv
 import json
+import sys
 from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import List, Optional
 
+from src import (
+    autotune,
+    dedup,
+    evaluate,
+    incremental,
+    interning,
+    labeling,
+    matchers,
+    predictor_interface,
+    profiling,
+    question_store,
+    search,
+    tokens,
+    utils,
+)
+from src import bootstrap as bootstrap_module
+from src import ontology as ontology_module
 from src.autotune import AutoTuner
-from src.evaluate import compute_metrics, load_year_data, macro_average, rolling_splits, temporal_split
-from src.labeling import auto_label_questions, export_suggestions, load_gold_labels
-from src.ontology import TopicOntology
+from src.bootstrap import bootstrap_means, metric_intervals, paired_differences
+from src.dag import Stage, StageGraph
+from src.evaluate import load_year_data, macro_average, macro_metrics_at_ks, rolling_splits, temporal_split
+from src.incremental import TopicScoreState
+from src.labeling import LabelCache, auto_label_questions, export_suggestions, load_gold_labels
+from src.matchers import MATCHERS
+from src.ontology import HARRISON_SEED_NAME, TOPIC_IDS, TopicOntology
 from src.predictor_interface import SimpleFrequencyPredictor
-from src.utils import format_metrics_table
+from src.profiling import PROFILER, Profiler, stage
+from src.question_store import STORE_NAME
+from src.utils import format_curve_table, format_interval_table, format_metrics_table, format_profile_tables
 
 
 BACKUP_TEMPLATES = [
@@ -21,6 +48,12 @@ BACKUP_TEMPLATES = [
 ]
 
 
+# --ontology choices: the exam-matched topic table, or the full Harrison index.
+ONTOLOGY_SEEDS = {"topics": "topic_ontology_seed.json", "harrison": HARRISON_SEED_NAME}
+REPORT_FILES = ["baseline_report.md", "recall_curve.csv", "tuning_report.md", "final_model_card.md"]
+CURVE_REPORT_KS = [1, 5, 10, 20, 40, 60, 80, 100, 150, 200]
+
+
 def load_config(path: Path) -> dict:
     if not path.exists():
         return {
@@ -37,6 +70,11 @@ def load_config(path: Path) -> dict:
     return config
 
 
+def _format_count(value: float) -> str:
+    """Evaluation counts are fractional only under multi-fidelity search."""
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}"
+
+
 def build_reports(
     reports_dir: Path,
     baseline_metrics: dict,
@@ -44,8 +82,17 @@ def build_reports(
     tuning_history: dict,
     best_metrics,
     best_config: dict,
+    search_summary: dict = None,
+    recall_curves: dict = None,
+    intervals: dict = None,
+    years: Optional[List[int]] = None,
 ):
     reports_dir.mkdir(parents=True, exist_ok=True)
+    if intervals:
+        interval_note = (
+            f"{intervals['confidence']:.0%} percentile intervals from {intervals['resamples']} bootstrap "
+            "resamples of the test questions."
+        )
 
     baseline_rows = [
         {
@@ -58,6 +105,12 @@ def build_reports(
         for split, metrics in baseline_metrics.items()
     ]
     baseline_report = "# Baseline Report\n\n" + format_metrics_table(baseline_rows) + "\n"
+    if intervals:
+        baseline_report += "\n## Confidence Intervals\n\n" + interval_note + "\n\n"
+        baseline_report += format_interval_table(
+            [{"split": split, **split_intervals} for split, split_intervals in intervals["baseline"].items()]
+        )
+        baseline_report += "\n"
     baseline_report += "\n## Per-Paper Metrics\n\n"
     for split, paper_metrics in baseline_paper_metrics.items():
         baseline_report += f"### {split}\n\n"
@@ -72,6 +125,18 @@ def build_reports(
             for paper_id, metrics in paper_metrics.items()
         ]
         baseline_report += format_metrics_table(paper_rows) + "\n\n"
+    if recall_curves:
+        max_k = max(len(curve) for curve in recall_curves.values())
+        baseline_report += "## Recall@K Curve\n\n"
+        baseline_report += format_curve_table(recall_curves, [k for k in CURVE_REPORT_KS if k <= max_k])
+        baseline_report += f"\n\nFull curves (K = 1..{max_k}) are in `recall_curve.csv`.\n"
+        with (reports_dir / "recall_curve.csv").open("w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["k", *recall_curves])
+            for idx in range(max_k):
+                writer.writerow(
+                    [idx + 1, *(f"{curve[idx]:.4f}" if idx < len(curve) else "" for curve in recall_curves.values())]
+                )
     (reports_dir / "baseline_report.md").write_text(baseline_report)
 
     tuning_lines = ["# Tuning Report", "", "## All Runs"]
@@ -87,8 +152,34 @@ def build_reports(
             }
         )
     tuning_lines.append(format_metrics_table(tuning_rows))
+    if intervals:
+        tuning_lines.append("\n## Confidence Intervals")
+        tuning_lines.append(interval_note + " Each split is resampled separately and the splits are averaged.\n")
+        tuning_lines.append(
+            format_interval_table(
+                [{"split": run_id, **run_intervals} for run_id, run_intervals in intervals["candidates"].items()]
+            )
+        )
+        tuning_lines.append(f"\n## Paired Differences vs Best ({intervals['best']})")
+        tuning_lines.append(
+            "Candidate minus best on the same resamples; an interval that excludes 0 is a difference the "
+            "test questions support.\n"
+        )
+        tuning_lines.append(
+            format_interval_table(
+                [{"split": run_id, **diff_intervals} for run_id, diff_intervals in intervals["differences"].items()]
+            )
+        )
     tuning_lines.append("\n## Best Configuration")
     tuning_lines.append(json.dumps(best_config, indent=2))
+    if search_summary:
+        to_best = search_summary.get("evaluations_to_best")
+        tuning_lines.append("\n## Search")
+        tuning_lines.append(f"- Strategy: {search_summary['strategy']}")
+        tuning_lines.append(f"- Evaluations: {_format_count(search_summary['evaluations'])}")
+        tuning_lines.append(
+            f"- Evaluations to best: {_format_count(to_best)}" if to_best is not None else "- Evaluations to best: n/a"
+        )
     (reports_dir / "tuning_report.md").write_text("\n".join(tuning_lines))
 
     model_card = [
@@ -97,7 +188,7 @@ def build_reports(
         "## Purpose",
         "Topic-level predictor for Yenepoya MD Medicine exam papers using topic frequency and ontology boosts.",
         "",
-        "## Metrics (Rolling 2022–2025)",
+        f"## Metrics (Rolling {min(years)}–{max(years)})" if years else "## Metrics (Rolling)",
         format_metrics_table(
             [
                 {
@@ -117,13 +208,40 @@ def build_reports(
     (reports_dir / "final_model_card.md").write_text("\n".join(model_card))
 
 
+def build_performance_report(reports_dir: Path, profiler: Profiler) -> None:
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    stage_table, function_table = format_profile_tables(profiler.stages.values(), profiler.functions.values())
+    lines = [
+        "# Performance Report",
+        "",
+        "Generated by `python -m src.pipeline --profile`; the raw trace is in `profile_trace.json`",
+        "(Chrome trace-event format, opens in Perfetto).",
+        "",
+        "## Stages",
+        "",
+        stage_table,
+        "",
+        "Peak memory is the highest traced Python allocation above the stage's starting point.",
+        "",
+        "## Hot Functions",
+        "",
+        function_table,
+        "",
+        "Function times are inclusive and cover the main process only; tuner workers are not traced.",
+    ]
+    (reports_dir / "performance_report.md").write_text("\n".join(lines) + "\n")
+
+
 def generate_predictions(
     predictions_dir: Path,
     predictor: SimpleFrequencyPredictor,
     ontology: TopicOntology,
     train_questions: list,
     config: dict,
+    score_state: Optional[TopicScoreState] = None,
+    years: Optional[List[int]] = None,
 ):
+    """Rank each paper's topics; with ``score_state``, over ``years`` (the state may hold more)."""
     predictions_dir.mkdir(parents=True, exist_ok=True)
     questions_by_paper = defaultdict(list)
     for question in train_questions:
@@ -131,7 +249,10 @@ def generate_predictions(
 
     for paper_id in range(1, 5):
         paper_questions = questions_by_paper.get(paper_id, [])
-        ranked = predictor.predict(paper_questions, ontology, config)
+        if score_state is not None:
+            ranked = score_state.rank(config, years, paper_id)
+        else:
+            ranked = predictor.predict(paper_questions, ontology, config)
         ranked_topics = [item.topic_id for item in ranked]
         high_conf = ranked_topics[:30]
         backup = [topic for topic in ranked_topics[30:60] if topic not in high_conf]
@@ -166,79 +287,321 @@ def generate_predictions(
         )
 
 
+@dataclass
+class LoadedData:
+    ontology: TopicOntology
+    label_cache: LabelCache
+    predictor: SimpleFrequencyPredictor
+    score_state: TopicScoreState
+    gold_labels: dict
+
+
+def build_stages(args: argparse.Namespace) -> List[Stage]:
+    """The pipeline as a DAG; see ``StageGraph`` for how stages are cached."""
+    data_dir = Path(args.data_dir)
+    cache_dir = Path(args.cache_dir)
+    reports_dir = Path(args.reports_dir)
+    predictions_dir = Path(args.predictions_dir)
+    years = sorted(args.years)
+    curve_ks = list(range(1, args.curve_max_k + 1))
+    data_files = (
+        *(data_dir / f"papers_{year}.json" for year in years),
+        data_dir / STORE_NAME,
+        data_dir / ONTOLOGY_SEEDS[args.ontology],
+        data_dir / "gold_labels.csv",
+    )
+
+    def load_data() -> LoadedData:
+        ontology = TopicOntology.from_seed(
+            data_dir / ONTOLOGY_SEEDS[args.ontology], matcher=args.matcher, cache_dir=cache_dir / "ontology"
+        )
+        predictor = SimpleFrequencyPredictor(graph_depth=args.graph_depth)
+        # Only new or edited years are re-matched; the rest come from the cache.
+        score_state_path = cache_dir / "score_state.pkl"
+        score_state = TopicScoreState.load(score_state_path, ontology, args.graph_depth)
+        if score_state.sync(data_dir, years, ontology, predictor):
+            score_state.save(score_state_path)
+        return LoadedData(
+            ontology=ontology,
+            label_cache=LabelCache(cache_dir / "labels.json", ontology),
+            predictor=predictor,
+            score_state=score_state,
+            gold_labels=load_gold_labels(data_dir / "gold_labels.csv"),
+        )
+
+    def baseline(data: LoadedData) -> dict:
+        baseline_metrics = {}
+        baseline_paper_metrics = {}
+        recall_curves = {}
+        splits = rolling_splits(years)
+        # Every split trains on a prefix of the years; score them all in one pass.
+        split_rankings = data.score_state.prefix_scores(years).ranked_topic_ids(
+            {}, [len(train_years) for train_years, _ in splits]
+        )
+        for (train_years, test_year), predicted_topics in zip(splits, split_rankings):
+            test_questions = load_year_data(data_dir, test_year)
+            with stage("auto_label"):
+                auto_labels = auto_label_questions(test_questions, data.ontology, cache=data.label_cache)
+            gold_for_test = {
+                q["q_id"]: TOPIC_IDS.intern_all(data.gold_labels.get(q["q_id"], auto_labels.get(q["q_id"], [])))
+                for q in test_questions
+            }
+            split_name = f"train_{train_years[-1]}_test_{test_year}"
+            split_metrics = macro_metrics_at_ks(predicted_topics, list(gold_for_test.values()), [args.k, *curve_ks])
+            baseline_metrics[split_name] = split_metrics[0]
+            recall_curves[split_name] = [metrics.recall_at_k for metrics in split_metrics[1:]]
+            paper_groups = defaultdict(list)
+            for question in test_questions:
+                paper_groups[question.get("paper_id")].append(question)
+            paper_metrics = {}
+            for paper_id, questions in paper_groups.items():
+                gold_for_paper = [
+                    gold_for_test.get(question["q_id"], []) for question in questions
+                ]
+                paper_metrics[paper_id] = macro_metrics_at_ks(predicted_topics, gold_for_paper, [args.k])[0]
+            baseline_paper_metrics[split_name] = paper_metrics
+        return {"metrics": baseline_metrics, "paper_metrics": baseline_paper_metrics, "recall_curves": recall_curves}
+
+    def tuning(data: LoadedData) -> dict:
+        tuner = AutoTuner(
+            data_dir,
+            data.ontology,
+            label_cache=data.label_cache,
+            score_state=data.score_state,
+            predictor=data.predictor,
+        )
+        return tuner.tune(
+            years,
+            args.k,
+            args.epsilon,
+            args.max_rounds,
+            workers=args.workers,
+            strategy=args.strategy,
+            max_evals=args.max_evals,
+            max_seconds=args.max_seconds,
+        )
+
+    def bootstrap(data: LoadedData, tune_results: dict) -> Optional[dict]:
+        if not args.bootstrap:
+            return None
+        session = AutoTuner(
+            data_dir,
+            data.ontology,
+            label_cache=data.label_cache,
+            score_state=data.score_state,
+            predictor=data.predictor,
+        ).session(years)
+        split_names = [f"train_{split.train_years[-1]}_test_{split.test_year}" for split in session.splits]
+        # The baseline is the empty config, scored per split like baseline().
+        baseline_intervals = {
+            name: metric_intervals(bootstrap_means([questions], args.bootstrap), args.confidence)
+            for name, questions in zip(split_names, session.question_metrics({}, args.k))
+        }
+        history = tune_results["history"]
+        run_ids = list(history)
+        per_run = [session.question_metrics(history[run_id].config, args.k) for run_id in run_ids]
+        # One row per question holds every candidate's four metrics, so all
+        # candidates are resampled together and their differences are paired.
+        strata = [
+            [sum((run[split_idx][question_idx] for run in per_run), ()) for question_idx in range(len(split.gold))]
+            for split_idx, split in enumerate(session.splits)
+        ]
+        distributions = bootstrap_means(strata, args.bootstrap)
+        by_run = {run_id: distributions[4 * idx : 4 * idx + 4] for idx, run_id in enumerate(run_ids)}
+        best = tune_results["best"]
+        best_id = next((run_id for run_id in run_ids if best and history[run_id].config == best.config), None)
+        return {
+            "resamples": args.bootstrap,
+            "confidence": args.confidence,
+            "baseline": baseline_intervals,
+            "candidates": {run_id: metric_intervals(by_run[run_id], args.confidence) for run_id in run_ids},
+            "best": best_id,
+            "differences": {
+                run_id: metric_intervals(
+                    [paired_differences(values, base) for values, base in zip(by_run[run_id], by_run[best_id])],
+                    args.confidence,
+                )
+                for run_id in run_ids
+                if best_id is not None and run_id != best_id
+            },
+        }
+
+    def reports(baseline_results: dict, tune_results: dict, intervals: Optional[dict]) -> None:
+        best = tune_results["best"]
+        build_reports(
+            reports_dir,
+            baseline_results["metrics"],
+            baseline_results["paper_metrics"],
+            tune_results["history"],
+            best.metrics if best else macro_average(list(baseline_results["metrics"].values())),
+            best.config if best else {},
+            tune_results.get("search"),
+            baseline_results["recall_curves"],
+            intervals,
+            years,
+        )
+
+    def suggestions(data: LoadedData) -> None:
+        all_questions = [question for year in years for question in load_year_data(data_dir, year)]
+        with stage("auto_label"):
+            labels = auto_label_questions(all_questions, data.ontology, cache=data.label_cache)
+        export_suggestions(data_dir / "auto_label_suggestions.csv", labels)
+
+    def predictions(data: LoadedData, tune_results: dict) -> None:
+        best = tune_results["best"]
+        all_questions = [question for year in years for question in load_year_data(data_dir, year)]
+        generate_predictions(
+            predictions_dir,
+            data.predictor,
+            data.ontology,
+            all_questions,
+            best.config if best else {},
+            data.score_state,
+            years,
+        )
+
+    return [
+        # Library code is hashed here; every other stage depends on this one.
+        Stage(
+            "load_data",
+            load_data,
+            inputs=data_files,
+            params={
+                "years": years,
+                "ontology": args.ontology,
+                "matcher": args.matcher,
+                "graph_depth": args.graph_depth,
+            },
+            code=(
+                load_data,
+                dedup,
+                evaluate,
+                incremental,
+                interning,
+                labeling,
+                matchers,
+                ontology_module,
+                predictor_interface,
+                profiling,
+                question_store,
+                tokens,
+            ),
+            cache=False,
+        ),
+        Stage(
+            "baseline",
+            baseline,
+            deps=("load_data",),
+            params={"k": args.k, "curve_max_k": args.curve_max_k},
+            code=(baseline,),
+        ),
+        Stage(
+            "tuning",
+            tuning,
+            deps=("load_data",),
+            outputs=(Path("configs/best_config.yaml"),),
+            params={
+                "k": args.k,
+                "epsilon": args.epsilon,
+                "max_rounds": args.max_rounds,
+                "strategy": args.strategy,
+                "max_evals": args.max_evals,
+                "max_seconds": args.max_seconds,
+            },
+            code=(tuning, autotune, search),
+        ),
+        Stage(
+            "bootstrap",
+            bootstrap,
+            deps=("load_data", "tuning"),
+            params={"k": args.k, "resamples": args.bootstrap, "confidence": args.confidence},
+            code=(bootstrap, bootstrap_module),
+        ),
+        Stage(
+            "reports",
+            reports,
+            deps=("baseline", "tuning", "bootstrap"),
+            outputs=tuple(reports_dir / name for name in REPORT_FILES),
+            # Report templates live in this module.
+            code=(reports, sys.modules[__name__], utils),
+        ),
+        Stage(
+            "suggestions",
+            suggestions,
+            deps=("load_data",),
+            outputs=(data_dir / "auto_label_suggestions.csv",),
+            code=(suggestions, export_suggestions),
+        ),
+        Stage(
+            "predictions",
+            predictions,
+            deps=("load_data", "tuning"),
+            outputs=tuple(predictions_dir / f"predicted_2026_paper{paper_id}.json" for paper_id in range(1, 5)),
+            code=(predictions, generate_predictions),
+        ),
+    ]
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--data-dir", default="data")
     parser.add_argument("--reports-dir", default="reports")
     parser.add_argument("--predictions-dir", default="predictions")
+    parser.add_argument("--years", type=int, nargs="+", default=[2022, 2023, 2024, 2025])
     parser.add_argument("--k", type=int, default=40)
+    parser.add_argument("--curve-max-k", type=int, default=200)
+    parser.add_argument("--graph-depth", type=int, default=1)
+    parser.add_argument(
+        "--matcher", choices=sorted(MATCHERS), default="trie", help="tfidf also matches typos and paraphrases"
+    )
+    parser.add_argument(
+        "--ontology",
+        choices=sorted(ONTOLOGY_SEEDS),
+        default="topics",
+        help="harrison uses the full Harrison index written by prepare_data",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="RESAMPLES",
+        help="add bootstrap confidence intervals from this many resamples (e.g. 10000) to the reports",
+    )
+    parser.add_argument("--confidence", type=float, default=0.95, help="coverage of the bootstrap intervals")
     parser.add_argument("--epsilon", type=float, default=0.001)
     parser.add_argument("--max-rounds", type=int, default=12)
-    args = parser.parse_args()
-
-    data_dir = Path(args.data_dir)
-    ontology = TopicOntology.from_seed(data_dir / "topic_ontology_seed.json")
-    predictor = SimpleFrequencyPredictor()
-
-    years = [2022, 2023, 2024, 2025]
-    gold_labels = load_gold_labels(data_dir / "gold_labels.csv")
-
-    baseline_metrics = {}
-    baseline_paper_metrics = {}
-    for train_years, test_year in rolling_splits(years):
-        train_questions = []
-        for year in train_years:
-            train_questions.extend(load_year_data(data_dir, year))
-        test_questions = load_year_data(data_dir, test_year)
-        auto_labels = auto_label_questions(test_questions, ontology)
-        gold_for_test = {
-            q["q_id"]: gold_labels.get(q["q_id"], auto_labels.get(q["q_id"], []))
-            for q in test_questions
-        }
-        predictions = predictor.predict(train_questions, ontology, {})
-        predicted_topics = [pred.topic_id for pred in predictions]
-        per_question_metrics = [
-            compute_metrics(predicted_topics, gold, args.k) for gold in gold_for_test.values()
-        ]
-        baseline_metrics[f"train_{train_years[-1]}_test_{test_year}"] = macro_average(
-            per_question_metrics
-        )
-        paper_groups = defaultdict(list)
-        for question in test_questions:
-            paper_groups[question.get("paper_id")].append(question)
-        paper_metrics = {}
-        for paper_id, questions in paper_groups.items():
-            gold_for_paper = [
-                gold_for_test.get(question["q_id"], []) for question in questions
-            ]
-            per_metrics = [compute_metrics(predicted_topics, gold, args.k) for gold in gold_for_paper]
-            paper_metrics[paper_id] = macro_average(per_metrics)
-        baseline_paper_metrics[f"train_{train_years[-1]}_test_{test_year}"] = paper_metrics
-
-    tuner = AutoTuner(data_dir, ontology)
-    tune_results = tuner.tune(years, args.k, args.epsilon, args.max_rounds)
-    best = tune_results["best"]
-
-    best_config = best.config if best else {}
-    best_metrics = best.metrics if best else macro_average(list(baseline_metrics.values()))
-
-    build_reports(
-        Path(args.reports_dir),
-        baseline_metrics,
-        baseline_paper_metrics,
-        tune_results["history"],
-        best_metrics,
-        best_config,
+    parser.add_argument("--cache-dir", default=".cache")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="pipeline stages run concurrently on this many threads (1 with --workers > 1)"
     )
+    parser.add_argument("--force", action="store_true", help="rerun every stage even if its cached result is current")
+    parser.add_argument("--strategy", choices=["grid", "random", "halving", "surrogate"], default="grid")
+    parser.add_argument("--max-evals", type=float, default=None)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="rerun all stages one at a time; write reports/performance_report.md and a JSON trace",
+    )
+    args = parser.parse_args()
 
-    all_questions = []
-    for year in years:
-        all_questions.extend(load_year_data(data_dir, year))
+    if args.profile:
+        PROFILER.enable()
 
-    suggestions = auto_label_questions(all_questions, ontology)
-    export_suggestions(data_dir / "auto_label_suggestions.csv", suggestions)
+    # Traced memory is process-wide, so profiled stages run one at a time. Tuner
+    # workers are forked, which is only safe while no other stage thread can
+    # hold a lock (label cache, interners, profiler) at the moment of the fork.
+    jobs = 1 if args.profile or args.workers > 1 else args.jobs
+    graph = StageGraph(build_stages(args), Path(args.cache_dir) / "pipeline", jobs, args.force or args.profile)
+    values = graph.run()
+    if "load_data" in values:
+        values["load_data"].label_cache.save()
 
-    generate_predictions(Path(args.predictions_dir), predictor, ontology, all_questions, best_config)
+    if args.profile:
+        PROFILER.disable()
+        PROFILER.write_trace(Path(args.reports_dir) / "profile_trace.json")
+        build_performance_report(Path(args.reports_dir), PROFILER)
 
 
 if __name__ == "__main__":
@@ -1,7 +1,14 @@
+import math
+from array import array
 from dataclasses import dataclass
-from typing import Dict, Iterable, List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from src.ontology import TopicOntology
+from src.dedup import match_tokens
+from src.ontology import TOPIC_IDS, TopicOntology
+from src.profiling import profiled
+
+# Largest |log| of a block's fold-in weight before the running sums are rebased.
+MAX_LOG_WEIGHT = 64.0
 
 
 @dataclass
@@ -10,35 +17,318 @@ class PredictionResult:
     score: float
 
 
+# Topic candidates are interned ids (see ``TOPIC_IDS``).
+PreparedQuestion = Tuple[List[int], Optional[float]]
+
+
+# Contribution kinds are hierarchy depths: 0 for the tagged topic itself,
+# 1 for its parent, 2 for the grandparent and so on.
+DIRECT, RELATED = 0, 1
+
+
+def depth_coefficients(config: dict, max_depth: int) -> List[float]:
+    """Weight of a contribution by kind: frequency, then graph decayed per extra hop."""
+    graph = config.get("graph_weight", 0.1)
+    decay = config.get("graph_decay", 0.5)
+    return [config.get("frequency_weight", 1.0)] + [graph * decay ** (depth - 1) for depth in range(1, max_depth + 1)]
+
+
+def add_question_entries(
+    entries: Dict[int, List[Tuple[int, float]]],
+    topic_candidates: List[int],
+    marks: Optional[float],
+    ontology: TopicOntology,
+    max_depth: int = 1,
+) -> None:
+    """Append one question's (kind, marks / 15) contributions to per-topic lists."""
+    marks = marks / 15 if marks else 0.0
+    for topic in topic_candidates:
+        entries.setdefault(topic, []).append((DIRECT, marks))
+        for ancestor, depth in ontology.ancestor_ids(topic, max_depth):
+            entries.setdefault(ancestor, []).append((depth, marks))
+
+
+class CompiledQuestions:
+    """Sparse question x topic incidence of a prepared question set.
+
+    Each topic column lists, in question order, whether a question tags the
+    topic directly or at which depth through the ancestor closure, together
+    with the question's
+    ``marks / 15`` (0.0 when unknown). Many topics share the same column,
+    so columns are deduplicated: ``columns`` holds the distinct ones and
+    ``column_of[t]`` points topic ``t`` at its column. A config is scored
+    once per distinct column, in the same summation order as
+    ``SimpleFrequencyPredictor.predict``, and topics are numbered in
+    first-seen order so a stable sort reproduces its tie order as well.
+    """
+
+    def __init__(self, prepared: Sequence[PreparedQuestion], ontology: TopicOntology, max_depth: int = 1):
+        entries: Dict[int, List[Tuple[int, float]]] = {}
+        for topic_candidates, marks in prepared:
+            add_question_entries(entries, topic_candidates, marks, ontology, max_depth)
+        self._set_columns(entries)
+
+    @classmethod
+    def from_entries(cls, entries: Dict[int, List[Tuple[int, float]]]) -> "CompiledQuestions":
+        """Build from per-topic (kind, marks / 15) lists in question order."""
+        compiled = cls.__new__(cls)
+        compiled._set_columns(entries)
+        return compiled
+
+    def _set_columns(self, entries: Dict[int, List[Tuple[int, float]]]) -> None:
+        self.topic_ids: List[int] = list(entries)
+        column_index: Dict[Tuple[Tuple[int, float], ...], int] = {}
+        self.column_of = array("l")
+        for column in entries.values():
+            self.column_of.append(column_index.setdefault(tuple(column), len(column_index)))
+        self.columns: List[Tuple[Tuple[int, float], ...]] = list(column_index)
+        self.max_depth = max((kind for column in self.columns for kind, _ in column), default=0)
+
+    def scores(self, config: dict) -> List[float]:
+        marks_weight = config.get("marks_weight", 1.0)
+        coefficients = depth_coefficients(config, self.max_depth)
+        column_scores = []
+        for column in self.columns:
+            score = 0.0
+            for kind, marks in column:
+                score += coefficients[kind] * (1.0 + marks * marks_weight if marks else 1.0)
+            column_scores.append(score)
+        return [column_scores[column] for column in self.column_of]
+
+    def rank(self, config: dict) -> List["PredictionResult"]:
+        scores = self.scores(config)
+        order = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        topic_ids = TOPIC_IDS.strings(self.topic_ids[idx] for idx in order)
+        return [PredictionResult(topic_id=topic_id, score=scores[idx]) for topic_id, idx in zip(topic_ids, order)]
+
+
+class PrefixScores:
+    """Running topic scores over an ordered sequence of question blocks.
+
+    Rolling splits train on growing prefixes of the years, so scoring each
+    split from scratch repeats the earlier years. Here every block (one
+    year) holds its per-topic (kind, marks / 15) lists; a config is scored
+    by carrying each topic's running sum forward block by block and taking
+    a ranking after every requested prefix. The additions happen in the
+    same order as ``SimpleFrequencyPredictor.predict`` on the concatenated
+    prefix, so each prefix ranking is identical to it.
+
+    Blocks are labelled with their calendar ``years`` (positions when
+    omitted). With a ``recency_weight`` other than 1, a block ``age`` years
+    older than the newest block with questions counts
+    ``recency_weight ** age``, so values below 1 decay older years.
+    Rescaling every score per block would touch all topics, so each
+    block's per-topic sums are instead folded in at
+    ``recency_weight ** (base_year - year)`` and a prefix's scores are
+    multiplied by ``recency_weight ** (newest_year - base_year)`` when
+    read; each block then costs only its active topics. ``base_year``
+    starts at the first year and moves forward (rescaling the sums once)
+    only when a weight would leave ``exp(+-MAX_LOG_WEIGHT)``, or on every
+    non-empty block when ``recency_weight`` is 0, where only the newest
+    year counts. A negative ``recency_weight`` raises ``ValueError``.
+    """
+
+    def __init__(
+        self, blocks: Sequence[Dict[int, List[Tuple[int, float]]]] = (), years: Optional[Sequence[int]] = None
+    ):
+        self._index: Dict[int, int] = {}
+        self._term_index: Dict[Tuple[int, float], int] = {}
+        self.topic_ids: List[int] = []
+        self.blocks: List[List[Tuple[int, Tuple[int, ...]]]] = []
+        self.years: List[int] = []
+        # Year of the newest non-empty block up to each block, which decay is relative to.
+        self.newest_after: List[int] = []
+        self.seen_after: List[int] = []
+        self.terms: List[Tuple[int, float]] = []
+        for idx, entries in enumerate(blocks):
+            self.append(entries, idx if years is None else years[idx])
+
+    def append(self, entries: Dict[int, List[Tuple[int, float]]], year: Optional[int] = None) -> None:
+        """Add the next block (``year``, or the next position); costs O(its contributions)."""
+        year = len(self.blocks) if year is None else year
+        if self.years and year <= self.years[-1]:
+            raise ValueError(f"Blocks must be appended in increasing year order, got {year} after {self.years[-1]}")
+        index, terms = self._index, self._term_index
+        block = []
+        for topic_id, column in entries.items():
+            if topic_id not in index:
+                index[topic_id] = len(self.topic_ids)
+                self.topic_ids.append(topic_id)
+            block.append((index[topic_id], tuple(terms.setdefault(term, len(terms)) for term in column)))
+        self.blocks.append(block)
+        self.years.append(year)
+        self.newest_after.append(year if block or not self.newest_after else self.newest_after[-1])
+        self.seen_after.append(len(self.topic_ids))
+        self.terms = list(terms)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def _prefix_orders(self, config: dict, lengths: List[int]) -> Dict[int, Tuple[List[float], List[int], float]]:
+        """Per requested length: (unscaled scores, ranking, factor that scales the scores)."""
+        marks_weight = config.get("marks_weight", 1.0)
+        rate = config.get("recency_weight", 1.0)
+        coefficients = depth_coefficients(config, max((kind for kind, _ in self.terms), default=0))
+        values = [coefficients[kind] * (1.0 + marks * marks_weight if marks else 1.0) for kind, marks in self.terms]
+        if rate < 0:
+            raise ValueError(f"recency_weight must be non-negative, got {rate}")
+        log_rate = math.log(rate) if rate > 0 else -math.inf
+        wanted = set(lengths)
+        scores = [0.0] * len(self.topic_ids)
+        base = self.years[0] if self.years else 0
+        snapshots: Dict[int, Tuple[List[float], List[int], float]] = {}
+        for done, block in enumerate(self.blocks[: max(lengths, default=0)], start=1):
+            if rate == 1.0:
+                for topic, column in block:
+                    score = scores[topic]
+                    for term in column:
+                        score += values[term]
+                    scores[topic] = score
+            elif block:
+                year = self.years[done - 1]
+                if rate == 0.0 or abs((base - year) * log_rate) > MAX_LOG_WEIGHT:
+                    shift = rate ** (year - base)
+                    scores = [score * shift for score in scores]
+                    base = year
+                weight = rate ** (base - year)
+                for topic, column in block:
+                    block_sum = 0.0
+                    for term in column:
+                        block_sum += values[term]
+                    scores[topic] += weight * block_sum
+            if done in wanted:
+                seen = scores[: self.seen_after[done - 1]]
+                order = sorted(range(len(seen)), key=seen.__getitem__, reverse=True)
+                snapshots[done] = (seen, order, rate ** (self.newest_after[done - 1] - base))
+        return snapshots
+
+    def rank_prefixes(self, config: dict, lengths: Iterable[int]) -> List[List[PredictionResult]]:
+        """Rankings over the first ``n`` blocks for each ``n`` in ``lengths``."""
+        lengths = list(lengths)
+        snapshots = self._prefix_orders(config, lengths)
+        rankings = []
+        for scores, order, factor in (snapshots[length] for length in lengths):
+            if factor != 1.0:
+                scores = [score * factor for score in scores]
+            topic_ids = TOPIC_IDS.strings(self.topic_ids[idx] for idx in order)
+            rankings.append(
+                [PredictionResult(topic_id=topic_id, score=scores[idx]) for topic_id, idx in zip(topic_ids, order)]
+            )
+        return rankings
+
+    def rank(self, config: dict) -> List[PredictionResult]:
+        """The ranking over every block."""
+        return self.rank_prefixes(config, [len(self)])[0] if self.blocks else []
+
+    def ranked_topic_ids(self, config: dict, lengths: Iterable[int]) -> List[List[int]]:
+        """Like ``rank_prefixes`` but only the interned topic ids, which is all metrics need."""
+        lengths = list(lengths)
+        snapshots = self._prefix_orders(config, lengths)
+        topic_ids = self.topic_ids
+        return [[topic_ids[idx] for idx in snapshots[length][1]] for length in lengths]
+
+
 class BasePredictor:
     def predict(self, questions: Iterable[dict], ontology: TopicOntology, config: dict) -> List[PredictionResult]:
         raise NotImplementedError
 
 
 class SimpleFrequencyPredictor(BasePredictor):
+    """Scores topics by how often past questions tag them.
+
+    Each tagged topic gets ``frequency_weight`` per question and its
+    ancestors up to ``graph_depth`` hops get ``graph_weight``, multiplied
+    by ``graph_decay`` for every hop beyond the parent; both are scaled by
+    the question's marks. Questions ``age`` calendar years older than the
+    newest year with questions count ``recency_weight ** age``.
+    """
+
+    def __init__(self, graph_depth: int = 1):
+        self.graph_depth = graph_depth
+
+    def topic_candidates(
+        self, question: dict, ontology: TopicOntology, matches: Optional[Dict[Tuple[int, ...], List[int]]] = None
+    ) -> List[int]:
+        """Interned tagged Harrison ids, else the top matches of the question's ``match_tokens``.
+
+        Questions read from the question store carry their tags pre-split
+        and interned as ``tag_ids``; JSON records from ``prepare_data`` carry
+        the joined ``harrison_tags`` array. Older records only have the
+        ``;``-joined ``harrison_tag_ids`` string. Near-duplicates share their cluster's
+        representative text, so with a ``matches`` memo each cluster is
+        matched once.
+        """
+        topic_candidates = question.get("tag_ids")
+        if topic_candidates is None and question.get("harrison_tags") is not None:
+            topic_candidates = TOPIC_IDS.intern_all(question["harrison_tags"])
+        if topic_candidates is None and question.get("harrison_tag_ids"):
+            topic_candidates = TOPIC_IDS.intern_all(i for i in question["harrison_tag_ids"].split(";") if i)
+        if not topic_candidates:
+            tokens = tuple(match_tokens(question))
+            if matches is None:
+                return TOPIC_IDS.intern_all(topic_id for topic_id, _ in ontology.match_tokens(tokens, 3))
+            if tokens not in matches:
+                matches[tokens] = TOPIC_IDS.intern_all(topic_id for topic_id, _ in ontology.match_tokens(tokens, 3))
+            topic_candidates = matches[tokens]
+        return list(topic_candidates)
+
+    def prepare(self, questions: Iterable[dict], ontology: TopicOntology) -> List[PreparedQuestion]:
+        """Resolve the config-independent (topic candidates, marks) of each question."""
+        prepared = []
+        matches: Dict[Tuple[int, ...], List[int]] = {}
+        for question in questions:
+            topic_candidates = self.topic_candidates(question, ontology, matches)
+            if topic_candidates:
+                prepared.append((topic_candidates, question.get("marks")))
+        return prepared
+
+    @profiled()
     def predict(self, questions: Iterable[dict], ontology: TopicOntology, config: dict) -> List[PredictionResult]:
+        if config.get("recency_weight", 1.0) == 1.0:
+            return self.predict_prepared(self.prepare(questions, ontology), ontology, config)
+        by_year: Dict[int, List[dict]] = {}
+        for question in questions:
+            by_year.setdefault(int(question["year"]), []).append(question)
+        blocks = [self.prepare(by_year[year], ontology) for year in sorted(by_year)]
+        return self.prefix_scores(blocks, ontology, sorted(by_year)).rank(config)
+
+    def compile(self, prepared: Sequence[PreparedQuestion], ontology: TopicOntology) -> CompiledQuestions:
+        return CompiledQuestions(prepared, ontology, self.graph_depth)
+
+    def prefix_scores(
+        self,
+        prepared_blocks: Sequence[Sequence[PreparedQuestion]],
+        ontology: TopicOntology,
+        years: Optional[Sequence[int]] = None,
+    ) -> PrefixScores:
+        blocks = []
+        for prepared in prepared_blocks:
+            entries: Dict[int, List[Tuple[int, float]]] = {}
+            for topic_candidates, marks in prepared:
+                add_question_entries(entries, topic_candidates, marks, ontology, self.graph_depth)
+            blocks.append(entries)
+        return PrefixScores(blocks, years)
+
+    def predict_batch(self, compiled: CompiledQuestions, configs: Iterable[dict]) -> List[List[PredictionResult]]:
+        return [compiled.rank(config) for config in configs]
+
+    def predict_prepared(
+        self, prepared: Iterable[PreparedQuestion], ontology: TopicOntology, config: dict
+    ) -> List[PredictionResult]:
+        """Rank ``prepared`` as a single year; ``recency_weight`` needs the year blocks of ``prefix_scores``."""
         weights = {
-            "recency": config.get("recency_weight", 1.0),
             "marks": config.get("marks_weight", 1.0),
             "frequency": config.get("frequency_weight", 1.0),
-            "graph": config.get("graph_weight", 0.1),
         }
-        scores: Dict[str, float] = {}
-        for question in questions:
-            topic_candidates = []
-            if question.get("harrison_tag_ids"):
-                ids = question["harrison_tag_ids"].split(";")
-                topic_candidates = [i for i in ids if i]
-            if not topic_candidates:
-                topic_candidates = [topic_id for topic_id, _ in ontology.match_topics(question["raw_text"], 3)]
-            if not topic_candidates:
-                continue
+        coefficients = depth_coefficients(config, self.graph_depth)
+        scores: Dict[int, float] = {}
+        for topic_candidates, marks in prepared:
             mark_weight = 1.0
-            if question.get("marks"):
-                mark_weight += (question["marks"] / 15) * weights["marks"]
-            for topic_id in topic_candidates:
-                scores[topic_id] = scores.get(topic_id, 0.0) + weights["frequency"] * mark_weight
-                for related in ontology.related_topics(topic_id):
-                    scores[related] = scores.get(related, 0.0) + weights["graph"] * mark_weight
+            if marks:
+                mark_weight += (marks / 15) * weights["marks"]
+            for topic in topic_candidates:
+                scores[topic] = scores.get(topic, 0.0) + weights["frequency"] * mark_weight
+                for ancestor, depth in ontology.ancestor_ids(topic, self.graph_depth):
+                    scores[ancestor] = scores.get(ancestor, 0.0) + coefficients[depth] * mark_weight
         ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
-        return [PredictionResult(topic_id=topic_id, score=score) for topic_id, score in ranked]
+        return [PredictionResult(topic_id=TOPIC_IDS.string(topic), score=score) for topic, score in ranked]
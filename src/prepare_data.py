@@ -1,74 +1,242 @@
 import argparse
 import csv
+import io
 import json
+import re
+import shutil
+import tempfile
 import zipfile
-from collections import defaultdict
 from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+from src.dedup import assign_clusters
+from src.ontology import HARRISON_SEED_NAME
+from src.question_store import STORE_NAME, write_question_store
+from src.xlsx_reader import iter_sheet_rows
 
-def _read_csv_from_zip(zip_path: Path, inner_path: str):
+
+def _iter_csv_from_zip(zip_path: Path, inner_path: str) -> Iterator[dict]:
     with zipfile.ZipFile(zip_path) as zf:
         with zf.open(inner_path) as handle:
-            decoded = (line.decode("utf-8") for line in handle)
-            reader = csv.DictReader(decoded)
-            return list(reader)
+            decoded = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+            yield from csv.DictReader(decoded)
 
 
-def build_papers_json(questions, output_dir: Path, years=(2022, 2023, 2024, 2025)):
-    grouped = defaultdict(lambda: defaultdict(list))
-    for row in questions:
-        year = int(row["year"])
-        if year not in years:
-            continue
-        paper_raw = row["paper_id"].strip()
-        roman_map = {"I": 1, "II": 2, "III": 3, "IV": 4}
-        paper_id = roman_map.get(paper_raw, None)
-        if paper_id is None:
-            paper_id = int(paper_raw)
-        q_id = row["question_id"]
-        tags = [tag.strip() for tag in row.get("tags_raw", "").split(";") if tag.strip()]
-        marks = None
-        raw_marks = row.get("section", "")
-        if "15" in raw_marks:
-            marks = 15
-        elif "10" in raw_marks:
-            marks = 10
-        elif "5" in raw_marks:
-            marks = 5
-        grouped[year][paper_id].append(
-            {
-                "q_id": q_id,
-                "raw_text": row["question_text"],
-                "year": year,
-                "paper_id": paper_id,
-                "marks": marks,
-                "tags": tags,
-                "harrison_tag_ids": row.get("harrison_tag_ids", ""),
-                "harrison_tag_terms": row.get("harrison_tag_terms", ""),
-                "templates_str": row.get("templates_str", ""),
-            }
-        )
+def _read_csv_from_zip(zip_path: Path, inner_path: str):
+    return list(_iter_csv_from_zip(zip_path, inner_path))
+
+
+ARCHIVE_PREFIX = "yenepoya_predictor_artifacts/"
+WORKBOOK_NAME = "yenepoya_canonical_dataset_and_ontology.xlsx"
+# CSV export in the archive -> worksheet of the workbook holding the same table.
+WORKBOOK_SHEETS = {
+    "yenepoya_master_questions_2006_2025.csv": "master_questions_2006_2025",
+    "topic_table_from_exam_matches.csv": "topic_table_exam_matched",
+    "harrison_index_ontology.csv": "harrison_index_ontology",
+    "question_to_harrison_tags.csv": "question_to_tags",
+}
+
+
+def _iter_xlsx_from_zip(zip_path: Path, sheet_name: str) -> Iterator[dict]:
+    """Stream one sheet of the workbook stored inside the artifacts archive.
+
+    The workbook is itself a zip, which needs a seekable file, so it is
+    spooled to a temporary file first rather than read into memory.
+    """
+    with zipfile.ZipFile(zip_path) as zf, tempfile.TemporaryFile() as spool:
+        with zf.open(ARCHIVE_PREFIX + WORKBOOK_NAME) as handle:
+            shutil.copyfileobj(handle, spool)
+        spool.seek(0)
+        yield from iter_sheet_rows(spool, sheet_name)
+
+
+def _iter_source_rows(args: argparse.Namespace, csv_name: str) -> Iterator[dict]:
+    """Rows of one table, from the chosen source: a CSV export or the workbook."""
+    if args.workbook:
+        return iter_sheet_rows(Path(args.workbook), WORKBOOK_SHEETS[csv_name])
+    if args.source == "xlsx":
+        return _iter_xlsx_from_zip(Path(args.artifacts_zip), WORKBOOK_SHEETS[csv_name])
+    return _iter_csv_from_zip(Path(args.artifacts_zip), ARCHIVE_PREFIX + csv_name)
+
+
+ROMAN_PAPER_IDS = {"I": 1, "II": 2, "III": 3, "IV": 4}
+
+
+def _question_record(row: dict, year: int) -> dict:
+    paper_raw = row["paper_id"].strip()
+    paper_id = ROMAN_PAPER_IDS.get(paper_raw, None)
+    if paper_id is None:
+        paper_id = int(paper_raw)
+    tags = [tag.strip() for tag in row.get("tags_raw", "").split(";") if tag.strip()]
+    marks = None
+    raw_marks = row.get("section", "")
+    if "15" in raw_marks:
+        marks = 15
+    elif "10" in raw_marks:
+        marks = 10
+    elif "5" in raw_marks:
+        marks = 5
+    return {
+        "q_id": row["question_id"],
+        "raw_text": row["question_text"],
+        "year": year,
+        "paper_id": paper_id,
+        "marks": marks,
+        "tags": tags,
+        "harrison_tag_ids": row.get("harrison_tag_ids", ""),
+        "harrison_tag_terms": row.get("harrison_tag_terms", ""),
+        "templates_str": row.get("templates_str", ""),
+    }
+
+
+class _JsonArrayWriter:
+    """Writes ``{<header>, "<key>": [ ... ]}`` one element per line.
+
+    Elements are appended as they arrive, so only the open handle is held in
+    memory. The file is written under a temporary name and moved into place
+    on ``close``.
+    """
+
+    def __init__(self, path: Path, header: dict, key: str):
+        self.path = path
+        self._tmp_path = path.with_name(path.name + ".tmp")
+        self._handle = self._tmp_path.open("w")
+        self._handle.write(f'{json.dumps(header)[:-1]}, "{key}": [\n')
+        self._count = 0
+
+    def write_line(self, line: str) -> None:
+        if self._count:
+            self._handle.write(",\n")
+        self._handle.write(line)
+        self._count += 1
+
+    def write(self, item) -> None:
+        self.write_line(json.dumps(item))
+
+    def close(self) -> None:
+        self._handle.write("\n]}\n")
+        self._handle.close()
+        self._tmp_path.replace(self.path)
+
+
+def _iter_array_lines(path: Path) -> Iterator[str]:
+    """Yield the element lines of a file written by ``_JsonArrayWriter``.
+
+    Files in the older pretty-printed layout are parsed whole and re-encoded.
+    """
+    with path.open() as handle:
+        if not handle.readline().rstrip().endswith("["):
+            handle.seek(0)
+            for item in json.load(handle)["questions"]:
+                yield json.dumps(item)
+            return
+        for line in handle:
+            line = line.rstrip("\n")
+            if line == "]}":
+                return
+            yield line[:-1] if line.endswith(",") else line
+
 
-    for year, papers in grouped.items():
-        for paper_id, questions in papers.items():
-            payload = {"year": year, "paper_id": paper_id, "questions": questions}
-            out_path = output_dir / f"papers_{year}_paper{paper_id}.json"
-            out_path.write_text(json.dumps(payload, indent=2))
+# Per question: Harrison term ids, the matched terms and their match scores.
+QuestionTags = Tuple[List[str], List[str], List[float]]
 
 
+def load_question_tags(rows: Iterable[dict]) -> Dict[str, QuestionTags]:
+    """Index ``question_to_harrison_tags.csv`` rows by question id, with the tags split once.
+
+    The table has one row per question, so this is the small side of the
+    join with the question stream in ``build_papers_json``.
+    """
+    question_tags = {}
+    for row in rows:
+        tag_ids = [tag for tag in row.get("harrison_tag_ids", "").split(";") if tag]
+        terms = row.get("harrison_tag_terms", "").split(";") if tag_ids else []
+        scores = [float(score) for score in row.get("harrison_tag_scores", "").split(";") if score]
+        if len(terms) != len(tag_ids) or len(scores) != len(tag_ids):
+            raise ValueError(f"Question {row['question_id']} has mismatched tag, term and score lists")
+        question_tags[row["question_id"]] = (tag_ids, terms, scores)
+    return question_tags
+
+
+def build_papers_json(
+    questions: Iterable[dict],
+    output_dir: Path,
+    years: Optional[Iterable[int]] = None,
+    clusters: Optional[Dict[str, Tuple[str, int, str]]] = None,
+    question_tags: Optional[Dict[str, QuestionTags]] = None,
+):
+    """Stream question rows into ``papers_YYYY_paperN.json`` in a single pass.
+
+    Rows are written as soon as they are read, so memory stays bounded by the
+    number of open (year, paper) files rather than the archive size. All
+    years are kept unless ``years`` is given. ``clusters`` (from
+    ``assign_clusters``) adds each question's near-duplicate ``cluster_id``,
+    ``cluster_size`` and the representative ``cluster_text``.
+    ``question_tags`` (from ``load_question_tags``) is the build side of a
+    hash join on the question id: matched questions get ``harrison_tags``,
+    ``harrison_terms`` and ``harrison_scores`` arrays. Returns the years
+    written.
+    """
+    wanted = set(years) if years is not None else None
+    writers: Dict[Tuple[int, int], _JsonArrayWriter] = {}
+    try:
+        for row in questions:
+            year = int(row["year"])
+            if wanted is not None and year not in wanted:
+                continue
+            record = _question_record(row, year)
+            if clusters is not None and record["q_id"] in clusters:
+                record["cluster_id"], record["cluster_size"], record["cluster_text"] = clusters[record["q_id"]]
+            if question_tags is not None and record["q_id"] in question_tags:
+                record["harrison_tags"], record["harrison_terms"], record["harrison_scores"] = question_tags[
+                    record["q_id"]
+                ]
+            key = (year, record["paper_id"])
+            if key not in writers:
+                writers[key] = _JsonArrayWriter(
+                    output_dir / f"papers_{year}_paper{record['paper_id']}.json",
+                    {"year": year, "paper_id": record["paper_id"]},
+                    "questions",
+                )
+            writers[key].write(record)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return sorted({year for year, _ in writers})
+
 
 def build_year_bundle(output_dir: Path, years=(2022, 2023, 2024, 2025)):
+    """Concatenate each year's paper files into ``papers_YYYY.json``.
+
+    Question lines are copied through without re-parsing the paper files.
+    """
     for year in years:
-        questions = []
+        bundle = _JsonArrayWriter(
+            output_dir / f"papers_{year}.json", {"year": year, "paper_id": "all"}, "questions"
+        )
         for paper_id in range(1, 5):
             path = output_dir / f"papers_{year}_paper{paper_id}.json"
             if path.exists():
-                payload = json.loads(path.read_text())
-                questions.extend(payload["questions"])
-        bundle_path = output_dir / f"papers_{year}.json"
-        bundle_path.write_text(
-            json.dumps({"year": year, "paper_id": "all", "questions": questions}, indent=2)
-        )
+                for line in _iter_array_lines(path):
+                    bundle.write_line(line)
+        bundle.close()
+
+
+def build_question_store(output_dir: Path, years=(2022, 2023, 2024, 2025)) -> int:
+    """Write the columnar ``questions.store`` from the year bundles.
+
+    Bundles are already in (year, paper) order and are streamed one
+    question line at a time.
+    """
+
+    def questions():
+        for year in sorted(years):
+            path = output_dir / f"papers_{year}.json"
+            if path.exists():
+                for line in _iter_array_lines(path):
+                    yield json.loads(line)
+
+    return write_question_store(questions(), output_dir / STORE_NAME)
 
 
 def build_topic_seed(topics, output_dir: Path):
@@ -88,24 +256,108 @@ def build_topic_seed(topics, output_dir: Path):
     (output_dir / "topic_ontology_seed.json").write_text(json.dumps(topic_entries, indent=2))
 
 
+HARRISON_ROOT_ID = "HARRISON"
+DEFAULT_DOMAIN = "General / Misc"
+
+
+def harrison_domain_id(domain: str) -> str:
+    """The parent id the topic table uses for a domain, e.g. ``DOMAIN:GENERAL_MISC``."""
+    return "DOMAIN:" + re.sub(r"[^A-Z0-9]+", "_", domain.upper()).strip("_")
+
+
+def iter_harrison_entries(rows: Iterable[dict]) -> Iterator[dict]:
+    """Seed entries for the full Harrison index: terms under their domain, domains under one root.
+
+    Only the distinct domains are held while streaming; their entries
+    follow the terms.
+    """
+    domains: Dict[str, str] = {}
+    for row in rows:
+        domain = row.get("domain") or DEFAULT_DOMAIN
+        if domain not in domains:
+            domains[domain] = harrison_domain_id(domain)
+        yield {
+            "topic_id": row["term_id"],
+            "name": row["canonical_term"],
+            "synonyms": [],
+            "parent_id": domains[domain],
+            "parent_name": domain,
+            "domain": domain,
+            "term_norm": row.get("term_norm") or None,
+        }
+    emitted = set()
+    for domain, topic_id in domains.items():
+        # Spellings of a domain that differ only in punctuation share one id.
+        if topic_id in emitted:
+            continue
+        emitted.add(topic_id)
+        yield {
+            "topic_id": topic_id,
+            "name": domain,
+            "synonyms": [],
+            "parent_id": HARRISON_ROOT_ID,
+            "parent_name": None,
+            "domain": domain,
+            "term_norm": None,
+        }
+
+
+def build_harrison_ontology(rows: Iterable[dict], output_dir: Path) -> int:
+    """Stream the Harrison index into ``harrison_ontology_seed.json``; returns the entry count.
+
+    Entries are written as they are read, so memory does not grow with
+    the number of index terms.
+    """
+    writer = _JsonArrayWriter(output_dir / HARRISON_SEED_NAME, {"source": "harrison_index_ontology"}, "topics")
+    count = 0
+    try:
+        for entry in iter_harrison_entries(rows):
+            writer.write(entry)
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--artifacts-zip", required=True)
+    parser.add_argument("--artifacts-zip")
+    parser.add_argument(
+        "--source",
+        choices=("csv", "xlsx"),
+        default="csv",
+        help="read the archive's CSV exports or its curated workbook",
+    )
+    parser.add_argument("--workbook", help="a curated .xlsx to read instead of the archive")
     parser.add_argument("--output-dir", default="data")
+    parser.add_argument("--years", type=int, nargs="*", default=None, help="defaults to every year in the archive")
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="shingle Jaccard similarity for near-duplicate clusters; 0 disables clustering",
+    )
     args = parser.parse_args()
+    if not args.artifacts_zip and not args.workbook:
+        parser.error("one of --artifacts-zip or --workbook is required")
 
     output_dir = Path(args.output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    questions = _read_csv_from_zip(
-        Path(args.artifacts_zip), "yenepoya_predictor_artifacts/yenepoya_master_questions_2006_2025.csv"
-    )
-    topics = _read_csv_from_zip(
-        Path(args.artifacts_zip), "yenepoya_predictor_artifacts/topic_table_from_exam_matches.csv"
-    )
-    build_papers_json(questions, output_dir)
-    build_year_bundle(output_dir)
+    questions_csv = "yenepoya_master_questions_2006_2025.csv"
+    clusters = None
+    if args.dedup_threshold > 0:
+        # Clusters span the whole archive, so repeats of older years are counted
+        # even when only some years are written.
+        clusters = assign_clusters(_iter_source_rows(args, questions_csv), args.dedup_threshold)
+    question_tags = load_question_tags(_iter_source_rows(args, "question_to_harrison_tags.csv"))
+    questions = _iter_source_rows(args, questions_csv)
+    topics = _iter_source_rows(args, "topic_table_from_exam_matches.csv")
+    years = build_papers_json(questions, output_dir, args.years, clusters, question_tags)
+    build_year_bundle(output_dir, years)
+    build_question_store(output_dir, years)
     build_topic_seed(topics, output_dir)
+    build_harrison_ontology(_iter_source_rows(args, "harrison_index_ontology.csv"), output_dir)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,177 @@
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+@dataclass
+class StageStats:
+    name: str
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_bytes: int = 0
+
+
+@dataclass
+class FunctionStats:
+    name: str
+    calls: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+
+
+class Profiler:
+    """Per-stage and per-function wall time, CPU time, calls and peak memory.
+
+    Disabled by default: ``stage`` and ``profiled`` then cost one attribute
+    check. When enabled, ``tracemalloc`` tracks allocations and each stage
+    records the peak traced memory above its starting point; nested stages
+    are folded into their parent's peak. Stages are named by their nesting
+    path (``tuning/evaluate``), per thread. Only the calling process is
+    measured, so work done in tuner worker processes shows up as the parent
+    stage's wall time. CPU time is the calling thread's. Traced memory and
+    its peak counter are process-wide, so peaks are only meaningful when
+    stages run one at a time; the pipeline runs its stages serially while
+    profiling.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stages: Dict[str, StageStats] = {}
+        self.functions: Dict[str, FunctionStats] = {}
+        self.events: List[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._origin = 0.0
+        self._started_tracemalloc = False
+
+    @property
+    def _stack(self) -> List[list]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enable(self) -> None:
+        self.enabled = True
+        self._origin = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def disable(self) -> None:
+        self.enabled = False
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def reset(self) -> None:
+        self.stages.clear()
+        self.functions.clear()
+        self.events.clear()
+        self._stack.clear()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        path = "/".join([*(frame[0] for frame in self._stack), name])
+        current, _ = tracemalloc.get_traced_memory()
+        if self._stack:
+            # Remember the parent's peak so far before resetting the counter.
+            self._stack[-1][2] = max(self._stack[-1][2], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        frame = [name, current, current]
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            self._stack.pop()
+            peak = max(frame[2], tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                self._stack[-1][2] = max(self._stack[-1][2], peak)
+            with self._lock:
+                stats = self.stages.setdefault(path, StageStats(path))
+                stats.calls += 1
+                stats.wall_seconds += wall
+                stats.cpu_seconds += cpu
+                stats.peak_bytes = max(stats.peak_bytes, peak - frame[1])
+                self.events.append(
+                    {
+                        "name": path,
+                        "ph": "X",
+                        "ts": round((wall_start - self._origin) * 1e6, 1),
+                        "dur": round(wall * 1e6, 1),
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": {"cpu_ms": round(cpu * 1e3, 3), "peak_bytes": peak - frame[1]},
+                    }
+                )
+
+    def record_call(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            stats = self.functions.get(name)
+            if stats is None:
+                stats = self.functions[name] = FunctionStats(name)
+            stats.calls += 1
+            stats.wall_seconds += wall
+            stats.cpu_seconds += cpu
+
+    def trace(self) -> dict:
+        """Chrome trace-event JSON (loadable in Perfetto) plus the summaries."""
+        return {
+            "traceEvents": self.events,
+            "displayTimeUnit": "ms",
+            "stages": [asdict(stats) for stats in self.stages.values()],
+            "functions": [asdict(stats) for stats in self.functions.values()],
+        }
+
+    def write_trace(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.trace(), indent=2))
+
+
+PROFILER = Profiler()
+
+
+def stage(name: str):
+    return PROFILER.stage(name)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator counting calls and wall/CPU time of a hot function.
+
+    Nested calls of instrumented functions are counted inclusively.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record_call(
+                    label, time.perf_counter() - wall_start, time.thread_time() - cpu_start
+                )
+
+        return wrapper
+
+    return decorate
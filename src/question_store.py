@@ -0,0 +1,319 @@
+import bisect
+import json
+import mmap
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.dedup import match_text
+from src.ontology import TOPIC_IDS
+from src.tokens import VOCAB, normalize_text, split_parts
+
+
+STORE_MAGIC = b"QSTORE01"
+STORE_NAME = "questions.store"
+NO_MARKS = 0
+
+# Fixed-width columns: (name, array typecode).
+# ``joined`` is 1 for rows that carry the ``harrison_tags`` / ``harrison_terms``
+# / ``harrison_scores`` arrays joined in by prepare_data.
+NUMERIC_COLUMNS = [("year", "h"), ("paper_id", "b"), ("marks", "h"), ("cluster_size", "i"), ("joined", "b")]
+# Variable-length UTF-8 columns, each stored as an offsets array plus a blob.
+TEXT_COLUMNS = [
+    "q_id",
+    "raw_text",
+    "harrison_tag_ids",
+    "harrison_tag_terms",
+    "templates_str",
+    "tags",
+    "cluster_id",
+    "cluster_text",
+    "harrison_terms",
+    "harrison_scores",
+]
+# List columns, split on ";" by prepare_data, so joining them is lossless.
+LIST_COLUMNS = ("tags", "harrison_terms", "harrison_scores")
+# Harrison tag ids, pre-split: per-row offsets into an int32 array of
+# indexes into a store-local vocabulary text column.
+TAG_IDS_SECTION = "harrison_tag_index"
+TAG_VOCAB_SECTION = "harrison_tag_vocab"
+# The normalized ``match_text`` of each row, tokenized the same way against
+# a store-local vocabulary of word runs and separators.
+TOKENS_SECTION = "match_tokens"
+TOKEN_VOCAB_SECTION = "token_vocab"
+
+
+def _encode_text(question: dict, name: str) -> bytes:
+    value = question.get(name)
+    if name in LIST_COLUMNS:
+        value = ";".join(map(str, value or []))
+    return (value or "").encode("utf-8")
+
+
+class _TextColumnWriter:
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.blob = tempfile.TemporaryFile()
+
+    def append(self, data: bytes) -> None:
+        self.blob.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+
+def write_question_store(questions: Iterable[dict], path: Path) -> int:
+    """Write questions, which must arrive sorted by (year, paper_id), as a columnar store.
+
+    The file is a fixed header, a JSON table of contents and one aligned
+    section per column. Text blobs are spooled to temporary files while
+    writing, so memory is bounded by the numeric columns and offsets.
+    Returns the number of questions written.
+    """
+    numeric = {name: array(code) for name, code in NUMERIC_COLUMNS}
+    text = {name: _TextColumnWriter() for name in TEXT_COLUMNS}
+    tag_offsets = array("q", [0])
+    tag_values = array("i")
+    tag_vocab: Dict[str, int] = {}
+    token_offsets = array("q", [0])
+    token_values = array("i")
+    token_vocab: Dict[str, int] = {}
+    last_key: Tuple[int, int] = (-1, -1)
+    for question in questions:
+        key = (int(question["year"]), int(question["paper_id"]))
+        if key < last_key:
+            raise ValueError("Questions must be sorted by (year, paper_id)")
+        last_key = key
+        numeric["year"].append(key[0])
+        numeric["paper_id"].append(key[1])
+        numeric["marks"].append(question.get("marks") or NO_MARKS)
+        numeric["cluster_size"].append(question.get("cluster_size") or 0)
+        numeric["joined"].append(question.get("harrison_tags") is not None)
+        for name, column in text.items():
+            column.append(_encode_text(question, name))
+        tags = question.get("harrison_tags")
+        if tags is None:
+            tags = filter(None, (question.get("harrison_tag_ids") or "").split(";"))
+        for tag in tags:
+            tag_values.append(tag_vocab.setdefault(tag, len(tag_vocab)))
+        tag_offsets.append(len(tag_values))
+        for part in split_parts(normalize_text(match_text(question))):
+            token_values.append(token_vocab.setdefault(part, len(token_vocab)))
+        token_offsets.append(len(token_values))
+
+    vocab = _TextColumnWriter()
+    for tag in tag_vocab:
+        vocab.append(tag.encode("utf-8"))
+    parts = _TextColumnWriter()
+    for part in token_vocab:
+        parts.append(part.encode("utf-8"))
+    sections: List[Tuple[str, str, object]] = []
+    for name, code in NUMERIC_COLUMNS:
+        sections.append((name, code, numeric[name]))
+    for name, column in text.items():
+        sections.append((f"{name}.offsets", "q", column.offsets))
+        sections.append((f"{name}.blob", "B", column.blob))
+    sections.append((f"{TAG_IDS_SECTION}.offsets", "q", tag_offsets))
+    sections.append((f"{TAG_IDS_SECTION}.values", "i", tag_values))
+    sections.append((f"{TAG_VOCAB_SECTION}.offsets", "q", vocab.offsets))
+    sections.append((f"{TAG_VOCAB_SECTION}.blob", "B", vocab.blob))
+    sections.append((f"{TOKENS_SECTION}.offsets", "q", token_offsets))
+    sections.append((f"{TOKENS_SECTION}.values", "i", token_values))
+    sections.append((f"{TOKEN_VOCAB_SECTION}.offsets", "q", parts.offsets))
+    sections.append((f"{TOKEN_VOCAB_SECTION}.blob", "B", parts.blob))
+
+    toc = []
+    offset = 0
+    for name, code, data in sections:
+        size = data.tell() if hasattr(data, "tell") else len(data) * data.itemsize
+        toc.append({"name": name, "typecode": code, "offset": offset, "size": size})
+        offset += size + (-size % 8)
+    header = json.dumps(
+        {"byteorder": sys.byteorder, "count": len(numeric["year"]), "sections": toc}
+    ).encode("utf-8")
+    header += b" " * (-(len(STORE_MAGIC) + 8 + len(header)) % 8)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(STORE_MAGIC)
+        handle.write(struct.pack("<Q", len(header)))
+        handle.write(header)
+        for (name, code, data), entry in zip(sections, toc):
+            if hasattr(data, "tell"):
+                data.seek(0)
+                shutil.copyfileobj(data, handle)
+                data.close()
+            else:
+                data.tofile(handle)
+            handle.write(b"\0" * (-entry["size"] % 8))
+    tmp_path.replace(path)
+    return len(numeric["year"])
+
+
+class QuestionStore:
+    """Memory-mapped columnar question store written by ``write_question_store``.
+
+    Columns are exposed as zero-copy typed memoryviews over the mapping.
+    Rows are sorted by (year, paper_id), so ``view(year, paper_id)`` is a
+    contiguous slice found by binary search.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._handle = self.path.open("rb")
+        self._mmap = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        if bytes(buffer[: len(STORE_MAGIC)]) != STORE_MAGIC:
+            self.close()
+            raise ValueError(f"Not a question store: {self.path}")
+        (header_size,) = struct.unpack_from("<Q", buffer, len(STORE_MAGIC))
+        base = len(STORE_MAGIC) + 8
+        header = json.loads(bytes(buffer[base : base + header_size]))
+        if header["byteorder"] != sys.byteorder:
+            self.close()
+            raise ValueError(f"Question store {self.path} was written with {header['byteorder']}-endian arrays")
+        data_start = base + header_size
+        self.count: int = header["count"]
+        self.columns: Dict[str, memoryview] = {}
+        for entry in header["sections"]:
+            start = data_start + entry["offset"]
+            section = buffer[start : start + entry["size"]]
+            self.columns[entry["name"]] = section if entry["typecode"] == "B" else section.cast(entry["typecode"])
+        # Store-local tag indexes are mapped to the process-wide topic ids once.
+        self._tag_ids: Optional[List[int]] = None
+        if f"{TAG_VOCAB_SECTION}.offsets" in self.columns:
+            vocab_size = len(self.columns[f"{TAG_VOCAB_SECTION}.offsets"]) - 1
+            self._tag_ids = TOPIC_IDS.intern_all(self.text(TAG_VOCAB_SECTION, idx) for idx in range(vocab_size))
+        # Likewise the store-local token vocabulary to the process-wide ``VOCAB``.
+        self._token_ids: Optional[List[int]] = None
+        if f"{TOKEN_VOCAB_SECTION}.offsets" in self.columns:
+            vocab_size = len(self.columns[f"{TOKEN_VOCAB_SECTION}.offsets"]) - 1
+            self._token_ids = VOCAB.intern_all(self.text(TOKEN_VOCAB_SECTION, idx) for idx in range(vocab_size))
+        self._keys = [
+            (year, paper_id) for year, paper_id in zip(self.columns["year"], self.columns["paper_id"])
+        ]
+
+    def close(self) -> None:
+        self.columns = {}
+        if getattr(self, "_mmap", None) is not None and not self._mmap.closed:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views handed out earlier still reference the mapping.
+                pass
+        self._handle.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def years(self) -> List[int]:
+        return sorted({year for year, _ in self._keys})
+
+    def text(self, name: str, row: int) -> str:
+        offsets = self.columns[f"{name}.offsets"]
+        return str(self.columns[f"{name}.blob"][offsets[row] : offsets[row + 1]], "utf-8")
+
+    def question(self, row: int) -> dict:
+        """Row ``row`` as the dict ``papers_YYYY.json`` holds for it.
+
+        Rows also carry the derived ``tag_ids`` (interned Harrison tags) and
+        ``match_tokens`` (token array of ``match_text``), which JSON rows lack.
+        """
+        marks = self.columns["marks"][row]
+        tags = self.text("tags", row)
+        question = {
+            "q_id": self.text("q_id", row),
+            "raw_text": self.text("raw_text", row),
+            "year": self.columns["year"][row],
+            "paper_id": self.columns["paper_id"][row],
+            "marks": marks if marks != NO_MARKS else None,
+            "tags": tags.split(";") if tags else [],
+            "harrison_tag_ids": self.text("harrison_tag_ids", row),
+            "harrison_tag_terms": self.text("harrison_tag_terms", row),
+            "templates_str": self.text("templates_str", row),
+        }
+        if self._tag_ids is not None:
+            offsets = self.columns[f"{TAG_IDS_SECTION}.offsets"]
+            values = self.columns[f"{TAG_IDS_SECTION}.values"][offsets[row] : offsets[row + 1]]
+            question["tag_ids"] = [self._tag_ids[value] for value in values]
+            if "joined" in self.columns and self.columns["joined"][row]:
+                tags = TOPIC_IDS.strings(question["tag_ids"])
+                # Every tag has a term and a score, so the lists are empty exactly when the tags are.
+                question["harrison_tags"] = tags
+                question["harrison_terms"] = self.text("harrison_terms", row).split(";") if tags else []
+                scores = self.text("harrison_scores", row)
+                question["harrison_scores"] = [float(score) for score in scores.split(";")] if tags else []
+        if self._token_ids is not None:
+            offsets = self.columns[f"{TOKENS_SECTION}.offsets"]
+            values = self.columns[f"{TOKENS_SECTION}.values"][offsets[row] : offsets[row + 1]]
+            question["match_tokens"] = tuple(map(self._token_ids.__getitem__, values))
+        # Stores written before clustering, or from unclustered data, have no cluster ids.
+        cluster_id = self.text("cluster_id", row) if "cluster_id.offsets" in self.columns else ""
+        if cluster_id:
+            question["cluster_id"] = cluster_id
+            question["cluster_size"] = self.columns["cluster_size"][row]
+            question["cluster_text"] = self.text("cluster_text", row)
+        return question
+
+    def view(self, year: Optional[int] = None, paper_id: Optional[int] = None) -> "QuestionView":
+        if year is None:
+            return QuestionView(self, 0, self.count)
+        if paper_id is None:
+            low, high = (year, -1), (year, sys.maxsize)
+        else:
+            low, high = (year, paper_id), (year, paper_id)
+        start = bisect.bisect_left(self._keys, low)
+        stop = bisect.bisect_right(self._keys, high)
+        return QuestionView(self, start, stop)
+
+
+class QuestionView(Sequence):
+    """Contiguous row range of a ``QuestionStore``.
+
+    Indexing materializes a question dict, so existing callers keep working;
+    ``column`` returns zero-copy slices for code that reads columns directly.
+    """
+
+    def __init__(self, store: QuestionStore, start: int, stop: int):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.store.question(self.start + index)
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in range(self.start, self.stop):
+            yield self.store.question(row)
+
+    def column(self, name: str) -> memoryview:
+        return self.store.columns[name][self.start : self.stop]
+
+    def texts(self, name: str) -> List[str]:
+        return [self.store.text(name, row) for row in range(self.start, self.stop)]
+
+
+_OPEN_STORES: Dict[Path, Tuple[int, QuestionStore]] = {}
+
+
+def open_question_store(data_dir: Path) -> Optional[QuestionStore]:
+    """Return the (shared) store under ``data_dir``, or None when there is none."""
+    path = Path(data_dir) / STORE_NAME
+    if not path.exists():
+        return None
+    mtime = path.stat().st_mtime_ns
+    cached = _OPEN_STORES.get(path)
+    if cached is None or cached[0] != mtime:
+        _OPEN_STORES[path] = (mtime, QuestionStore(path))
+    return _OPEN_STORES[path][1]
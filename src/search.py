@@ -0,0 +1,236 @@
+import math
+import random
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from src.evaluate import Metrics
+
+
+# Weights that SimpleFrequencyPredictor actually reads, with their ranges.
+SEARCH_SPACE: Dict[str, Tuple[float, float]] = {
+    "recency_weight": (0.5, 1.2),
+    "marks_weight": (0.5, 1.5),
+    "frequency_weight": (0.5, 1.5),
+    "graph_weight": (0.0, 0.3),
+}
+
+
+class Budget:
+    """Search budget in full-evaluation equivalents and/or wall-clock seconds."""
+
+    def __init__(self, max_evals: Optional[float] = None, max_seconds: Optional[float] = None):
+        self.max_evals = max_evals
+        self.max_seconds = max_seconds
+        self.started = time.perf_counter()
+
+    @property
+    def unbounded(self) -> bool:
+        return self.max_evals is None and self.max_seconds is None
+
+    def out_of_time(self) -> bool:
+        return self.max_seconds is not None and time.perf_counter() - self.started >= self.max_seconds
+
+    def remaining_evals(self, spent: float) -> float:
+        if self.max_evals is None:
+            return math.inf
+        return self.max_evals - spent
+
+    def exhausted(self, spent: float) -> bool:
+        return self.out_of_time() or self.remaining_evals(spent) <= 1e-9
+
+
+class SearchStrategy:
+    """Proposes configs and yields (config, metrics) for full evaluations.
+
+    ``evaluator`` exposes ``map(configs, fidelity)``, which yields metrics in
+    order and charges ``fidelity`` evaluations per config, ``evaluations``
+    (spent so far) and ``batch_size`` (configs worth evaluating at once).
+    Results are consumed lazily, so ``AutoTuner.tune`` can stop early.
+    """
+
+    name = "base"
+
+    def search(self, evaluator, budget: Budget, rng: random.Random) -> Iterator[Tuple[dict, Metrics]]:
+        raise NotImplementedError
+
+
+def sample_config(rng: random.Random) -> dict:
+    return {name: round(rng.uniform(low, high), 3) for name, (low, high) in SEARCH_SPACE.items()}
+
+
+def _objective(metrics: Metrics) -> Tuple[float, float]:
+    return metrics.recall_at_k, metrics.ndcg_at_k
+
+
+def _affordable(evaluator, budget: Budget, fidelity: float = 1.0) -> int:
+    """Configs to evaluate next: one batch, capped by the evaluations left.
+
+    Time-only budgets have no cap; ``Budget.out_of_time`` stops the loop.
+    """
+    if budget.max_evals is None:
+        return evaluator.batch_size
+    remaining = budget.remaining_evals(evaluator.evaluations)
+    return min(evaluator.batch_size, int(remaining / fidelity + 1e-9))
+
+
+def _evaluate_within_budget(
+    evaluator, budget: Budget, configs: Sequence[dict], fidelity: float = 1.0
+) -> Iterator[Tuple[dict, Metrics]]:
+    for start in range(0, len(configs), evaluator.batch_size):
+        if budget.exhausted(evaluator.evaluations):
+            return
+        batch = configs[start : start + _affordable(evaluator, budget, fidelity)]
+        if not batch:
+            return
+        yield from zip(batch, evaluator.map(batch, fidelity))
+
+
+class GridSearch(SearchStrategy):
+    name = "grid"
+
+    def __init__(self, configs: List[dict]):
+        self.configs = configs
+
+    def search(self, evaluator, budget, rng):
+        if budget.unbounded:
+            # Unbudgeted grids are handed to the evaluator in one go.
+            yield from zip(self.configs, evaluator.map(self.configs))
+            return
+        yield from _evaluate_within_budget(evaluator, budget, self.configs)
+
+
+class RandomSearch(SearchStrategy):
+    name = "random"
+
+    def __init__(self, default_evals: int = 30):
+        self.default_evals = default_evals
+
+    def search(self, evaluator, budget, rng):
+        if budget.unbounded:
+            budget = Budget(max_evals=self.default_evals)
+        while not budget.exhausted(evaluator.evaluations):
+            batch = [sample_config(rng) for _ in range(_affordable(evaluator, budget))]
+            if not batch:
+                return
+            yield from zip(batch, evaluator.map(batch))
+
+
+class SuccessiveHalving(SearchStrategy):
+    """Screen many configs on the most recent split, promote the top 1/eta.
+
+    Rung ``r`` evaluates on the last ``ceil(n_splits / eta ** (rungs - 1 - r))``
+    rolling splits, so only survivors pay for the full rolling evaluation.
+    """
+
+    name = "halving"
+
+    def __init__(self, eta: int = 3, default_evals: int = 30):
+        self.eta = eta
+        self.default_evals = default_evals
+
+    def _fidelities(self, n_splits: int) -> List[int]:
+        sizes = [n_splits]
+        while sizes[0] > 1:
+            sizes.insert(0, max(1, math.ceil(sizes[0] / self.eta)))
+        return sizes
+
+    def _cost(self, n_configs: int, fidelities: List[int], n_splits: int) -> float:
+        cost = 0.0
+        for size in fidelities:
+            cost += n_configs * size / n_splits
+            n_configs = max(1, n_configs // self.eta)
+        return cost
+
+    def search(self, evaluator, budget, rng):
+        n_splits = evaluator.n_splits
+        fidelities = self._fidelities(n_splits)
+        max_evals = self.default_evals if budget.max_evals is None else budget.max_evals
+        n_configs = 1
+        while self._cost(n_configs + 1, fidelities, n_splits) <= max_evals:
+            n_configs += 1
+        survivors = [sample_config(rng) for _ in range(n_configs)]
+        for size in fidelities[:-1]:
+            scored = []
+            for config, metrics in zip(survivors, evaluator.map(survivors, size / n_splits)):
+                scored.append((config, metrics))
+                if budget.out_of_time():
+                    break
+            scored.sort(key=lambda pair: _objective(pair[1]), reverse=True)
+            keep = 1 if budget.out_of_time() else max(1, len(survivors) // self.eta)
+            survivors = [config for config, _ in scored[:keep]]
+        for config, metrics in zip(survivors, evaluator.map(survivors)):
+            yield config, metrics
+            if budget.out_of_time():
+                return
+
+
+class SurrogateSearch(SearchStrategy):
+    """Random warm-up, then pick points by a kernel-regression surrogate.
+
+    The surrogate is a Nadaraya-Watson estimate of recall over the observed
+    configs plus an exploration bonus proportional to the distance to the
+    nearest observed point; each round scores ``pool_size`` random
+    proposals and evaluates the best ``batch_size`` of them.
+    """
+
+    name = "surrogate"
+
+    def __init__(
+        self,
+        initial: int = 6,
+        pool_size: int = 256,
+        bandwidth: float = 0.2,
+        explore: float = 0.5,
+        default_evals: int = 20,
+    ):
+        self.initial = initial
+        self.pool_size = pool_size
+        self.bandwidth = bandwidth
+        self.explore = explore
+        self.default_evals = default_evals
+
+    @staticmethod
+    def _point(config: dict) -> List[float]:
+        return [
+            (config[name] - low) / (high - low) for name, (low, high) in SEARCH_SPACE.items()
+        ]
+
+    def _acquisition(self, point: List[float], observed: List[Tuple[List[float], float]]) -> float:
+        weight_sum = 0.0
+        value_sum = 0.0
+        nearest = math.inf
+        for other, value in observed:
+            distance = math.sqrt(sum((a - b) ** 2 for a, b in zip(point, other)))
+            nearest = min(nearest, distance)
+            weight = math.exp(-((distance / self.bandwidth) ** 2))
+            weight_sum += weight
+            value_sum += weight * value
+        mean = value_sum / weight_sum if weight_sum > 1e-12 else 0.0
+        scale = max((value for _, value in observed), default=0.0) or 1.0
+        return mean + self.explore * scale * nearest
+
+    def search(self, evaluator, budget, rng):
+        if budget.unbounded:
+            budget = Budget(max_evals=self.default_evals)
+        observed: List[Tuple[List[float], float]] = []
+        warmup = [sample_config(rng) for _ in range(self.initial)]
+        for config, metrics in _evaluate_within_budget(evaluator, budget, warmup):
+            observed.append((self._point(config), metrics.recall_at_k))
+            yield config, metrics
+        while not budget.exhausted(evaluator.evaluations):
+            pool = [sample_config(rng) for _ in range(self.pool_size)]
+            pool.sort(key=lambda config: self._acquisition(self._point(config), observed), reverse=True)
+            batch = pool[: evaluator.batch_size]
+            evaluated = list(_evaluate_within_budget(evaluator, budget, batch))
+            if not evaluated:
+                return
+            for config, metrics in evaluated:
+                observed.append((self._point(config), metrics.recall_at_k))
+                yield config, metrics
+
+
+STRATEGIES = {
+    "random": RandomSearch,
+    "halving": SuccessiveHalving,
+    "surrogate": SurrogateSearch,
+}
@@ -0,0 +1,264 @@
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from src.evaluate import load_year_data
+from src.ontology import TopicOntology
+from src.pipeline import load_config
+from src.predictor_interface import CompiledQuestions, PrefixScores, PreparedQuestion, SimpleFrequencyPredictor
+
+
+CONFIG_KEYS = ("recency_weight", "marks_weight", "frequency_weight", "graph_weight")
+
+
+class LRUCache:
+    """Thread-safe LRU mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class PredictionService:
+    """Keeps questions, the compiled ontology and compiled question sets warm.
+
+    Rankings are cached by (paper_id, years, config); the compiled question
+    set of each (paper_id, years) is cached separately, so a config what-if
+    on an already-seen slice only re-runs the weighted scoring.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        ontology: TopicOntology,
+        years: List[int],
+        default_config: dict,
+        cache_size: int = 1024,
+    ):
+        self.ontology = ontology
+        self.years = sorted(years)
+        self.default_config = default_config
+        self.predictor = SimpleFrequencyPredictor()
+        # Per year, (paper_id, prepared question) in question order.
+        self._prepared: Dict[int, List[Tuple[Optional[int], PreparedQuestion]]] = {}
+        matches: Dict[str, List[str]] = {}
+        for year in self.years:
+            self._prepared[year] = []
+            for question in load_year_data(data_dir, year):
+                topic_candidates = self.predictor.topic_candidates(question, ontology, matches)
+                if topic_candidates:
+                    prepared = (topic_candidates, question.get("marks"))
+                    self._prepared[year].append((question.get("paper_id"), prepared))
+        self.rankings = LRUCache(cache_size)
+        self.compiled = LRUCache(max(16, cache_size // 8))
+
+    def _prepared_blocks(self, paper_id: Optional[int], years: Tuple[int, ...]) -> List[List[PreparedQuestion]]:
+        unknown = [year for year in years if year not in self._prepared]
+        if unknown:
+            raise ValueError(f"Years not loaded: {unknown}")
+        return [
+            [item for question_paper, item in self._prepared[year] if paper_id is None or question_paper == paper_id]
+            for year in years
+        ]
+
+    def _compiled(self, paper_id: Optional[int], years: Tuple[int, ...]) -> CompiledQuestions:
+        key = (paper_id, years)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            prepared = [item for block in self._prepared_blocks(paper_id, years) for item in block]
+            compiled = self.predictor.compile(prepared, self.ontology)
+            self.compiled.put(key, compiled)
+        return compiled
+
+    def _prefix_scores(self, paper_id: Optional[int], years: Tuple[int, ...]) -> PrefixScores:
+        """Per-year blocks, which a ``recency_weight`` other than 1 needs; cached beside the compiled sets."""
+        key = ("by_year", paper_id, years)
+        prefix = self.compiled.get(key)
+        if prefix is None:
+            prefix = self.predictor.prefix_scores(self._prepared_blocks(paper_id, years), self.ontology, years)
+            self.compiled.put(key, prefix)
+        return prefix
+
+    def rank(
+        self, paper_id: Optional[int] = None, years: Optional[List[int]] = None, config: Optional[dict] = None
+    ) -> List[Tuple[str, float]]:
+        years_key = tuple(sorted(set(years))) if years else tuple(self.years)
+        merged = {**self.default_config, **(config or {})}
+        config_key = tuple(sorted(merged.items()))
+        key = (paper_id, years_key, config_key)
+        ranked = self.rankings.get(key)
+        if ranked is None:
+            if merged.get("recency_weight", 1.0) == 1.0:
+                results = self._compiled(paper_id, years_key).rank(merged)
+            else:
+                results = self._prefix_scores(paper_id, years_key).rank(merged)
+            ranked = [(result.topic_id, result.score) for result in results]
+            self.rankings.put(key, ranked)
+        return ranked
+
+    def topic_name(self, topic_id: str) -> Optional[str]:
+        topic = self.ontology.topics.get(topic_id)
+        return topic.name if topic else None
+
+
+def _parse_request(query: dict, body: dict) -> dict:
+    params = {key: values[-1] for key, values in query.items()}
+    params.update(body)
+    return params
+
+
+def _parse_rank_params(params: dict) -> Tuple[Optional[int], Optional[List[int]], dict, int]:
+    paper_id = params.get("paper_id")
+    paper_id = int(paper_id) if paper_id not in (None, "", "all") else None
+    years = params.get("years")
+    if isinstance(years, str):
+        years = years.split(",")
+    # Duplicates and order do not change a ranking; echo what was ranked.
+    years = sorted({int(year) for year in years if year != ""}) if years else None
+    config = dict(params.get("config") or {})
+    for key in CONFIG_KEYS:
+        if key in params:
+            config[key] = params[key]
+    config = {key: float(value) for key, value in config.items()}
+    top = int(params.get("top", 30))
+    if top < 0:
+        raise ValueError("top must be non-negative")
+    return paper_id, years, config, top
+
+
+def _parse_max_topics(params: dict) -> int:
+    max_topics = int(params.get("max_topics", 3))
+    if max_topics < 1:
+        raise ValueError("max_topics must be at least 1")
+    return max_topics
+
+
+def make_handler(service: PredictionService):
+    class PredictionHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body are written separately; avoid Nagle/delayed-ACK stalls.
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _handle(self, body: dict) -> None:
+            url = urlparse(self.path)
+            params = _parse_request(parse_qs(url.query), body)
+            try:
+                if url.path == "/health":
+                    self._send(200, {"status": "ok", "years": service.years})
+                elif url.path == "/stats":
+                    self._send(200, {"rankings": service.rankings.stats(), "compiled": service.compiled.stats()})
+                elif url.path == "/rank":
+                    paper_id, years, config, top = _parse_rank_params(params)
+                    ranked = service.rank(paper_id, years, config)
+                    topics = [
+                        {"topic_id": topic_id, "name": service.topic_name(topic_id), "score": round(score, 6)}
+                        for topic_id, score in ranked[:top]
+                    ]
+                    self._send(200, {"paper_id": paper_id, "years": years or service.years, "topics": topics})
+                elif url.path == "/match":
+                    if "text" not in params:
+                        raise ValueError("text is required")
+                    matches = service.ontology.match_topics(params["text"], _parse_max_topics(params))
+                    self._send(
+                        200,
+                        {"matches": [{"topic_id": topic_id, "score": score} for topic_id, score in matches]},
+                    )
+                else:
+                    self._send(404, {"error": f"Unknown endpoint: {url.path}"})
+            except (TypeError, ValueError) as exc:
+                self._send(400, {"error": str(exc)})
+            except Exception as exc:
+                # Answer rather than drop the connection; the client sees what failed.
+                self._send(500, {"error": f"{type(exc).__name__}: {exc}"})
+
+        def do_GET(self):
+            self._handle({})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": "Body must be JSON"})
+                return
+            if not isinstance(body, dict):
+                self._send(400, {"error": "Body must be a JSON object"})
+                return
+            self._handle(body)
+
+    return PredictionHandler
+
+
+def make_server(service: PredictionService, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--cache-dir", default=".cache")
+    parser.add_argument("--config", default="configs/best_config.yaml")
+    parser.add_argument("--years", type=int, nargs="*", default=[2022, 2023, 2024, 2025])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    ontology = TopicOntology.from_seed(
+        data_dir / "topic_ontology_seed.json", cache_dir=Path(args.cache_dir) / "ontology"
+    )
+    service = PredictionService(data_dir, ontology, args.years, load_config(Path(args.config)), args.cache_size)
+    server = make_server(service, args.host, args.port)
+    print(f"Serving predictions on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
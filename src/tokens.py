@@ -0,0 +1,55 @@
+import functools
+import re
+from typing import List, Sequence, Tuple
+
+from src.interning import Interner
+
+
+WORD_RE = re.compile(r"\b[\w-]+\b")
+PART_RE = re.compile(r"\w+|\W+")
+TOKEN_CACHE_SIZE = 1 << 16
+# Id of a part that is not in the vocabulary; no term contains it.
+UNKNOWN = -1
+
+# The parts of normalized text (word runs and separators). A normalized
+# text is the concatenation of its parts, so an interned token array is
+# lossless. Only corpus text and ontology terms are interned: ad-hoc text
+# is looked up, so client input cannot grow the vocabulary.
+VOCAB = Interner()
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+def split_parts(normalized: str) -> List[str]:
+    """Split normalized text into alternating word runs and separators.
+
+    Word boundaries in normalized text only fall between a word run and a
+    separator, so matching a term on whole parts is the same as searching
+    for it with ``\\b...\\b``.
+    """
+    return PART_RE.findall(normalized)
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def normalized_parts(text: str) -> Tuple[str, Tuple[str, ...]]:
+    """The normalized text and its parts, behind an LRU: the regex work is done once per text."""
+    normalized = normalize_text(text)
+    return normalized, tuple(split_parts(normalized))
+
+
+def tokenize(text: str) -> Tuple[int, ...]:
+    """Normalize corpus ``text`` and return its parts as (interned) vocabulary ids."""
+    return tuple(VOCAB.intern_all(normalized_parts(text)[1]))
+
+
+def lookup_tokens(text: str) -> Tuple[int, ...]:
+    """Token array of ad-hoc ``text`` without interning; unseen parts become ``UNKNOWN``."""
+    get = VOCAB.get
+    return tuple(get(part, UNKNOWN) for part in normalized_parts(text)[1])
+
+
+def detokenize(tokens: Sequence[int]) -> str:
+    """The normalized text an interned token array was made from."""
+    return "".join(VOCAB.strings(tokens))
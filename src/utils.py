@@ -21,3 +21,50 @@ def format_metrics_table(rows):
         for row in rows
     ]
     return "\n".join([header, sep, *body])
+
+
+def format_interval_table(rows):
+    """``format_metrics_table`` with a (low, high) interval in place of each metric.
+
+    A split without questions has no intervals and is shown as "n/a".
+    """
+    header = "| Split | Recall@K | Precision@K | MAP@K | NDCG@K |"
+    sep = "| --- | --- | --- | --- | --- |"
+    names = ["recall_at_k", "precision_at_k", "map_at_k", "ndcg_at_k"]
+    body = [
+        f"| {row['split']} | "
+        + " | ".join(f"[{row[name][0]:.3f}, {row[name][1]:.3f}]" if name in row else "n/a" for name in names)
+        + " |"
+        for row in rows
+    ]
+    return "\n".join([header, sep, *body])
+
+
+def format_curve_table(curves, ks):
+    header = "| Split | " + " | ".join(f"R@{k}" for k in ks) + " |"
+    sep = "| --- | " + " | ".join("---" for _ in ks) + " |"
+    body = [
+        f"| {split} | " + " | ".join(f"{curve[k - 1]:.3f}" for k in ks) + " |"
+        for split, curve in curves.items()
+    ]
+    return "\n".join([header, sep, *body])
+
+
+def format_profile_tables(stages, functions):
+    stage_rows = [
+        "| Stage | Calls | Wall s | CPU s | Peak MiB |",
+        "| --- | --- | --- | --- | --- |",
+        *(
+            f"| {row.name} | {row.calls} | {row.wall_seconds:.3f} | {row.cpu_seconds:.3f} | {row.peak_bytes / 2**20:.1f} |"
+            for row in stages
+        ),
+    ]
+    function_rows = [
+        "| Function | Calls | Wall s | CPU s | ms/call |",
+        "| --- | --- | --- | --- | --- |",
+        *(
+            f"| {row.name} | {row.calls} | {row.wall_seconds:.3f} | {row.cpu_seconds:.3f} | {row.wall_seconds / row.calls * 1000:.3f} |"
+            for row in sorted(functions, key=lambda row: row.wall_seconds, reverse=True)
+        ),
+    ]
+    return "\n".join(stage_rows), "\n".join(function_rows)
@@ -0,0 +1,101 @@
+import posixpath
+import re
+import zipfile
+from os import PathLike
+from typing import IO, Dict, Iterator, List, Optional, Union
+from xml.etree import ElementTree
+
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_COLUMN_RE = re.compile(r"[A-Z]+")
+
+
+def _column_index(cell_ref: str) -> int:
+    """Zero-based column of a cell reference such as ``"AB12"``."""
+    index = 0
+    for char in _COLUMN_RE.match(cell_ref).group():
+        index = index * 26 + ord(char) - ord("A") + 1
+    return index - 1
+
+
+def _text(element: ElementTree.Element) -> str:
+    """All ``<t>`` text under a ``<si>`` or ``<is>``, including rich-text runs."""
+    return "".join(node.text or "" for node in element.iter(f"{MAIN_NS}t"))
+
+
+def _sheet_paths(workbook: zipfile.ZipFile) -> Dict[str, str]:
+    """Map sheet names to their worksheet part paths inside the package."""
+    targets = {}
+    rels = ElementTree.fromstring(workbook.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship"):
+        target = rel.get("Target")
+        # Targets are relative to xl/ unless they are package-absolute.
+        targets[rel.get("Id")] = target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+    return {
+        sheet.get("name"): targets[sheet.get(f"{REL_NS}id")]
+        for sheet in ElementTree.fromstring(workbook.read("xl/workbook.xml")).iter(f"{MAIN_NS}sheet")
+    }
+
+
+def _shared_strings(workbook: zipfile.ZipFile) -> List[str]:
+    if "xl/sharedStrings.xml" not in workbook.namelist():
+        return []
+    strings = []
+    with workbook.open("xl/sharedStrings.xml") as handle:
+        for _, element in ElementTree.iterparse(handle):
+            if element.tag == f"{MAIN_NS}si":
+                strings.append(_text(element))
+                element.clear()
+    return strings
+
+
+def _cell_value(cell: ElementTree.Element, shared: List[str]) -> str:
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        inline = cell.find(f"{MAIN_NS}is")
+        return _text(inline) if inline is not None else ""
+    value = cell.findtext(f"{MAIN_NS}v") or ""
+    if kind == "s" and value:
+        return shared[int(value)]
+    return value
+
+
+def iter_sheet_rows(source: Union[str, PathLike, IO[bytes]], sheet_name: str) -> Iterator[dict]:
+    """Yield the rows of one worksheet as dicts keyed by its header row.
+
+    The sheet XML is read with an incremental parser and each ``<row>`` is
+    discarded once converted, so memory is bounded by the shared-string
+    table and one row rather than by the sheet. Values are returned as the
+    text the cell stores (numbers as written, e.g. ``"2006"``), matching
+    ``csv.DictReader`` over an export of the same sheet; missing cells are
+    empty strings. ``source`` is a path or a seekable binary file.
+    """
+    with zipfile.ZipFile(source) as workbook:
+        sheets = _sheet_paths(workbook)
+        if sheet_name not in sheets:
+            raise KeyError(f"Workbook has no sheet {sheet_name!r}; sheets: {sorted(sheets)}")
+        shared = _shared_strings(workbook)
+        header: Optional[List[str]] = None
+        with workbook.open(sheets[sheet_name]) as handle:
+            sheet_data = None
+            for event, element in ElementTree.iterparse(handle, events=("start", "end")):
+                if event == "start":
+                    if element.tag == f"{MAIN_NS}sheetData":
+                        sheet_data = element
+                    continue
+                if element.tag != f"{MAIN_NS}row":
+                    continue
+                values: Dict[int, str] = {}
+                for position, cell in enumerate(element.iter(f"{MAIN_NS}c")):
+                    ref = cell.get("r")
+                    values[_column_index(ref) if ref else position] = _cell_value(cell, shared)
+                # Finished rows are dropped from the tree as well as emptied.
+                sheet_data.clear()
+                if header is None:
+                    header = [values.get(idx, "") for idx in range(max(values, default=-1) + 1)]
+                    continue
+                if any(values.values()):
+                    yield {name: values.get(idx, "") for idx, name in enumerate(header)}
@@ -1,7 +1,53 @@
+import json
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
+import zipfile
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from pathlib import Path
+from unittest import mock
 
-from src.evaluate import average_precision_at_k, ndcg_at_k, precision_at_k, recall_at_k, rolling_splits
-from src.ontology import Topic, TopicOntology
+from benchmarks.synthetic import generate_dataset
+from src import pipeline
+from src.autotune import AutoTuner
+from src.bootstrap import bootstrap_means, metric_intervals, paired_differences, percentile_interval
+from src.dag import Stage, StageGraph
+from src.dedup import assign_clusters, cluster_near_duplicates, match_text
+from src.evaluate import (
+    average_precision_at_k,
+    compute_metrics,
+    load_year_data,
+    macro_average,
+    macro_metrics_at_ks,
+    ndcg_at_k,
+    precision_at_k,
+    question_metrics,
+    recall_at_k,
+    rolling_splits,
+)
+from src.incremental import TopicScoreState, year_digest
+from src.labeling import LabelCache, auto_label_questions
+from src.ontology import HARRISON_SEED_NAME, TOPIC_IDS, Topic, TopicOntology
+from src.predictor_interface import SimpleFrequencyPredictor
+from src.prepare_data import (
+    build_harrison_ontology,
+    build_papers_json,
+    build_question_store,
+    build_year_bundle,
+    load_question_tags,
+)
+from src.profiling import PROFILER, stage
+from src.question_store import QuestionStore
+from src.tokens import UNKNOWN, VOCAB, detokenize, lookup_tokens, normalize_text, normalized_parts, tokenize
+from src.server import PredictionService, _parse_rank_params, make_server
+from src.utils import format_interval_table
+from src.xlsx_reader import iter_sheet_rows
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
 
 
 class TestOntology(unittest.TestCase):
@@ -10,6 +56,378 @@ class TestOntology(unittest.TestCase):
         matches = ontology.match_topics("Cardiac failure symptoms", max_topics=1)
         self.assertEqual(matches[0][0], "T1")
 
+    def test_trie_matcher_matches_regex_word_boundaries(self):
+        topics = [
+            Topic(topic_id="T1", name="hodgkin lymphoma"),
+            Topic(topic_id="T2", name="non-hodgkin lymphoma"),
+            Topic(topic_id="T3", name="lymph"),
+            Topic(topic_id="T4", name="non"),
+            Topic(topic_id="T5", name="heart", synonyms=["heart failure", "cardiac failure"]),
+        ]
+        texts = [
+            "Non-Hodgkin lymphoma: staging",
+            "Lymphoma and lymph nodes",
+            "Heart failure, HEART block",
+            "cardiac-failure",
+            "",
+        ]
+        regex = TopicOntology(topics, matcher="regex")
+        trie = TopicOntology(topics, matcher="trie")
+        for text in texts:
+            self.assertEqual(regex.match_topics(text, 10), trie.match_topics(text, 10))
+
+    def test_trie_matcher_parity_on_seed(self):
+        seed = DATA_DIR / "topic_ontology_seed.json"
+        regex = TopicOntology.from_seed(seed, matcher="regex")
+        trie = TopicOntology.from_seed(seed, matcher="trie")
+        for question in load_year_data(DATA_DIR, 2023):
+            self.assertEqual(
+                regex.match_topics(question["raw_text"], 50), trie.match_topics(question["raw_text"], 50)
+            )
+
+    def test_tfidf_matcher_scores_verbatim_and_near_misses(self):
+        topics = [
+            Topic(topic_id="T1", name="hodgkin lymphoma"),
+            Topic(topic_id="T2", name="non-hodgkin lymphoma"),
+            Topic(topic_id="T5", name="heart", synonyms=["heart failure", "cardiac failure"]),
+        ]
+        trie = TopicOntology(topics, matcher="trie")
+        tfidf = TopicOntology(topics, matcher="tfidf")
+        for text in ["Hodgkin lymphoma staging", "Cardiac failure", "Lymph nodes"]:
+            self.assertEqual(tfidf.match_topics(text, 5), trie.match_topics(text, 5))
+        texts = ["hodgkin lymphomma", "Hodgkin's lymphoma", "cardiac failures", "hodgkin lymphomma"]
+        self.assertEqual(trie.match_topics(texts[0], 5), [])
+        (topic_id, score), = tfidf.match_topics(texts[0], 5)
+        self.assertEqual(topic_id, "T1")
+        self.assertLess(score, trie.match_topics("hodgkin lymphoma", 5)[0][1])
+        self.assertEqual(tfidf.match_topics_batch(texts, 5), [tfidf.match_topics(text, 5) for text in texts])
+        self.assertNotEqual(tfidf.fingerprint, trie.fingerprint)
+
+    def test_token_arrays_round_trip_and_match_like_text(self):
+        text = "Non-Hodgkin  LYMPHOMA: staging (stage-IV)"
+        tokens = tokenize(text)
+        self.assertEqual(detokenize(tokens), normalize_text(text))
+        self.assertIs(normalized_parts(text), normalized_parts(text))
+        self.assertEqual(lookup_tokens(text), tokens)
+        ontology = TopicOntology(
+            [Topic(topic_id="T1", name="non-hodgkin lymphoma"), Topic(topic_id="T2", name="stage")]
+        )
+        self.assertEqual(ontology.match_tokens(tokens, 5), ontology.match_topics(text, 5))
+        self.assertEqual(ontology.match_tokens_batch([tokens, tokens], 5), [ontology.match_topics(text, 5)] * 2)
+        # Vocabulary ids are per process: pickles carry the parts and re-intern them.
+        state = ontology._matcher.__getstate__()
+        self.assertIn("non", state["_root"])
+        restored = pickle.loads(pickle.dumps(ontology))
+        self.assertEqual(restored.match_tokens(tokens, 5), ontology.match_tokens(tokens, 5))
+        self.assertIn(VOCAB.intern("non"), restored._matcher._root)
+
+    def test_ad_hoc_text_is_looked_up_without_growing_the_vocabulary(self):
+        ontology = TopicOntology([Topic(topic_id="T1", name="heart failure")], matcher="trie")
+        regex = TopicOntology([Topic(topic_id="T1", name="heart failure")], matcher="regex")
+        size = len(VOCAB)
+        for idx in range(50):
+            text = f"Heart failure with qzxv{idx}-marker"
+            self.assertEqual([t for t, _ in ontology.match_topics(text)], ["T1"])
+            self.assertEqual(regex.match_topics(text), ontology.match_topics(text))
+        self.assertEqual(len(VOCAB), size)
+        self.assertIn(UNKNOWN, lookup_tokens("qzxv0 heart"))
+
+
+class TestOntologyHierarchy(unittest.TestCase):
+    def _chain(self):
+        return TopicOntology(
+            [
+                Topic(topic_id="A", name="alpha", parent_id="B", domain="D1"),
+                Topic(topic_id="B", name="beta", parent_id="C", domain="D1"),
+                Topic(topic_id="C", name="gamma", parent_id="A", domain="D2"),
+                Topic(topic_id="E", name="epsilon", parent_id="B", domain="D1"),
+                Topic(topic_id="F", name="phi", parent_id="DOMAIN:X"),
+            ]
+        )
+
+    def test_closure_stops_at_cycles_and_missing_parents(self):
+        ontology = self._chain()
+        self.assertEqual(ontology.ancestors("A"), (("B", 1), ("C", 2)))
+        self.assertEqual(ontology.ancestors("E", max_depth=1), (("B", 1),))
+        self.assertEqual(ontology.related_topics("F"), ["DOMAIN:X"])
+        self.assertEqual(sorted(ontology.descendants("B")), ["A", "C", "E"])
+        self.assertEqual(ontology.domains["D1"], ["A", "B", "E"])
+
+    def test_multi_hop_scoring_matches_across_paths(self):
+        ontology = self._chain()
+        prepared = [(TOPIC_IDS.intern_all(topics), marks) for topics, marks in [("A", 10), ("EF", None), ("AC", 5)]]
+        config = {"graph_weight": 0.3, "graph_decay": 0.5, "marks_weight": 1.2}
+        predictor = SimpleFrequencyPredictor(graph_depth=2)
+        ranked = predictor.predict_prepared(prepared, ontology, config)
+        # C: two hops above A (twice) and E, plus one direct tag.
+        self.assertAlmostEqual({r.topic_id: r.score for r in ranked}["C"], 0.15 * (1.8 + 1.0 + 1.4) + 1.4)
+        self.assertEqual(predictor.compile(prepared, ontology).rank(config), ranked)
+        prefix = predictor.prefix_scores([prepared[:1], prepared[1:]], ontology)
+        self.assertEqual(prefix.rank_prefixes(config, [2]), [ranked])
+        one_hop = SimpleFrequencyPredictor().predict_prepared(prepared, ontology, config)
+        self.assertAlmostEqual({r.topic_id: r.score for r in one_hop}["C"], 1.4)
+
+    def test_topic_table_reads_like_a_dict_and_survives_pickling(self):
+        ontology = TopicOntology(
+            [
+                Topic(topic_id="A", name="alpha", synonyms=["first"], parent_id="B", domain="D1"),
+                Topic(topic_id="B", name="beta", domain="D1"),
+                Topic(topic_id="A", name="alpha prime", parent_id="B", domain="D1"),
+            ]
+        )
+        topics = ontology.topics
+        self.assertEqual(list(topics), ["A", "B"])
+        self.assertEqual(topics["A"], Topic(topic_id="A", name="alpha prime", parent_id="B", domain="D1"))
+        self.assertNotIn("DOMAIN:X", topics)
+        self.assertIsNone(topics.get("missing"))
+        restored = pickle.loads(pickle.dumps(ontology))
+        self.assertEqual(dict(restored.topics), dict(topics))
+        self.assertEqual(restored.ancestors("A"), (("B", 1),))
+        self.assertEqual(restored.fingerprint, ontology.fingerprint)
+
+
+class TestOntologyCache(unittest.TestCase):
+    def test_warm_load_skips_parsing_and_tracks_seed_content(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            seed = Path(tmp) / "seed.json"
+            cache_dir = Path(tmp) / "cache"
+            seed.write_text(json.dumps([{"topic_id": "T1", "name": "heart failure"}]))
+            cold = TopicOntology.from_seed(seed, cache_dir=cache_dir)
+            with mock.patch.object(TopicOntology, "_parse_seed") as parse:
+                warm = TopicOntology.from_seed(seed, cache_dir=cache_dir)
+            parse.assert_not_called()
+            self.assertEqual(warm.match_topics("heart failure"), cold.match_topics("heart failure"))
+
+            seed.write_text(json.dumps([{"topic_id": "T2", "name": "heart failure"}]))
+            updated = TopicOntology.from_seed(seed, cache_dir=cache_dir)
+            self.assertEqual(updated.match_topics("heart failure")[0][0], "T2")
+
+
+class TestPrepareData(unittest.TestCase):
+    def test_streaming_ingest_groups_rows_by_year_and_paper(self):
+        def rows():
+            for q_id, year, paper in [("a", 2006, "II"), ("b", 2006, "I"), ("c", 2007, "I"), ("d", 2006, "II")]:
+                yield {
+                    "year": str(year),
+                    "paper_id": paper,
+                    "question_id": q_id,
+                    "question_text": q_id,
+                    "section": "Long Essay 15",
+                }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            years = build_papers_json(rows(), output_dir)
+            build_year_bundle(output_dir, years)
+            self.assertEqual(years, [2006, 2007])
+            paper2 = json.loads((output_dir / "papers_2006_paper2.json").read_text())
+            self.assertEqual([q["q_id"] for q in paper2["questions"]], ["a", "d"])
+            bundle = load_year_data(output_dir, 2006)
+            self.assertEqual([q["q_id"] for q in bundle], ["b", "a", "d"])
+            self.assertEqual(bundle[0]["marks"], 15)
+
+    def test_question_store_matches_json_and_slices_by_year_and_paper(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            for year in (2022, 2023):
+                (output_dir / f"papers_{year}.json").write_bytes((DATA_DIR / f"papers_{year}.json").read_bytes())
+            for year in (2022, 2023):
+                for paper_id in range(1, 5):
+                    questions = [
+                        q
+                        for q in json.loads((DATA_DIR / f"papers_{year}.json").read_text())["questions"]
+                        if q["paper_id"] == paper_id
+                    ]
+                    payload = {"year": year, "paper_id": paper_id, "questions": questions}
+                    (output_dir / f"papers_{year}_paper{paper_id}.json").write_text(
+                        json.dumps(payload, indent=2)
+                    )
+            build_year_bundle(output_dir, (2022, 2023))
+            build_question_store(output_dir, (2022, 2023))
+
+            store = QuestionStore(output_dir / "questions.store")
+            self.assertEqual(store.years(), [2022, 2023])
+            for year in (2022, 2023):
+                expected = json.loads((output_dir / f"papers_{year}.json").read_text())["questions"]
+                stored = list(store.view(year))
+                for question in stored:
+                    tags = [tag for tag in question["harrison_tag_ids"].split(";") if tag]
+                    self.assertEqual(TOPIC_IDS.strings(question.pop("tag_ids")), question.get("harrison_tags", tags))
+                    self.assertEqual(question.pop("match_tokens"), tokenize(match_text(question)))
+                self.assertEqual(stored, expected)
+                self.assertEqual([q for q in store.view(year)], list(load_year_data(output_dir, year)))
+            paper2 = store.view(2023, 2)
+            self.assertTrue(paper2)
+            self.assertEqual({q["paper_id"] for q in paper2}, {2})
+            self.assertEqual(set(paper2.column("year").tolist()), {2023})
+            store.close()
+
+    def test_harrison_index_and_question_tags_are_joined_at_ingest(self):
+        index_rows = [
+            {"term_id": "TERM1", "canonical_term": "Stroke", "term_norm": "stroke", "domain": "Neurology"},
+            {"term_id": "TERM2", "canonical_term": "Gout", "term_norm": "gout", "domain": ""},
+        ]
+        tag_rows = [
+            {
+                "question_id": "a",
+                "harrison_tag_ids": "TERM1;TERM2",
+                "harrison_tag_terms": "stroke;gout",
+                "harrison_tag_scores": "0.5;0.25",
+            },
+            {"question_id": "b", "harrison_tag_ids": "", "harrison_tag_terms": "", "harrison_tag_scores": ""},
+        ]
+        questions = [
+            {"year": "2006", "paper_id": "I", "question_id": q_id, "question_text": q_id, "section": ""}
+            for q_id in ("a", "b", "c")
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            self.assertEqual(build_harrison_ontology(index_rows, output_dir), 4)
+            build_papers_json(questions, output_dir, question_tags=load_question_tags(tag_rows))
+            paper = json.loads((output_dir / "papers_2006_paper1.json").read_text())["questions"]
+            ontology = TopicOntology.from_seed(output_dir / HARRISON_SEED_NAME)
+            build_year_bundle(output_dir, [2006])
+            build_question_store(output_dir, [2006])
+            store = QuestionStore(output_dir / "questions.store")
+            stored = list(store.view(2006))
+            store.close()
+        # Store rows read like the JSON rows, plus the derived tag ids and tokens.
+        self.assertEqual([TOPIC_IDS.strings(q.pop("tag_ids")) for q in stored], [["TERM1", "TERM2"], [], []])
+        self.assertEqual([{k: v for k, v in q.items() if k != "match_tokens"} for q in stored], paper)
+        # Editing only the joined tags invalidates the year.
+        self.assertEqual(year_digest(stored), year_digest(paper))
+        retagged = [dict(paper[0], harrison_tags=["TERM2"]), *paper[1:]]
+        self.assertNotEqual(year_digest(retagged), year_digest(paper))
+        self.assertEqual(paper[0]["harrison_tags"], ["TERM1", "TERM2"])
+        self.assertEqual(paper[0]["harrison_terms"], ["stroke", "gout"])
+        self.assertEqual(paper[0]["harrison_scores"], [0.5, 0.25])
+        self.assertEqual(paper[1]["harrison_tags"], [])
+        self.assertNotIn("harrison_tags", paper[2])
+        self.assertEqual(ontology.ancestors("TERM1"), (("DOMAIN:NEUROLOGY", 1), ("HARRISON", 2)))
+        self.assertEqual(ontology.topics["TERM2"].parent_id, "DOMAIN:GENERAL_MISC")
+        predictor = SimpleFrequencyPredictor()
+        self.assertEqual(TOPIC_IDS.strings(predictor.topic_candidates(paper[0], ontology)), ["TERM1", "TERM2"])
+        with self.assertRaises(ValueError):
+            load_question_tags([{**tag_rows[0], "harrison_tag_scores": "0.5"}])
+
+    def test_xlsx_rows_stream_shared_inline_and_missing_cells(self):
+        ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+        rel_ns = 'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+        parts = {
+            "xl/workbook.xml": f'<workbook {ns} {rel_ns}><sheets><sheet name="other" r:id="rId2"/>'
+            '<sheet name="questions" r:id="rId1"/></sheets></workbook>',
+            "xl/_rels/workbook.xml.rels": '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+            'relationships"><Relationship Id="rId1" Target="worksheets/sheet1.xml"/>'
+            '<Relationship Id="rId2" Target="/xl/worksheets/sheet2.xml"/></Relationships>',
+            "xl/sharedStrings.xml": f"<sst {ns}><si><t>year</t></si><si><r><t>question</t></r><r><t>_text</t></r></si>"
+            "<si><t>tags</t></si></sst>",
+            "xl/worksheets/sheet1.xml": f'<worksheet {ns}><sheetData>'
+            '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="C1" t="s"><v>2</v></c></row>'
+            '<row r="2"><c r="A2"><v>2006</v></c><c r="C2" t="inlineStr"><is><t>a;b</t></is></c></row>'
+            '<row r="3"/>'
+            '<row r="4"><c r="A4"><v>2007</v></c><c r="B4" t="inlineStr"><is><t>Stroke &amp; TIA</t></is></c></row>'
+            "</sheetData></worksheet>",
+            "xl/worksheets/sheet2.xml": f"<worksheet {ns}><sheetData/></worksheet>",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "book.xlsx"
+            with zipfile.ZipFile(path, "w") as book:
+                for name, xml in parts.items():
+                    book.writestr(name, xml)
+            rows = list(iter_sheet_rows(path, "questions"))
+            self.assertEqual(list(iter_sheet_rows(path, "other")), [])
+            with self.assertRaises(KeyError):
+                list(iter_sheet_rows(path, "missing"))
+        self.assertEqual(
+            rows,
+            [
+                {"year": "2006", "question_text": "", "tags": "a;b"},
+                {"year": "2007", "question_text": "Stroke & TIA", "tags": ""},
+            ],
+        )
+
+
+class TestDedup(unittest.TestCase):
+    def test_clusters_rewordings_but_not_shared_templates(self):
+        texts = [
+            "Management of acute ischemic stroke.",
+            "Hemolytic uremic syndrome",
+            "Management of Acute Ischemic Strokes",
+            "Haemolytic uremic syndrome.",
+            "Management of acute pancreatitis.",
+        ]
+        self.assertEqual(cluster_near_duplicates(texts), [0, 1, 0, 1, 4])
+        # Boilerplate shared by many texts does not make them duplicates.
+        templated = [f"Write short notes on topic{idx:03d}" for idx in range(200)]
+        self.assertEqual(cluster_near_duplicates(templated), list(range(200)))
+
+    def test_prepare_data_emits_clusters_and_matching_runs_once_per_cluster(self):
+        rows = [
+            {"year": "2007", "paper_id": "I", "question_id": "b", "question_text": "Dengue fever."},
+            {"year": "2006", "paper_id": "I", "question_id": "a", "question_text": "Dengue Fever"},
+            {"year": "2007", "paper_id": "I", "question_id": "c", "question_text": "Heart failure"},
+        ]
+        clusters = assign_clusters(rows)
+        self.assertEqual(clusters["b"], ("a", 2, "Dengue Fever"))
+        self.assertEqual(clusters["c"], ("c", 1, "Heart failure"))
+        with tempfile.TemporaryDirectory() as tmp:
+            output_dir = Path(tmp)
+            years = build_papers_json(rows, output_dir, clusters=clusters)
+            build_year_bundle(output_dir, years)
+            build_question_store(output_dir, years)
+            store = QuestionStore(output_dir / "questions.store")
+            question = store.view(2007)[0]
+            store.close()
+        self.assertEqual((question["cluster_id"], question["cluster_size"]), ("a", 2))
+        self.assertEqual(question["cluster_text"], "Dengue Fever")
+
+        ontology = TopicOntology([Topic(topic_id="T1", name="dengue fever")])
+        questions = [
+            {"q_id": "a", "raw_text": "Dengue Fever", "cluster_id": "a", "cluster_text": "Dengue Fever"},
+            {"q_id": "b", "raw_text": "Dengue fever.", "cluster_id": "a", "cluster_text": "Dengue Fever"},
+        ]
+        with mock.patch.object(ontology, "match_tokens", wraps=ontology.match_tokens) as match:
+            prepared = SimpleFrequencyPredictor().prepare(questions, ontology)
+        self.assertEqual(match.call_count, 1)
+        self.assertEqual(prepared, [([TOPIC_IDS.intern("T1")], None)] * 2)
+
+class TestSyntheticData(unittest.TestCase):
+    def test_generator_is_deterministic_and_loadable(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first, second = Path(tmp) / "a", Path(tmp) / "b"
+            summary = generate_dataset(first, scale=0.5, n_topics=200, years=[2023, 2024], seed=3)
+            generate_dataset(second, scale=0.5, n_topics=200, years=[2023, 2024], seed=3)
+            for path in sorted(first.iterdir()):
+                self.assertEqual(path.read_bytes(), (second / path.name).read_bytes(), path.name)
+            ontology = TopicOntology.from_seed(first / "topic_ontology_seed.json")
+            questions = list(load_year_data(first, 2024))
+            self.assertEqual(len(ontology.topics), summary["topics"])
+            self.assertEqual(len(questions) * 2, summary["questions"])
+            self.assertEqual([q["paper_id"] for q in questions], sorted(q["paper_id"] for q in questions))
+
+
+class TestLabelCache(unittest.TestCase):
+    def test_only_new_or_edited_questions_are_relabeled(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        questions = list(load_year_data(DATA_DIR, 2022))
+        expected = auto_label_questions(questions, ontology)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "labels.json"
+            cache = LabelCache(path, ontology)
+            self.assertEqual(auto_label_questions(questions, ontology, cache=cache), expected)
+            cache.save()
+
+            # The text is matched via cluster_text / match_tokens when present; edit the raw text alone.
+            rewritten = {k: v for k, v in questions[0].items() if k not in ("cluster_text", "match_tokens")}
+            edited = [*questions[1:], {**rewritten, "raw_text": "Heart failure"}]
+            warm = LabelCache(path, ontology)
+            labels = auto_label_questions(edited, ontology, cache=warm)
+            self.assertEqual((warm.hits, warm.misses), (len(questions) - 1, 1))
+            self.assertEqual(labels, auto_label_questions(edited, ontology))
+
+            other = TopicOntology([Topic(topic_id="T1", name="heart failure")])
+            self.assertEqual(LabelCache(path, other).entries, {})
+
 
 class TestMetrics(unittest.TestCase):
     def test_metrics_values(self):
@@ -20,6 +438,48 @@ class TestMetrics(unittest.TestCase):
         self.assertAlmostEqual(average_precision_at_k(predicted, gold, 4), (1 / 2 + 2 / 4) / 2)
         self.assertGreater(ndcg_at_k(predicted, gold, 4), 0)
 
+    def test_batch_kernel_matches_per_question_metrics_for_every_k(self):
+        predicted = ["A", "B", "C", "D", "E", "B"]
+        golds = [["B", "D"], ["E", "A", "A"], [], ["Z"], ["C"]]
+        ks = [6, 1, 3, 10]
+        for k, metrics in zip(ks, macro_metrics_at_ks(predicted, golds, ks)):
+            self.assertEqual(metrics, macro_average([compute_metrics(predicted, gold, k) for gold in golds]))
+
+
+class TestBootstrap(unittest.TestCase):
+    def test_resamples_strata_separately_and_pairs_statistics(self):
+        predicted = ["A", "B", "C", "D"]
+        golds = [["B"], ["A", "D"], ["Z"], []]
+        per_question = question_metrics(predicted, golds, 3)
+        macro = macro_metrics_at_ks(predicted, golds, [3])[0]
+        self.assertAlmostEqual(sum(row[0] for row in per_question) / len(golds), macro.recall_at_k)
+
+        # Field 0 differs between strata, field 1 repeats field 0, field 2
+        # only covers the second stratum and is constant there.
+        strata = [
+            [(0.0, 0.0, None), (0.5, 0.5, None)],
+            [(1.0, 1.0, 0.25), (1.0, 1.0, 0.25), (1.0, 1.0, 0.25)],
+        ]
+        first, copy, covered = bootstrap_means(strata, resamples=2000, seed=3)
+        self.assertEqual(len(first), 2000)
+        # Stratum means are 0..0.5 and 1.0, averaged: every resample lies in [0.5, 0.75].
+        self.assertTrue(all(0.5 - 1e-6 <= value <= 0.75 + 1e-6 for value in first))
+        self.assertAlmostEqual(sum(first) / len(first), 0.625, places=2)
+        self.assertEqual(set(paired_differences(first, copy)), {0.0})
+        self.assertTrue(all(abs(value - 0.25) < 1e-6 for value in covered))
+        low, high = percentile_interval(first, 0.9)
+        self.assertTrue(0.5 - 1e-6 <= low < 0.625 < high <= 0.75 + 1e-6)
+        with self.assertRaises(ValueError):
+            bootstrap_means([[(1.5,)]])
+
+    def test_empty_split_reports_no_intervals(self):
+        empty = metric_intervals(bootstrap_means([[]], resamples=10), 0.95)
+        self.assertEqual(empty, {})
+        full = metric_intervals(bootstrap_means([[(1.0, 0.5, 0.5, 0.5)]], resamples=10), 0.95)
+        table = format_interval_table([{"split": "empty", **empty}, {"split": "full", **full}])
+        self.assertIn("| empty | n/a | n/a | n/a | n/a |", table)
+        self.assertIn("| full | [1.000, 1.000] | [0.500, 0.500]", table)
+
 
 class TestSplits(unittest.TestCase):
     def test_rolling_splits(self):
@@ -28,5 +488,361 @@ class TestSplits(unittest.TestCase):
         self.assertEqual(splits[-1], ([2022, 2023, 2024], 2025))
 
 
+class TestCompiledScoring(unittest.TestCase):
+    def test_compiled_rankings_match_predict(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        questions = []
+        for year in (2022, 2023, 2024, 2025):
+            for idx, question in enumerate(load_year_data(DATA_DIR, year)):
+                questions.append({**question, "marks": (None, 5, 10, 15)[idx % 4]})
+        predictor = SimpleFrequencyPredictor()
+        compiled = predictor.compile(predictor.prepare(questions, ontology), ontology)
+        configs = [{}, {"marks_weight": 1.2, "frequency_weight": 0.8, "graph_weight": 0.2}]
+        for config, ranked in zip(configs, predictor.predict_batch(compiled, configs)):
+            self.assertEqual(ranked, predictor.predict(questions, ontology, config))
+
+    def test_prefix_rankings_match_predict(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        predictor = SimpleFrequencyPredictor()
+        blocks = []
+        for year in (2022, 2023, 2024, 2025):
+            questions = load_year_data(DATA_DIR, year)
+            blocks.append([{**q, "marks": (None, 5, 10, 15)[idx % 4]} for idx, q in enumerate(questions)])
+        prefix = predictor.prefix_scores([predictor.prepare(block, ontology) for block in blocks], ontology)
+        config = {"marks_weight": 1.2, "frequency_weight": 0.8, "graph_weight": 0.2}
+        rankings = prefix.rank_prefixes(config, [3, 1, 2])
+        for length, ranked in zip([3, 1, 2], rankings):
+            train = [q for block in blocks[:length] for q in block]
+            self.assertEqual(ranked, predictor.predict(train, ontology, config))
+        self.assertEqual(
+            [TOPIC_IDS.strings(ranking) for ranking in prefix.ranked_topic_ids(config, [2])],
+            [[r.topic_id for r in rankings[2]]],
+        )
+
+    def test_recency_weight_decays_by_calendar_age(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        predictor = SimpleFrequencyPredictor()
+        years = [2022, 2023, 2024, 2025]
+        config = {"recency_weight": 0.8, "marks_weight": 1.2, "graph_weight": 0.2}
+        undecayed = {**config, "recency_weight": 1.0}
+        state = TopicScoreState(ontology.scoring_fingerprint)
+        state.sync(DATA_DIR, years, ontology)
+        service = PredictionService(DATA_DIR, ontology, years, {})
+        # Paper 3 has no 2024 questions and paper 1 none after 2023: age is in
+        # calendar years from the newest year the paper has questions in.
+        for paper_id, newest in ((None, 2025), (3, 2025), (1, 2023)):
+            by_year = {
+                year: [q for q in load_year_data(DATA_DIR, year) if paper_id is None or q["paper_id"] == paper_id]
+                for year in years
+            }
+            expected: dict = {}
+            for year, questions in by_year.items():
+                for result in predictor.predict(questions, ontology, undecayed):
+                    score = 0.8 ** (newest - year) * result.score
+                    expected[result.topic_id] = expected.get(result.topic_id, 0.0) + score
+            ranked = predictor.predict(sum(by_year.values(), []), ontology, config)
+            self.assertEqual({r.topic_id for r in ranked}, set(expected))
+            for result in ranked:
+                self.assertAlmostEqual(result.score, expected[result.topic_id])
+            self.assertEqual([r.score for r in ranked], sorted((r.score for r in ranked), reverse=True))
+            self.assertEqual(state.rank(config, years, paper_id), ranked)
+            self.assertEqual(service.rank(paper_id, years, config), [(r.topic_id, r.score) for r in ranked])
+        self.assertEqual(
+            state.rank(undecayed, years),
+            predictor.predict([q for year in years for q in load_year_data(DATA_DIR, year)], ontology, undecayed),
+        )
+
+    def test_zero_and_tiny_recency_weights(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        predictor = SimpleFrequencyPredictor()
+        years = [2022, 2023, 2024, 2025]
+        questions = [q for year in years for q in load_year_data(DATA_DIR, year)]
+        state = TopicScoreState(ontology.scoring_fingerprint)
+        state.sync(DATA_DIR, years, ontology)
+        service = PredictionService(DATA_DIR, ontology, years, {})
+        # recency_weight 0: only the newest year counts (0 ** 0 == 1).
+        zero = {"recency_weight": 0.0}
+        newest = predictor.predict(load_year_data(DATA_DIR, 2025), ontology, {"recency_weight": 1.0})
+        ranked = predictor.predict(questions, ontology, zero)
+        self.assertEqual({r.topic_id: r.score for r in ranked if r.score}, {r.topic_id: r.score for r in newest})
+        self.assertEqual(state.rank(zero, years), ranked)
+        self.assertEqual(service.rank(None, years, zero), [(r.topic_id, r.score) for r in ranked])
+        # Weights beyond exp(MAX_LOG_WEIGHT) rebase the running sums instead of overflowing.
+        tiny = {r.topic_id: r.score for r in predictor.predict(questions, ontology, {"recency_weight": 1e-40})}
+        self.assertEqual(set(tiny), {r.topic_id for r in ranked})
+        for result in ranked:
+            self.assertAlmostEqual(tiny[result.topic_id], result.score)
+        with self.assertRaises(ValueError):
+            predictor.predict(questions, ontology, {"recency_weight": -0.5})
+
+
+class TestTopicScoreState(unittest.TestCase):
+    def test_incremental_years_match_predict(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        predictor = SimpleFrequencyPredictor()
+        state = TopicScoreState(ontology.scoring_fingerprint)
+        self.assertEqual(state.sync(DATA_DIR, [2022, 2023, 2024], ontology), [2022, 2023, 2024])
+        self.assertEqual(state.sync(DATA_DIR, [2022, 2023, 2024, 2025], ontology), [2025])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "score_state.pkl"
+            state.save(path)
+            state = TopicScoreState.load(path, ontology)
+        self.assertEqual(state.years(), [2022, 2023, 2024, 2025])
+        config = {"marks_weight": 1.2, "frequency_weight": 0.8, "graph_weight": 0.2}
+        for years, paper_id in (([2022, 2023, 2024], None), ([2022, 2023, 2024, 2025], 2)):
+            questions = [
+                q
+                for year in years
+                for q in load_year_data(DATA_DIR, year)
+                if paper_id is None or q["paper_id"] == paper_id
+            ]
+            self.assertEqual(state.rank(config, years, paper_id), predictor.predict(questions, ontology, config))
+
+        edited = [dict(q) for q in load_year_data(DATA_DIR, 2025)]
+        for name in ("tag_ids", "harrison_tags", "harrison_terms", "harrison_scores"):
+            edited[0].pop(name, None)
+        edited[0]["harrison_tag_ids"] = ""
+        state.add_year(2025, edited, ontology)
+        self.assertEqual(state.rank({}, [2025]), predictor.predict(edited, ontology, {}))
+        self.assertEqual(state.sync(DATA_DIR, [2022, 2023, 2024, 2025], ontology), [2025])
+
+    def test_hierarchy_edit_invalidates_saved_state(self):
+        topics = [
+            Topic(topic_id="A", name="alpha", parent_id="B"),
+            Topic(topic_id="B", name="beta"),
+            Topic(topic_id="C", name="gamma"),
+        ]
+        ontology = TopicOntology(topics)
+        reparented = TopicOntology([Topic(topic_id="A", name="alpha", parent_id="C"), *topics[1:]])
+        self.assertEqual(reparented.fingerprint, ontology.fingerprint)
+        self.assertNotEqual(reparented.scoring_fingerprint, ontology.scoring_fingerprint)
+        questions = [{"q_id": "q1", "raw_text": "alpha", "paper_id": 1, "harrison_tag_ids": "A", "marks": 10}]
+        state = TopicScoreState(ontology.scoring_fingerprint)
+        state.add_year(2025, questions, ontology)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "score_state.pkl"
+            state.save(path)
+            self.assertEqual(TopicScoreState.load(path, ontology).years(), [2025])
+            stale = TopicScoreState.load(path, reparented)
+        self.assertEqual(stale.years(), [])
+        with self.assertRaises(ValueError):
+            state.add_year(2025, questions, reparented)
+        stale.add_year(2025, questions, reparented)
+        config = {"graph_weight": 0.2}
+        self.assertEqual(stale.rank(config), SimpleFrequencyPredictor().predict(questions, reparented, config))
+        self.assertIn("C", [r.topic_id for r in stale.rank(config)])
+
+
+class TestPipeline(unittest.TestCase):
+    def run_pipeline(self, root: Path, cache: str, predictions: str, *extra: str) -> dict:
+        argv = [
+            "pipeline",
+            "--data-dir", str(root / "data"),
+            "--reports-dir", str(root / "reports"),
+            "--predictions-dir", str(root / predictions),
+            "--cache-dir", str(root / cache),
+            *extra,
+        ]
+        with mock.patch.object(sys, "argv", argv), mock.patch("src.autotune.dump_yaml"):
+            pipeline.main()
+        outputs = {}
+        for path in sorted((root / predictions).glob("*.json")):
+            payload = json.loads(path.read_text())
+            outputs[path.name] = [(t["topic_id"], t["confidence"]) for t in payload["high_confidence"]]
+        return outputs
+
+    def test_subset_of_years_after_full_run_ignores_cached_later_years(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            shutil.copytree(DATA_DIR, root / "data")
+            self.run_pipeline(root, "cache", "full")
+            # The persisted score state still holds 2024-2025 from the full run.
+            subset = self.run_pipeline(root, "cache", "subset", "--years", "2022", "2023", "--force")
+            clean = self.run_pipeline(root, "clean_cache", "clean", "--years", "2022", "2023")
+        self.assertEqual(subset, clean)
+
+
+class TestTuningSession(unittest.TestCase):
+    def test_session_matches_direct_evaluation(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        config = {"marks_weight": 1.2, "frequency_weight": 0.8, "graph_weight": 0.2}
+        years = [2022, 2023, 2024]
+        expected = []
+        for train_years, test_year in rolling_splits(years):
+            train = [q for year in train_years for q in load_year_data(DATA_DIR, year)]
+            test = load_year_data(DATA_DIR, test_year)
+            auto_labels = auto_label_questions(test, ontology)
+            ranked = [p.topic_id for p in SimpleFrequencyPredictor().predict(train, ontology, config)]
+            expected.append(macro_average([compute_metrics(ranked, auto_labels[q["q_id"]], 40) for q in test]))
+        tuner = AutoTuner(DATA_DIR, ontology)
+        self.assertEqual(tuner.evaluate_config(config, years, 40), macro_average(expected))
+
+    def test_parallel_tune_matches_serial(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        years = [2022, 2023, 2024, 2025]
+        with mock.patch("src.autotune.dump_yaml"):
+            serial = AutoTuner(DATA_DIR, ontology).tune(years, 40, 0.001, 5)
+            parallel = AutoTuner(DATA_DIR, ontology).tune(years, 40, 0.001, 5, workers=2)
+        self.assertEqual(list(parallel["history"]), list(serial["history"]))
+        self.assertEqual(parallel["history"], serial["history"])
+        self.assertEqual(parallel["best"], serial["best"])
+
+    def test_search_strategies_respect_budget_and_seed(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        years = [2022, 2023, 2024, 2025]
+        with mock.patch("src.autotune.dump_yaml"):
+            for strategy in ("random", "halving", "surrogate"):
+                first = AutoTuner(DATA_DIR, ontology, seed=7).tune(
+                    years, 40, 0.0, 100, strategy=strategy, max_evals=10
+                )
+                second = AutoTuner(DATA_DIR, ontology, seed=7).tune(
+                    years, 40, 0.0, 100, strategy=strategy, max_evals=10
+                )
+                self.assertLessEqual(first["search"]["evaluations"], 10 + 1e-9)
+                self.assertEqual(first["history"], second["history"])
+                self.assertIsNotNone(first["best"])
+
+    def test_time_only_budget_runs_every_strategy(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        years = [2022, 2023, 2024, 2025]
+        with mock.patch("src.autotune.dump_yaml"):
+            for strategy in ("grid", "random", "halving", "surrogate"):
+                results = AutoTuner(DATA_DIR, ontology, seed=7).tune(
+                    years, 40, 0.0, 3, strategy=strategy, max_seconds=60.0
+                )
+                self.assertIsNotNone(results["best"])
+                self.assertGreater(results["search"]["evaluations"], 0)
+
+
+class TestPredictionServer(unittest.TestCase):
+    def test_service_rankings_match_predictor_and_http_endpoints(self):
+        ontology = TopicOntology.from_seed(DATA_DIR / "topic_ontology_seed.json")
+        config = {"marks_weight": 1.0, "frequency_weight": 1.0, "graph_weight": 0.1}
+        service = PredictionService(DATA_DIR, ontology, [2022, 2023, 2024, 2025], config, cache_size=2)
+        questions = [
+            q for year in (2022, 2023) for q in load_year_data(DATA_DIR, year) if q["paper_id"] == 1
+        ]
+        expected = SimpleFrequencyPredictor().predict(questions, ontology, {**config, "graph_weight": 0.2})
+        ranked = service.rank(1, [2022, 2023], {"graph_weight": 0.2})
+        self.assertEqual(ranked, [(item.topic_id, item.score) for item in expected])
+
+        server = make_server(service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            base = f"http://127.0.0.1:{server.server_port}"
+            with urlopen(f"{base}/rank?paper_id=1&years=2022,2023&graph_weight=0.2&top=5") as response:
+                payload = json.loads(response.read())
+            self.assertEqual([t["topic_id"] for t in payload["topics"]], [t for t, _ in ranked[:5]])
+            request = Request(
+                f"{base}/match",
+                data=json.dumps({"text": "Cardiac failure"}).encode(),
+                headers={"Content-Type": "application/json"},
+            )
+            with urlopen(request) as response:
+                matches = json.loads(response.read())["matches"]
+            self.assertEqual([m["topic_id"] for m in matches], [t for t, _ in ontology.match_topics("Cardiac failure")])
+            with urlopen(f"{base}/rank?paper_id=1&years=2023,2022,2023&graph_weight=0.2&top=5") as response:
+                self.assertEqual(json.loads(response.read())["years"], [2022, 2023])
+            for path, status in (
+                ("/match?text=heart&max_topics=0", 400),
+                ("/rank?recency_weight=-1", 400),
+                ("/rank?recency_weight=0", 200),
+            ):
+                try:
+                    with urlopen(f"{base}{path}") as response:
+                        self.assertEqual(response.status, status)
+                except HTTPError as exc:
+                    self.assertEqual(exc.code, status)
+                    self.assertIn("error", json.loads(exc.read()))
+            with mock.patch.object(service, "rank", side_effect=ZeroDivisionError("boom")):
+                with self.assertRaises(HTTPError) as failure:
+                    urlopen(f"{base}/rank")
+            self.assertEqual(failure.exception.code, 500)
+            self.assertEqual(json.loads(failure.exception.read()), {"error": "ZeroDivisionError: boom"})
+        finally:
+            server.shutdown()
+            server.server_close()
+        # The HTTP ranking of paper 1, plus its repeat with duplicate years.
+        self.assertEqual(service.rankings.stats()["hits"], 2)
+        self.assertEqual(service.rank(1, [2023, 2022, 2023], {"graph_weight": 0.2}), ranked)
+        with self.assertRaises(ValueError):
+            _parse_rank_params({"top": "-1"})
+
+
+
+class TestProfiling(unittest.TestCase):
+    def tearDown(self):
+        PROFILER.disable()
+        PROFILER.reset()
+
+    def test_stages_and_hot_functions_are_recorded_only_when_enabled(self):
+        ontology = TopicOntology([Topic(topic_id="T1", name="heart failure")])
+        with stage("idle"):
+            ontology.match_topics("heart failure")
+        self.assertEqual((PROFILER.stages, PROFILER.functions), ({}, {}))
+
+        PROFILER.enable()
+        with stage("outer"):
+            with stage("inner"):
+                buffer = [bytearray(1 << 20)]
+                ontology.match_topics("heart failure")
+            del buffer
+            compute_metrics(["T1"], ["T1"], 1)
+        PROFILER.disable()
+        self.assertEqual(list(PROFILER.stages), ["outer/inner", "outer"])
+        self.assertGreaterEqual(PROFILER.stages["outer"].peak_bytes, 1 << 20)
+        self.assertEqual(PROFILER.functions["TopicOntology.match_topics"].calls, 1)
+        self.assertEqual(PROFILER.functions["compute_metrics"].calls, 1)
+        trace = PROFILER.trace()
+        self.assertEqual([event["name"] for event in trace["traceEvents"]], ["outer/inner", "outer"])
+
+
+class TestStageGraph(unittest.TestCase):
+    def test_skips_cached_stages_restores_outputs_and_runs_independent_stages_concurrently(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            source, report = root / "source.txt", root / "out" / "report.txt"
+            source.write_text("3")
+            barrier = threading.Barrier(2, timeout=10)
+
+            def load():
+                return int(source.read_text())
+
+            def double(value):
+                barrier.wait()
+                return value * 2
+
+            def write_report(value):
+                barrier.wait()
+                report.parent.mkdir(exist_ok=True)
+                report.write_text(f"value {value}")
+                return value
+
+            def stages():
+                return [
+                    Stage("load", load, inputs=(source,), cache=False),
+                    Stage("double", double, deps=("load",)),
+                    Stage("report", write_report, deps=("load",), outputs=(report,)),
+                    Stage("total", lambda doubled, reported: doubled + reported, deps=("double", "report")),
+                ]
+
+            graph = StageGraph(stages(), root / "cache", jobs=2)
+            self.assertEqual(graph.run()["total"], 9)
+            self.assertEqual(sorted(graph.executed), ["double", "load", "report", "total"])
+
+            report.unlink()
+            graph.run()
+            self.assertEqual(graph.executed, [])
+            self.assertEqual(report.read_text(), "value 3")
+
+            source.write_text("4")
+            self.assertEqual(graph.run()["total"], 12)
+            self.assertEqual(report.read_text(), "value 4")
+            source.write_text("3")
+            graph.run()
+            self.assertEqual(graph.executed, [])
+            self.assertEqual(report.read_text(), "value 3")
+
+
 if __name__ == "__main__":
     unittest.main()